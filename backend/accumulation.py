@@ -0,0 +1,341 @@
+"""Accumulation: the most GIV inside any circle of a given radius.
+
+Assets are bucketed into a lat/lng grid with cells a quarter of the radius
+tall and sorted by (row, column), so any run of columns within one grid row
+is a contiguous slice of the sorted assets and its GIV is the difference of
+two prefix sums. Circles are centred on occupied cell centres; the cells a
+circle touches form one such run per grid row, which gives every circle an
+upper bound on its GIV from a handful of prefix-sum lookups.
+
+Circles are then summed exactly in descending order of that bound: cells
+wholly inside still by prefix sums, only rim cells asset by asset.
+Hotspots are taken greedily from the exact sums, skipping any circle that
+overlaps one already taken so hotspots never share assets. Evaluation
+stops once no remaining bound can beat the last hotspot, which makes the
+result exact over all grid-centred circles while only a small share of
+them is ever summed.
+
+The densest circle is usually centred off the grid, so cells are also
+refined: circles centred on each of their assets are summed too, in
+descending order of a bound padded by the cell's size, until no cell left
+can beat the largest sum found. The reported maximum is thus at least
+that of any circle centred on an asset, and the refined circles compete
+for the other hotspots as well. They are summed with a ``BandIndex``
+(assets in latitude bands a sixteenth of the radius tall, by longitude
+within each) so every circle, wherever its centre, is a run of assets per
+band with only the runs at its rim tested one by one.
+
+Distances are equirectangular about each circle's centre, which is well
+within a metre of the great-circle distance at these radii.
+"""
+
+from typing import List, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+CELLS_PER_RADIUS = 4
+BANDS_PER_RADIUS = 16
+# Sub-cells per cell side when pruning refined cells
+SUBCELL_SPLIT = 4
+# Points in the cells refined per pass, and asset-centred circles summed per chunk
+POINT_BATCH = 16384
+POINT_CHUNK = 1024
+# Candidate circles summed exactly per pass, and the most asset positions gathered at once
+CANDIDATE_BATCH = 256
+MAX_GATHER = 4000000
+_STRIDE = np.int64(1) << 32
+# Longitude offset between bands in ``BandIndex`` keys; wider than any longitude range
+_BAND_STRIDE = 1000.0
+_BOUND_BLOCK = 500000
+
+
+class CellGrid:
+    """Weighted points sorted into lat/lng grid cells ``cell_m`` tall."""
+
+    def __init__(self, lat: np.ndarray, lng: np.ndarray, weight: np.ndarray, cell_m: float):
+        self.cell_m = cell_m
+        self.cell_lat = float(np.degrees(cell_m / EARTH_RADIUS_M))
+        # At least cell_m wide everywhere in the portfolio
+        widest = min(float(np.abs(lat).max()), 85.0)
+        self.cell_lng = self.cell_lat / float(np.cos(np.radians(widest)))
+        self.lat0, self.lng0 = float(lat.min()), float(lng.min())
+        rows = np.floor((lat - self.lat0) / self.cell_lat).astype(np.int64)
+        cols = np.floor((lng - self.lng0) / self.cell_lng).astype(np.int64)
+        keys = rows * _STRIDE + cols
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.lat, self.lng, self.weight = lat[order], lng[order], weight[order]
+        self.prefix = np.concatenate([[0.0], np.cumsum(self.weight)])
+        cell_keys, self.cell_start, self.cell_size = np.unique(self.keys, return_index=True, return_counts=True)
+        self.cell_row, self.cell_col = cell_keys // _STRIDE, cell_keys % _STRIDE
+        # Farthest a point lies from its cell's centre, with a margin for the metric changing across a cell
+        lat_c, _ = self.centres(np.arange(len(self)))
+        widest_m = float(np.radians(self.cell_lng) * EARTH_RADIUS_M * np.cos(np.radians(lat_c)).max())
+        self.reach_m = 0.5 * float(np.hypot(cell_m, widest_m)) * 1.01
+
+    def __len__(self) -> int:
+        return len(self.cell_row)
+
+    def centres(self, cells: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """``(lat, lng)`` of the given cells' centres."""
+        return (
+            self.lat0 + (self.cell_row[cells] + 0.5) * self.cell_lat,
+            self.lng0 + (self.cell_col[cells] + 0.5) * self.cell_lng,
+        )
+
+    def spans(
+        self, cells: np.ndarray, radius_m: float, interior: bool = False
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """``(start, end, owner)``: sorted-point slices covering the circle around each cell's centre.
+
+        ``owner`` is each slice's position in ``cells``; there is one slice
+        per grid row, holding every point of the cells the circle touches in
+        that row. With ``interior``, the slices hold only the cells wholly
+        inside the circle instead (empty where there are none), each within
+        the matching touching slice.
+        """
+        reach = int(np.floor(radius_m / self.cell_m + 0.5))
+        offsets = np.arange(-reach, reach + 1)
+        # Nearest (farthest for interior) distance from a centre to each row band, and the half-chord there
+        dy = (np.abs(offsets) + 0.5 if interior else np.maximum(np.abs(offsets) - 0.5, 0.0)) * self.cell_m
+        half = np.sqrt(np.maximum(radius_m ** 2 - dy ** 2, 0.0))
+        lat_c, _ = self.centres(cells)
+        col_m = np.radians(self.cell_lng) * EARTH_RADIUS_M * np.cos(np.radians(lat_c))
+        if interior:
+            cols = np.where(dy <= radius_m, np.floor(half[None, :] / col_m[:, None] - 0.5), -1).astype(np.int64)
+        else:
+            cols = np.maximum(np.ceil(half[None, :] / col_m[:, None] - 0.5), 0).astype(np.int64)
+        rows = (self.cell_row[cells][:, None] + offsets[None, :]) * _STRIDE
+        centre = self.cell_col[cells][:, None]
+        start = np.searchsorted(self.keys, (rows + np.maximum(centre - cols, 0)).ravel(), "left")
+        end = np.searchsorted(self.keys, (rows + centre + cols).ravel(), "right")
+        if interior:
+            end = np.where(cols.ravel() < 0, start, end)
+        owner = np.repeat(np.arange(len(cells)), len(offsets))
+        return start, end, owner
+
+    def upper_bounds(self, radius_m: float) -> np.ndarray:
+        """Per cell, the GIV of every cell its circle touches."""
+        bounds = np.empty(len(self))
+        for first in range(0, len(self), _BOUND_BLOCK):
+            cells = np.arange(first, min(first + _BOUND_BLOCK, len(self)))
+            start, end, owner = self.spans(cells, radius_m)
+            bounds[cells] = np.bincount(owner, weights=self.prefix[end] - self.prefix[start], minlength=len(cells))
+        return bounds
+
+    def circle_sums(self, cells: np.ndarray, radius_m: float) -> Tuple[np.ndarray, np.ndarray]:
+        """``(weight, count)`` of the points within ``radius_m`` of each cell's centre.
+
+        Cells wholly inside a circle are summed from the prefix sums; only
+        the points of the cells on its rim are tested one by one.
+        """
+        start, end, owner = self.spans(cells, radius_m)
+        inner_start, inner_end, _ = self.spans(cells, radius_m, interior=True)
+        weight = np.bincount(owner, weights=self.prefix[inner_end] - self.prefix[inner_start], minlength=len(cells))
+        count = np.bincount(owner, weights=inner_end - inner_start, minlength=len(cells)).astype(np.int64)
+        # Rim: each touching slice either side of its interior slice
+        start, end = np.concatenate([start, inner_end]), np.concatenate([inner_start, end])
+        owner = np.concatenate([owner, owner])
+        lengths = end - start
+        idx = np.repeat(start - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+        who = np.repeat(owner, lengths)
+        lat_c, lng_c = self.centres(cells)
+        dy = np.radians(self.lat[idx] - lat_c[who])
+        dx = np.radians(self.lng[idx] - lng_c[who]) * np.cos(np.radians(lat_c))[who]
+        inside = dx * dx + dy * dy <= (radius_m / EARTH_RADIUS_M) ** 2
+        who = who[inside]
+        weight += np.bincount(who, weights=self.weight[idx[inside]], minlength=len(cells))
+        count += np.bincount(who, minlength=len(cells))
+        return weight, count
+
+    def gather_sizes(self, cells: np.ndarray, radius_m: float) -> np.ndarray:
+        """At most how many points ``circle_sums`` tests for each cell."""
+        start, end, owner = self.spans(cells, radius_m)
+        return np.bincount(owner, weights=end - start, minlength=len(cells))
+
+    def points(self, cells: np.ndarray) -> np.ndarray:
+        """Positions in the sorted points of every point in ``cells``."""
+        sizes = self.cell_size[cells]
+        return np.repeat(self.cell_start[cells] - (np.cumsum(sizes) - sizes), sizes) + np.arange(sizes.sum())
+
+    def subcells(self, points: np.ndarray, split: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """``(sub, lat, lng)``: each point's sub-cell, with cells cut ``split`` ways a side, and their centres.
+
+        A point lies within ``reach_m / split`` of its sub-cell's centre.
+        """
+        rows = np.floor((self.lat[points] - self.lat0) * split / self.cell_lat).astype(np.int64)
+        cols = np.floor((self.lng[points] - self.lng0) * split / self.cell_lng).astype(np.int64)
+        keys, sub = np.unique(rows * _STRIDE + cols, return_inverse=True)
+        lat = self.lat0 + (keys // _STRIDE + 0.5) * self.cell_lat / split
+        lng = self.lng0 + (keys % _STRIDE + 0.5) * self.cell_lng / split
+        return sub.ravel(), lat, lng
+
+
+class BandIndex:
+    """Weighted points in latitude bands ``band_m`` tall, sorted by longitude within each band.
+
+    Band and longitude share one float key, so the points of a band
+    between two longitudes are one ``searchsorted`` pair away.
+    """
+
+    def __init__(self, lat: np.ndarray, lng: np.ndarray, weight: np.ndarray, band_m: float):
+        self.band_m = band_m
+        self.band_lat = float(np.degrees(band_m / EARTH_RADIUS_M))
+        self.lat0, self.lng0 = float(lat.min()), float(lng.min())
+        keys = np.floor((lat - self.lat0) / self.band_lat) * _BAND_STRIDE + (lng - self.lng0)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.lat, self.lng, self.weight = lat[order], lng[order], weight[order]
+        self.prefix = np.concatenate([[0.0], np.cumsum(self.weight)])
+        # Key rounding, in degrees of longitude; runs are widened or narrowed by it to stay exact
+        self.slack = 4 * float(np.spacing(np.abs(self.keys).max()))
+
+    def circle_sums(self, lat_c: np.ndarray, lng_c: np.ndarray, radius_m: float) -> Tuple[np.ndarray, np.ndarray]:
+        """``(weight, count)`` of the points within ``radius_m`` of each centre.
+
+        Per band, points within the chord at the band's far edge are inside
+        and summed from the prefix sums; the rest of the chord at its near
+        edge is tested point by point.
+        """
+        reach = int(np.ceil(radius_m / self.band_m))
+        centre_band = np.floor((lat_c - self.lat0) / self.band_lat)
+        # Centres in key order and one band offset at a time, so the searches run mostly ascending
+        order = np.argsort(centre_band * _BAND_STRIDE + lng_c, kind="stable")
+        lat_c, lng_c = lat_c[order], lng_c[order]
+        bands = centre_band[order][None, :] + np.arange(-reach, reach + 1)[:, None]
+        low = self.lat0 + bands * self.band_lat - lat_c
+        high = low + self.band_lat
+        near = np.radians(np.maximum(np.maximum(low, -high), 0.0)) * EARTH_RADIUS_M
+        far = np.radians(np.maximum(-low, high)) * EARTH_RADIUS_M
+        deg_per_m = np.degrees(1 / (EARTH_RADIUS_M * np.cos(np.radians(lat_c))))
+        outer = np.sqrt(np.maximum(radius_m ** 2 - near ** 2, 0.0)) * deg_per_m + self.slack
+        inner = np.sqrt(np.maximum(radius_m ** 2 - far ** 2, 0.0)) * deg_per_m - self.slack
+        base = bands * _BAND_STRIDE + (lng_c - self.lng0)
+        start = np.searchsorted(self.keys, (base - outer).ravel(), "left")
+        end = np.searchsorted(self.keys, (base + outer).ravel(), "right")
+        inner_start = np.searchsorted(self.keys, (base - inner).ravel(), "left")
+        inner_end = np.searchsorted(self.keys, (base + inner).ravel(), "right")
+        empty = (near > radius_m).ravel()
+        start[empty] = end[empty] = 0
+        hollow = (far > radius_m).ravel() | (inner <= 0).ravel() | empty
+        inner_start[hollow] = inner_end[hollow] = end[hollow]
+
+        owner = np.tile(np.arange(len(lat_c)), bands.shape[0])
+        weight = np.bincount(owner, weights=self.prefix[inner_end] - self.prefix[inner_start], minlength=len(lat_c))
+        count = np.bincount(owner, weights=inner_end - inner_start, minlength=len(lat_c)).astype(np.int64)
+        # Rim: each band's chord either side of its inner run, gathered a bounded number at a time
+        start, end = np.concatenate([start, inner_end]), np.concatenate([inner_start, end])
+        owner = np.concatenate([owner, owner])
+        rim = np.bincount(owner, weights=end - start, minlength=len(lat_c))
+        cuts = np.searchsorted(np.cumsum(rim), np.arange(MAX_GATHER, rim.sum() + MAX_GATHER, MAX_GATHER), "right")
+        first = 0
+        for last in cuts:
+            last = max(int(last), first + 1)
+            mine = (owner >= first) & (owner < last)
+            part_start, part_end, part_owner = start[mine], end[mine], owner[mine]
+            lengths = part_end - part_start
+            idx = np.repeat(part_start - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+            who = np.repeat(part_owner, lengths)
+            dy = np.radians(self.lat[idx] - lat_c[who])
+            dx = np.radians(self.lng[idx] - lng_c[who]) * np.cos(np.radians(lat_c))[who]
+            inside = dx * dx + dy * dy <= (radius_m / EARTH_RADIUS_M) ** 2
+            weight += np.bincount(who[inside], weights=self.weight[idx[inside]], minlength=len(lat_c))
+            count += np.bincount(who[inside], minlength=len(lat_c))
+            first = last
+            if first >= len(lat_c):
+                break
+        out_weight, out_count = np.empty_like(weight), np.empty_like(count)
+        out_weight[order], out_count[order] = weight, count
+        return out_weight, out_count
+
+
+def _distance_m(lat: np.ndarray, lng: np.ndarray, lat_c: float, lng_c: float) -> np.ndarray:
+    dy = np.radians(lat - lat_c)
+    dx = np.radians(lng - lng_c) * np.cos(np.radians(lat_c))
+    return np.hypot(dx, dy) * EARTH_RADIUS_M
+
+
+def hotspots(lat: np.ndarray, lng: np.ndarray, giv: np.ndarray, radius_m: float, top_k: int) -> List[dict]:
+    """Up to ``top_k`` non-overlapping ``radius_m`` circles holding the most GIV, largest first.
+
+    Each hotspot is ``{"latitude", "longitude", "giv", "assetCount"}`` for
+    the circle's centre; the first one is the portfolio's maximum.
+    """
+    if len(giv) == 0:
+        return []
+    grid = CellGrid(lat, lng, giv, radius_m / CELLS_PER_RADIUS)
+    bounds = grid.upper_bounds(radius_m)
+    order = np.argsort(-bounds, kind="stable")
+    # Every circle centred in a cell lies within radius_m + reach_m of the cell's centre
+    point_bounds = grid.upper_bounds(radius_m + grid.reach_m)
+    point_order = np.argsort(-point_bounds, kind="stable")
+    bands = None
+    lat_c, lng_c = np.empty(0), np.empty(0)
+    sums, counts = np.empty(0), np.empty(0, dtype=np.int64)
+    picked: List[int] = []
+    done = refined = 0
+    while True:
+        if len(sums) and refined < len(point_order) and point_bounds[point_order[refined]] > sums.max():
+            if bands is None:
+                bands = BandIndex(lat, lng, giv, radius_m / BANDS_PER_RADIUS)
+            cells = point_order[refined:refined + CANDIDATE_BATCH]
+            cells = cells[:max(1, int(np.searchsorted(np.cumsum(grid.cell_size[cells]), POINT_BATCH, "right")))]
+            new_lat, new_lng, weight, count = _point_circles(grid, bands, cells, radius_m, sums.max())
+            refined += len(cells)
+        elif done < len(order) and not (len(picked) == top_k and bounds[order[done]] <= sums[picked[-1]]):
+            batch = order[done:done + CANDIDATE_BATCH]
+            sizes = np.cumsum(grid.gather_sizes(batch, radius_m))
+            batch = batch[:max(1, int(np.searchsorted(sizes, MAX_GATHER, "right")))]
+            weight, count = grid.circle_sums(batch, radius_m)
+            new_lat, new_lng = grid.centres(batch)
+            done += len(batch)
+        else:
+            break
+        lat_c, lng_c = np.concatenate([lat_c, new_lat]), np.concatenate([lng_c, new_lng])
+        sums, counts = np.concatenate([sums, weight]), np.concatenate([counts, count])
+        picked = _separated(lat_c, lng_c, sums, radius_m, top_k)
+    return [
+        {"latitude": float(lat_c[i]), "longitude": float(lng_c[i]), "giv": float(sums[i]), "assetCount": int(counts[i])}
+        for i in picked
+    ]
+
+
+def _point_circles(
+    grid: CellGrid, bands: BandIndex, cells: np.ndarray, radius_m: float, best: float
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """``(lat, lng, weight, count)`` of the circles centred on points of ``cells`` that might beat ``best``.
+
+    Each sub-cell's circle padded by its reach bounds those of its points.
+    Points are summed densest sub-cell first, a chunk at a time, and the
+    rest dropped as soon as the best sum so far rules them out.
+    """
+    points = grid.points(cells)
+    sub, sub_lat, sub_lng = grid.subcells(points, SUBCELL_SPLIT)
+    padded, _ = bands.circle_sums(sub_lat, sub_lng, radius_m + grid.reach_m / SUBCELL_SPLIT)
+    order = np.argsort(-padded[sub], kind="stable")
+    points, bound = points[order], padded[sub][order]
+    parts = []
+    while len(points) and bound[0] > best:
+        chunk = points[:POINT_CHUNK]
+        weight, count = bands.circle_sums(grid.lat[chunk], grid.lng[chunk], radius_m)
+        parts.append((grid.lat[chunk], grid.lng[chunk], weight, count))
+        best = max(best, float(weight.max()))
+        keep = bound[len(chunk):] > best
+        points, bound = points[len(chunk):][keep], bound[len(chunk):][keep]
+    if not parts:
+        return np.empty(0), np.empty(0), np.empty(0), np.empty(0, dtype=np.int64)
+    return tuple(np.concatenate(column) for column in zip(*parts))
+
+
+def _separated(lat: np.ndarray, lng: np.ndarray, sums: np.ndarray, radius_m: float, top_k: int) -> List[int]:
+    """Greedy picks by descending sum, keeping circles disjoint: each pick rules out every circle near it."""
+    open_sums = np.where(sums > 0, sums, -np.inf)
+    picked: List[int] = []
+    while len(picked) < top_k:
+        i = int(np.argmax(open_sums))
+        if open_sums[i] == -np.inf:
+            break
+        picked.append(i)
+        open_sums[_distance_m(lat, lng, lat[i], lng[i]) < 2 * radius_m] = -np.inf
+    return picked
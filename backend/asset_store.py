@@ -0,0 +1,383 @@
+"""Columnar, NumPy-backed storage for the asset portfolio.
+
+Assets are held as one array per field instead of a list of dicts so that
+portfolio-wide sums, masks and medians run as vectorized reductions. The
+API still returns ``Asset`` dicts; they are materialized only for the rows
+that end up in a response.
+"""
+
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+FLOAT_COLUMNS = ("latitude", "longitude", "giv", "pnl", "floodDepth")
+INT_COLUMNS = ("yearBuilt", "riskScore")
+CATEGORICAL_COLUMNS = ("assetType", "constructionType", "coverageType", "floodCategory")
+STRING_COLUMNS = ("assetId", "address")
+BOOL_COLUMNS = ("inFloodZone",)
+
+COLUMN_DTYPES = {
+    **{name: np.float64 for name in FLOAT_COLUMNS},
+    **{name: np.int64 for name in INT_COLUMNS},
+    **{name: np.int16 for name in CATEGORICAL_COLUMNS},
+    **{name: object for name in STRING_COLUMNS},
+    **{name: bool for name in BOOL_COLUMNS},
+}
+
+# Past this fraction of changed rows, re-sorting beats patching a sort order
+RESORT_FRACTION = 0.1
+
+# Field order of the Asset model, used when materializing rows
+ASSET_FIELDS = (
+    "assetId",
+    "latitude",
+    "longitude",
+    "giv",
+    "pnl",
+    "assetType",
+    "constructionType",
+    "yearBuilt",
+    "coverageType",
+    "riskScore",
+    "address",
+    "inFloodZone",
+    "floodDepth",
+    "floodCategory",
+)
+
+
+def patch_sort_order(
+    order: np.ndarray, sorted_keys: np.ndarray, old_keys: np.ndarray, new_keys: np.ndarray
+) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Update ``(order, sorted_keys)`` from per-row ``old_keys`` to ``new_keys``.
+
+    ``order`` sorts ``old_keys`` and ``sorted_keys`` is ``old_keys[order]``.
+    Rows whose key changed and rows past the end of the shorter array are
+    taken out, then the new ones are merged back in with ``searchsorted``.
+    That is a few O(N) copies instead of an O(N log N) sort. Equal keys may
+    end up in any row order. Returns None when so many rows changed that
+    the caller should re-sort instead.
+    """
+    n_old, n = len(old_keys), len(new_keys)
+    m = min(n_old, n)
+    changed = np.flatnonzero(old_keys[:m] != new_keys[:m])
+    if len(changed) + abs(n - n_old) > RESORT_FRACTION * n:
+        return None
+    dropped = np.zeros(n_old, dtype=bool)
+    dropped[changed] = True
+    dropped[n:] = True
+    keep = ~dropped[order]
+    order, sorted_keys = order[keep], sorted_keys[keep]
+    added = np.concatenate([changed, np.arange(n_old, n)]).astype(order.dtype)
+    added = added[np.argsort(new_keys[added], kind="stable")]
+    pos = np.searchsorted(sorted_keys, new_keys[added])
+    return np.insert(order, pos, added), np.insert(sorted_keys, pos, new_keys[added])
+
+
+class Categories:
+    """Label <-> int code vocabulary for a categorical column (None is -1)."""
+
+    def __init__(self, labels: Iterable[str] = ()):
+        self.labels: List[str] = []
+        self._codes: Dict[str, int] = {}
+        for label in labels:
+            self.code(label)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def code(self, label: Optional[str]) -> int:
+        """Return the code for ``label``, registering it if it is new."""
+        if label is None:
+            return -1
+        code = self._codes.get(label)
+        if code is None:
+            code = len(self.labels)
+            self._codes[label] = code
+            self.labels.append(label)
+        return code
+
+    def lookup(self, label: Optional[str]) -> int:
+        """Return the code for ``label`` without registering it (-1 if unknown)."""
+        if label is None:
+            return -1
+        return self._codes.get(label, -1)
+
+    def encode(self, values: Iterable[Optional[str]]) -> np.ndarray:
+        return np.fromiter((self.code(v) for v in values), dtype=np.int16)
+
+    def decode(self, codes: np.ndarray) -> List[Optional[str]]:
+        labels = self.labels
+        return [labels[c] if c >= 0 else None for c in codes.tolist()]
+
+
+class AssetStore:
+    """Column-oriented asset table.
+
+    Float fields are float64 arrays, categorical fields are int16 codes into a
+    per-column ``Categories`` vocabulary, ``inFloodZone`` is a boolean mask and
+    the free-text fields are object arrays. Columns are over-allocated so
+    appends are amortized O(1), and an ``assetId -> row`` dict is kept in sync
+    on every insert, update and delete.
+
+    Columns may also be adopted as-is from a snapshot (``from_columns``),
+    e.g. copy-on-write memory maps with fixed-width string columns. The ID
+    index is then built on first use, and string columns are converted to
+    object arrays on the first write that needs it.
+
+    Two counters let derived indexes tell when they are stale: ``version``
+    increases on every write (including in-place column updates announced
+    with ``touch()``), ``rows_version`` only when rows are loaded, upserted
+    or deleted.
+    """
+
+    def __init__(self, categories: Optional[Dict[str, Sequence[str]]] = None):
+        categories = categories or {}
+        self.categories: Dict[str, Categories] = {
+            name: Categories(categories.get(name, ())) for name in CATEGORICAL_COLUMNS
+        }
+        self._data: Dict[str, np.ndarray] = {name: np.empty(0, dtype=dtype) for name, dtype in COLUMN_DTYPES.items()}
+        self._size = 0
+        self._index: Optional[Dict[str, int]] = {}
+        self.version = 0
+        self.rows_version = 0
+
+    @classmethod
+    def from_records(
+        cls, records: Sequence[dict], categories: Optional[Dict[str, Sequence[str]]] = None
+    ) -> "AssetStore":
+        store = cls(categories)
+        store.load(records)
+        return store
+
+    @classmethod
+    def from_columns(
+        cls, columns: Dict[str, np.ndarray], categories: Optional[Dict[str, Sequence[str]]] = None
+    ) -> "AssetStore":
+        """Adopt equal-length column arrays without copying; the ID index is built lazily."""
+        store = cls(categories)
+        store._data = {name: columns[name] for name in COLUMN_DTYPES}
+        store._size = len(columns["assetId"])
+        store._index = None
+        store._bump_rows()
+        return store
+
+    def _encode(self, records: Sequence[dict]) -> Dict[str, np.ndarray]:
+        n = len(records)
+        encoded = {}
+        for name in FLOAT_COLUMNS:
+            encoded[name] = np.fromiter((r.get(name) or 0 for r in records), dtype=np.float64, count=n)
+        for name in INT_COLUMNS:
+            encoded[name] = np.fromiter((r[name] for r in records), dtype=np.int64, count=n)
+        for name in CATEGORICAL_COLUMNS:
+            encoded[name] = self.categories[name].encode(r.get(name) for r in records)
+        for name in STRING_COLUMNS:
+            arr = np.empty(n, dtype=object)
+            arr[:] = [r[name] for r in records]
+            encoded[name] = arr
+        for name in BOOL_COLUMNS:
+            encoded[name] = np.fromiter((bool(r.get(name)) for r in records), dtype=bool, count=n)
+        return encoded
+
+    def load(self, records: Sequence[dict]) -> None:
+        """Replace the store contents with ``records`` (Asset-shaped dicts)."""
+        self._data = self._encode(records)
+        self._size = len(records)
+        self._index = None
+        self.id_index()
+        self._bump_rows()
+
+    def adopt(self, other: "AssetStore") -> None:
+        """Replace the store contents with ``other``'s columns, without copying them.
+
+        ``other``'s category codes are re-mapped onto this store's
+        vocabularies, so existing codes keep their meaning.
+        """
+        data = dict(other._data)
+        for name, categories in self.categories.items():
+            codes = [categories.code(label) for label in other.categories[name].labels]
+            mapping = np.array(codes + [-1], dtype=np.int16)
+            data[name] = mapping[other._data[name]]
+        self._data = data
+        self._size = other._size
+        self._index = other._index
+        self._bump_rows()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def columns(self) -> Dict[str, np.ndarray]:
+        return {name: self.column(name) for name in self._data}
+
+    def column(self, name: str) -> np.ndarray:
+        """Writable view of the live rows of column ``name``."""
+        return self._data[name][: self._size]
+
+    def category_mask(self, name: str, labels: Union[str, Iterable[str]]) -> np.ndarray:
+        """Boolean mask of rows whose categorical ``name`` is one of ``labels``."""
+        if isinstance(labels, str):
+            labels = [labels]
+        codes = [self.categories[name].lookup(label) for label in labels]
+        return np.isin(self.column(name), [code for code in codes if code >= 0])
+
+    def filter_mask(
+        self,
+        asset_types: Optional[Sequence[str]] = None,
+        construction_types: Optional[Sequence[str]] = None,
+        coverage_types: Optional[Sequence[str]] = None,
+        risk_min: Optional[int] = None,
+        risk_max: Optional[int] = None,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+        asset_ids: Optional[Sequence[str]] = None,
+    ) -> np.ndarray:
+        """Boolean mask of rows matching every given filter (None means no filter).
+
+        ``bbox`` is ``(min_lat, min_lng, max_lat, max_lng)``, inclusive.
+        """
+        mask = np.ones(self._size, dtype=bool)
+        if asset_types is not None:
+            mask &= self.category_mask("assetType", asset_types)
+        if construction_types is not None:
+            mask &= self.category_mask("constructionType", construction_types)
+        if coverage_types is not None:
+            mask &= self.category_mask("coverageType", coverage_types)
+        if risk_min is not None:
+            mask &= self.column("riskScore") >= risk_min
+        if risk_max is not None:
+            mask &= self.column("riskScore") <= risk_max
+        if bbox is not None:
+            min_lat, min_lng, max_lat, max_lng = bbox
+            lat, lng = self.column("latitude"), self.column("longitude")
+            mask &= (lat >= min_lat) & (lat <= max_lat) & (lng >= min_lng) & (lng <= max_lng)
+        if asset_ids is not None:
+            selected = np.zeros(self._size, dtype=bool)
+            rows = self.rows_of(asset_ids)
+            selected[rows[rows >= 0]] = True
+            mask &= selected
+        return mask
+
+    # ---------- ID index ----------
+
+    def id_index(self) -> Dict[str, int]:
+        """The ``assetId -> row`` dict, built on first use."""
+        if self._index is None:
+            index = {asset_id: row for row, asset_id in enumerate(self.column("assetId").tolist())}
+            if len(index) != self._size:
+                raise ValueError("Duplicate assetId in asset records")
+            self._index = index
+        return self._index
+
+    def row_of(self, asset_id: str) -> Optional[int]:
+        return self.id_index().get(asset_id)
+
+    def rows_of(self, asset_ids: Iterable[str]) -> np.ndarray:
+        """Row per ID, -1 where the ID is unknown."""
+        index = self.id_index()
+        return np.fromiter((index.get(asset_id, -1) for asset_id in asset_ids), dtype=np.intp)
+
+    # ---------- Writes ----------
+
+    def touch(self) -> None:
+        """Record an in-place update made through ``column()`` views."""
+        self.version += 1
+
+    def _bump_rows(self) -> None:
+        self.version += 1
+        self.rows_version += 1
+
+    def _own_strings(self) -> None:
+        """Turn adopted fixed-width string columns into writable object arrays."""
+        for name in STRING_COLUMNS:
+            if self._data[name].dtype != object:
+                self._data[name] = self._data[name].astype(object)
+
+    def _reserve(self, size: int) -> None:
+        capacity = len(self._data["assetId"])
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2, 16)
+        for name, col in self._data.items():
+            grown = np.empty(capacity, dtype=col.dtype)
+            grown[: self._size] = col[: self._size]
+            self._data[name] = grown
+
+    def upsert(self, records: Sequence[dict]) -> np.ndarray:
+        """Insert new assets and overwrite existing ones, matched on assetId.
+
+        Returns the row each record was written to. If an ID repeats within
+        ``records`` the last occurrence wins.
+        """
+        encoded = self._encode(records)
+        index = self.id_index()
+        self._own_strings()
+        rows = np.empty(len(records), dtype=np.intp)
+        size = self._size
+        for i, asset_id in enumerate(encoded["assetId"].tolist()):
+            row = index.get(asset_id)
+            if row is None:
+                row = index[asset_id] = size
+                size += 1
+            rows[i] = row
+        self._reserve(size)
+        self._size = size
+        for name, values in encoded.items():
+            self._data[name][rows] = values
+        self._bump_rows()
+        return rows
+
+    def delete(self, asset_ids: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Remove assets by ID, keeping columns dense by moving tail rows into the holes.
+
+        Unknown IDs are ignored. Returns ``(src, dst)``: the row that used to
+        live at ``src[i]`` now lives at ``dst[i]``, for callers that keep
+        row-keyed structures of their own.
+        """
+        index = self.id_index()
+        self._own_strings()
+        doomed = np.unique([index.pop(asset_id) for asset_id in set(asset_ids) if asset_id in index])
+        doomed = doomed.astype(np.intp)
+        new_size = self._size - len(doomed)
+        tail = np.arange(new_size, self._size)
+        src = tail[~np.isin(tail, doomed)]
+        dst = doomed[doomed < new_size]
+        for col in self._data.values():
+            col[dst] = col[src]
+        for asset_id, row in zip(self._data["assetId"][dst].tolist(), dst.tolist()):
+            index[asset_id] = row
+        self._size = new_size
+        # Release references held by the vacated object slots
+        for name in STRING_COLUMNS:
+            self._data[name][new_size:new_size + len(doomed)] = None
+        self._bump_rows()
+        return src, dst
+
+    def snapshot(self, names: Optional[Iterable[str]] = None) -> "AssetStore":
+        """A detached copy for readers on other threads; later writes to this store don't reach it.
+
+        Only columns ``names`` are copied (all by default), along with the
+        vocabularies. The copy's ID index is built on first use.
+        """
+        store = AssetStore({name: list(c.labels) for name, c in self.categories.items()})
+        store._data = {name: self.column(name).copy() for name in (self._data if names is None else names)}
+        store._size = self._size
+        store._index = None
+        store.version, store.rows_version = self.version, self.rows_version
+        return store
+
+    # ---------- Materialization ----------
+
+    def to_records(self, rows: Optional[np.ndarray] = None) -> List[dict]:
+        """Materialize Asset dicts for ``rows`` (all rows when omitted)."""
+        values = {}
+        for name in ASSET_FIELDS:
+            col = self.column(name)
+            picked = col if rows is None else col[rows]
+            if name in self.categories:
+                values[name] = self.categories[name].decode(picked)
+            else:
+                values[name] = picked.tolist()
+        return [dict(zip(ASSET_FIELDS, row)) for row in zip(*(values[name] for name in ASSET_FIELDS))]
+
+    def to_record(self, row: int) -> dict:
+        return self.to_records(np.array([row]))[0]
@@ -0,0 +1,281 @@
+"""Endpoint latency, throughput and memory at production portfolio sizes.
+
+For each portfolio size, installs a seeded synthetic portfolio
+(``benchmarks.portfolio``) into the app, then drives each endpoint
+in-process through httpx's ASGI transport with varied, seeded request
+parameters. It reports p50/p95/p99 latency, throughput and peak RSS per
+endpoint and writes everything to a JSON file. ``--compare`` checks the
+run against an earlier results file and exits non-zero on a p95
+regression. No MongoDB is needed: only endpoints that do not write are
+driven, and startup reconciliation does not run. Run from ``backend/``::
+
+    python -m benchmarks.api --assets 10000 100000 1000000 5000000 --vertices 256
+    python -m benchmarks.api --assets 100000 --compare benchmarks/results/api-20240115T000000Z.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "inspace_benchmark")
+os.environ.pop("ASSET_SNAPSHOT_PATH", None)
+
+import httpx  # noqa: E402
+
+import server  # noqa: E402
+from benchmarks.portfolio import make_flood_zones, make_store  # noqa: E402
+from export import encode_cursor  # noqa: E402
+from tiles import to_mercator  # noqa: E402
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+# (method, url, json body) for one request, drawn from a seeded generator
+RequestFactory = Callable[[np.random.Generator], Tuple[str, str, Optional[dict]]]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size since the last ``reset_peak_rss``, in MiB."""
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale / 1024
+
+
+def reset_peak_rss() -> None:
+    """Restart peak RSS tracking from the current RSS (Linux only; elsewhere peaks are process-wide)."""
+    try:
+        Path("/proc/self/clear_refs").write_text("5")
+    except OSError:
+        pass
+
+
+def tile_of(lat: float, lng: float, zoom: int) -> Tuple[int, int]:
+    mx, my = to_mercator(np.array([lat]), np.array([lng]))
+    return int(mx[0] * 2 ** zoom), int(my[0] * 2 ** zoom)
+
+
+def endpoint_factories(store, zones: List[dict]) -> Dict[str, RequestFactory]:
+    """Request generators per endpoint, sampling real IDs, places and zones from the portfolio."""
+    ids = store.column("assetId")
+    lat, lng = store.column("latitude"), store.column("longitude")
+    addresses = store.column("address")
+
+    def random_point(rng):
+        row = int(rng.integers(len(ids)))
+        return float(lat[row]), float(lng[row])
+
+    def bbox(rng, half: float) -> str:
+        y, x = random_point(rng)
+        return f"{y - half},{x - half},{y + half},{x + half}"
+
+    def tile(rng, zoom: int) -> str:
+        x, y = tile_of(*random_point(rng), zoom)
+        return f"/api/assets/tiles/{zoom}/{x}/{y}"
+
+    def search_term(rng) -> str:
+        address = addresses[int(rng.integers(len(addresses)))]
+        start = int(rng.integers(0, max(1, len(address) - 5)))
+        return address[start:start + 5].strip() or "Market"
+
+    def scenario(rng) -> dict:
+        zone = zones[int(rng.integers(len(zones)))]
+        return {"zoneOverrides": [{"flood_id": zone["flood_id"], "depth_delta_m": round(float(rng.random() * 3), 1)}]}
+
+    return {
+        "health": lambda rng: ("GET", "/api/health", None),
+        "kpis_portfolio": lambda rng: ("GET", "/api/kpis/portfolio", None),
+        "kpis_flood": lambda rng: ("GET", "/api/kpis/flood", None),
+        "kpis_query_bbox": lambda rng: ("GET", f"/api/kpis/query?bbox={bbox(rng, 0.01)}&group_by=assetType", None),
+        "kpis_hazards_bbox": lambda rng: ("GET", f"/api/kpis/hazards?bbox={bbox(rng, 0.01)}", None),
+        "asset_by_id": lambda rng: ("GET", f"/api/assets/{ids[int(rng.integers(len(ids)))]}", None),
+        "assets_batch_1000": lambda rng: (
+            "POST", "/api/assets/batch", {"assetIds": ids[rng.integers(0, len(ids), 1000)].tolist()}
+        ),
+        "assets_page_1000": lambda rng: (
+            "GET", f"/api/assets?limit=1000&cursor={encode_cursor(str(ids[int(rng.integers(len(ids)))]))}", None
+        ),
+        "search": lambda rng: ("GET", f"/api/assets/search/{search_term(rng)}?limit=50", None),
+        "tile_z10": lambda rng: ("GET", tile(rng, 10), None),
+        "tile_z16": lambda rng: ("GET", tile(rng, 16), None),
+        "flood_zones_z12": lambda rng: ("GET", f"/api/flood-zones?zoom=12&bbox={bbox(rng, 0.02)}", None),
+        "flood_zones_full": lambda rng: ("GET", "/api/flood-zones", None),
+        "scenario": lambda rng: ("POST", "/api/scenarios", scenario(rng)),
+        "simulation_1k_years": lambda rng: (
+            "POST", "/api/simulations/flood", {"years": 1000, "seed": int(rng.integers(1 << 31))}
+        ),
+        # A fresh radius each time, so the response cache never answers
+        "accumulation": lambda rng: ("GET", f"/api/accumulation?radius_m={int(rng.integers(200, 1000))}", None),
+    }
+
+
+# Endpoints too slow to repeat the full --requests count
+REQUEST_CAPS = {"simulation_1k_years": 10, "flood_zones_full": 50, "accumulation": 10}
+
+
+async def drive(client: httpx.AsyncClient, factory: RequestFactory, count: int, concurrency: int, seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    requests = [factory(rng) for _ in range(count)]
+    latencies = np.zeros(count)
+    statuses: Dict[int, int] = {}
+    sizes = np.zeros(count, dtype=np.int64)
+    queue = iter(range(count))
+
+    async def worker():
+        for i in queue:
+            method, url, body = requests[i]
+            t0 = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            latencies[i] = time.perf_counter() - t0
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            sizes[i] = len(response.content)
+
+    reset_peak_rss()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    ms = latencies * 1e3
+    return {
+        "requests": count,
+        "concurrency": concurrency,
+        "p50Ms": float(np.percentile(ms, 50)),
+        "p95Ms": float(np.percentile(ms, 95)),
+        "p99Ms": float(np.percentile(ms, 99)),
+        "meanMs": float(ms.mean()),
+        "maxMs": float(ms.max()),
+        "throughputRps": count / wall,
+        "meanResponseBytes": float(sizes.mean()),
+        "peakRssMb": peak_rss_mb(),
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+    }
+
+
+def install(count: int, args) -> dict:
+    """Install a synthetic portfolio into the app and warm its indexes; returns setup timings."""
+    timings = {}
+    t0 = time.perf_counter()
+    store = make_store(count, args.seed)
+    zones = make_flood_zones(args.zones, args.vertices, args.seed)
+    timings["generateSeconds"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    server.install_portfolio(store, zones)
+    timings["installSeconds"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    server.warm_indexes()
+    timings["warmIndexesSeconds"] = time.perf_counter() - t0
+    timings["rssMb"] = peak_rss_mb()
+    return timings
+
+
+async def run(args) -> dict:
+    runs = []
+    for count in args.assets:
+        print(f"\n{count} assets, {args.zones} zones x {args.vertices} vertices")
+        setup = install(count, args)
+        print("  setup " + ", ".join(f"{k} {v:.2f}" for k, v in setup.items()))
+        factories = endpoint_factories(server.ASSET_STORE, server.FLOOD_ZONES.all())
+        names = args.endpoints or list(factories)
+        endpoints = {}
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            print(
+                f"  {'endpoint':<22} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'KiB':>9} {'RSS MiB':>8}"
+            )
+            for name in names:
+                requests = min(args.requests, REQUEST_CAPS.get(name, args.requests))
+                stats = await drive(client, factories[name], requests, args.concurrency, args.seed)
+                endpoints[name] = stats
+                print(
+                    f"  {name:<22} {stats['p50Ms']:>9.2f} {stats['p95Ms']:>9.2f} {stats['p99Ms']:>9.2f} "
+                    f"{stats['throughputRps']:>9.1f} {stats['meanResponseBytes'] / 1024:>9.1f} "
+                    f"{stats['peakRssMb']:>8.0f}"
+                )
+        runs.append(
+            {"assets": count, "zones": args.zones, "vertices": args.vertices, "setup": setup, "endpoints": endpoints}
+        )
+    return {"meta": run_metadata(args), "runs": runs}
+
+
+def run_metadata(args) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "createdAt": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> List[str]:
+    """p95 regressions beyond ``tolerance`` for every (assets, endpoint) present in both runs."""
+    previous = {(r["assets"], name): stats for r in baseline["runs"] for name, stats in r["endpoints"].items()}
+    regressions = []
+    print(f"\nCompared with {baseline['meta'].get('commit')} ({baseline['meta'].get('createdAt')})")
+    for run_ in current["runs"]:
+        for name, stats in run_["endpoints"].items():
+            old = previous.get((run_["assets"], name))
+            if old is None or old["p95Ms"] <= 0:
+                continue
+            ratio = stats["p95Ms"] / old["p95Ms"]
+            flag = "REGRESSION" if ratio > 1 + tolerance else ""
+            print(
+                f"  {run_['assets']:>9} {name:<22} p95 {old['p95Ms']:>9.2f} -> {stats['p95Ms']:>9.2f} ms"
+                f"  x{ratio:.2f} {flag}"
+            )
+            if flag:
+                regressions.append(f"{run_['assets']} {name}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--assets", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--zones", type=int, default=200)
+    parser.add_argument("--vertices", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=1, help="requests in flight at once")
+    parser.add_argument("--endpoints", nargs="+", help="subset of endpoint names to run")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, help="results file (default benchmarks/results/api-<UTC time>.json)")
+    parser.add_argument("--compare", type=Path, help="earlier results file to check p95 regressions against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 slowdown before flagging")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    results = asyncio.run(run(args))
+    output = args.output or RESULTS_DIR / f"api-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"\nWrote {output}")
+    if args.compare:
+        regressions = compare(results, json.loads(args.compare.read_text()), args.tolerance)
+        if regressions:
+            sys.exit(f"p95 regressions: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
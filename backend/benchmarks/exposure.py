@@ -0,0 +1,73 @@
+"""Scaling benchmark for the flood exposure engine.
+
+Times index build and batch classification over a grid of asset counts and
+polygon vertex counts. Run from ``backend/``::
+
+    python -m benchmarks.exposure --assets 10000 100000 1000000 --vertices 8 64 512 4096
+"""
+
+import argparse
+import time
+from typing import List
+
+import numpy as np
+
+from exposure import FloodExposureEngine
+
+SF_CENTER = (37.7749, -122.4194)
+SPAN = (0.15, 0.25)
+
+
+def make_points(count: int, rng: np.random.Generator):
+    lat = SF_CENTER[0] + (rng.random(count) - 0.5) * SPAN[0]
+    lng = SF_CENTER[1] + (rng.random(count) - 0.5) * SPAN[1]
+    return lat, lng
+
+
+def make_zones(count: int, vertices: int, rng: np.random.Generator) -> List[dict]:
+    """Irregular star-shaped rings scattered over the same extent as the points."""
+    zones = []
+    for k in range(count):
+        c_lat, c_lng = make_points(1, rng)
+        radius = 0.002 + rng.random() * 0.008
+        angles = np.sort(rng.random(vertices)) * 2 * np.pi
+        radii = radius * (0.6 + 0.4 * rng.random(vertices))
+        ring = np.column_stack([c_lat + radii * np.sin(angles), c_lng + radii * np.cos(angles)])
+        zones.append(
+            {
+                "flood_id": f"FZ-{k + 1:05d}",
+                "flood_category": "primary",
+                "flood_depth_m": round(float(rng.random() * 4), 1),
+                "coordinates": ring.tolist(),
+            }
+        )
+    return zones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--assets", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--vertices", type=int, nargs="+", default=[8, 64, 512, 4096])
+    parser.add_argument("--zones", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'assets':>10} {'vertices':>9} {'zones':>6} {'build ms':>9} {'classify ms':>12} {'exposed':>9} {'ns/asset':>9}")
+    for vertices in args.vertices:
+        rng = np.random.default_rng(args.seed)
+        zones = make_zones(args.zones, vertices, rng)
+        for count in args.assets:
+            lat, lng = make_points(count, rng)
+            t0 = time.perf_counter()
+            engine = FloodExposureEngine(zones)
+            t1 = time.perf_counter()
+            zone_idx = engine.classify(lat, lng)
+            t2 = time.perf_counter()
+            print(
+                f"{count:>10} {vertices:>9} {len(zones):>6} {(t1 - t0) * 1e3:>9.1f} "
+                f"{(t2 - t1) * 1e3:>12.1f} {int((zone_idx >= 0).sum()):>9} {(t2 - t1) * 1e9 / count:>9.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Ingest throughput and geospatial query latency against a real MongoDB.
+
+Writes synthetic portfolios into a scratch database (dropped first), then
+times full reload and ``$geoWithin`` / ``$geoIntersects`` queries. Needs a
+running mongod; mongomock does not implement geo operators. Run from
+``backend/``::
+
+    MONGO_URL=mongodb://localhost:27017 python -m benchmarks.persistence --assets 100000 1000000
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from benchmarks.exposure import make_points, make_zones
+from benchmarks.portfolio import make_assets
+from persistence import PortfolioRepository, bbox_polygon
+
+
+async def run(args) -> None:
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[args.db]
+    rng = np.random.default_rng(args.seed)
+    zones = make_zones(args.zones, args.vertices, rng)
+
+    print(f"{'assets':>10} {'ingest s':>9} {'docs/s':>9} {'load s':>7} {'within ms':>10} {'hits':>7} {'bbox ms':>8}")
+    for count in args.assets:
+        await client.drop_database(args.db)
+        repo = PortfolioRepository(db, batch_size=args.batch)
+        await repo.ensure_indexes()
+        assets = make_assets(count, args.seed)
+        ingest = await repo.upsert_assets(assets)
+        await repo.upsert_zones(zones)
+
+        t0 = time.perf_counter()
+        await repo.load_assets()
+        load_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        hits = 0
+        for zone in zones:
+            hits += len(await repo.asset_ids_within(zone))
+        within_ms = (time.perf_counter() - t0) * 1e3 / len(zones)
+
+        t0 = time.perf_counter()
+        for lat, lng in zip(*make_points(args.queries, rng)):
+            await repo.zone_ids_intersecting(bbox_polygon(lat - 0.005, lng - 0.005, lat + 0.005, lng + 0.005))
+        bbox_ms = (time.perf_counter() - t0) * 1e3 / args.queries
+
+        print(
+            f"{count:>10} {ingest['seconds']:>9.1f} {count / ingest['seconds']:>9.0f} {load_s:>7.1f} "
+            f"{within_ms:>10.1f} {hits:>7} {bbox_ms:>8.2f}"
+        )
+    await client.drop_database(args.db)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--assets", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--zones", type=int, default=50)
+    parser.add_argument("--vertices", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=200, help="viewport $geoIntersects queries")
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("--db", default="inspace_benchmark")
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Seeded synthetic portfolios and flood zones at production scale.
+
+Assets are generated column-wise straight into an ``AssetStore``, so a
+5M-asset portfolio never exists as a list of dicts. Locations cluster
+around a few dozen urban centres over a uniform background, GIV is
+log-normal and the categorical fields use the same vocabularies as the
+mock data in ``server.py``. The same seed always gives the same portfolio.
+"""
+
+from typing import List
+
+import numpy as np
+
+from asset_store import ASSET_FIELDS, COLUMN_DTYPES, AssetStore
+from benchmarks.exposure import make_points, make_zones
+
+ASSET_TYPES = ["factories", "retail", "warehouses", "residential", "commercial", "industrial"]
+CONSTRUCTION_TYPES = ["Wood Frame", "Steel Frame", "Concrete", "Masonry", "Mixed"]
+COVERAGE_TYPES = ["Full Coverage", "Basic", "Premium", "Standard"]
+FLOOD_CATEGORIES = ["primary", "secondary", "fringe"]
+STREET_NAMES = np.array(
+    ["Market St", "Mission St", "Valencia St", "Geary Blvd", "Van Ness Ave", "Lombard St",
+     "Broadway", "Folsom St", "Howard St", "Bryant St", "Harrison St", "3rd St", "California St"],
+    dtype=object,
+)
+
+URBAN_CENTRES = 40
+# Share of assets placed around urban centres; the rest are uniform
+CLUSTERED_SHARE = 0.7
+
+
+def make_store(count: int, seed: int = 42) -> AssetStore:
+    """A ``count``-asset portfolio, exposure fields unset."""
+    rng = np.random.default_rng(seed)
+    lat, lng = make_points(count, rng)
+    clustered = rng.random(count) < CLUSTERED_SHARE
+    c_lat, c_lng = make_points(URBAN_CENTRES, rng)
+    centre = rng.integers(0, URBAN_CENTRES, count)
+    spread = rng.normal(0, 0.006, (2, count))
+    lat = np.where(clustered, c_lat[centre] + spread[0], lat)
+    lng = np.where(clustered, c_lng[centre] + spread[1], lng)
+
+    asset_type = rng.integers(0, len(ASSET_TYPES), count).astype(np.int16)
+    giv = np.round(rng.lognormal(np.log(8e6), 0.9, count), 2)
+    numbers = rng.integers(1, 9999, count)
+    streets = STREET_NAMES[rng.integers(0, len(STREET_NAMES), count)]
+    prefixes = np.array([t[:4].upper() for t in ASSET_TYPES], dtype=object)[asset_type]
+
+    columns = {
+        "assetId": np.array([f"{p}-{i:08d}" for p, i in zip(prefixes, range(count))], dtype=object),
+        "latitude": lat,
+        "longitude": lng,
+        "giv": giv,
+        "pnl": np.round(giv * rng.normal(0.02, 0.05, count), 2),
+        "assetType": asset_type,
+        "constructionType": rng.integers(0, len(CONSTRUCTION_TYPES), count).astype(np.int16),
+        "yearBuilt": rng.integers(1900, 2025, count),
+        "coverageType": rng.integers(0, len(COVERAGE_TYPES), count).astype(np.int16),
+        "riskScore": rng.integers(1, 101, count),
+        "address": np.array(
+            [f"{n} {s}, San Francisco, CA" for n, s in zip(numbers.tolist(), streets)], dtype=object
+        ),
+        "inFloodZone": np.zeros(count, dtype=bool),
+        "floodDepth": np.zeros(count),
+        "floodCategory": np.full(count, -1, dtype=np.int16),
+    }
+    columns = {name: columns[name].astype(COLUMN_DTYPES[name], copy=False) for name in ASSET_FIELDS}
+    return AssetStore.from_columns(
+        columns,
+        categories={
+            "assetType": ASSET_TYPES,
+            "constructionType": CONSTRUCTION_TYPES,
+            "coverageType": COVERAGE_TYPES,
+            "floodCategory": FLOOD_CATEGORIES,
+        },
+    )
+
+
+def make_assets(count: int, seed: int = 42) -> List[dict]:
+    """``make_store`` as Asset dicts, for APIs that take records."""
+    return make_store(count, seed).to_records()
+
+
+def make_flood_zones(count: int, vertices: int, seed: int = 42) -> List[dict]:
+    """FloodZone-shaped dicts with ``vertices``-vertex rings (``make_zones`` plus metadata)."""
+    rng = np.random.default_rng(seed)
+    zones = make_zones(count, vertices, rng)
+    return_periods = np.array([10, 25, 50, 100, 500])
+    for zone in zones:
+        period = int(rng.choice(return_periods))
+        zone.update(
+            flood_category=FLOOD_CATEGORIES[int(rng.integers(0, len(FLOOD_CATEGORIES)))],
+            return_period_yr=period,
+            probability_pct=round(100 / period, 2),
+            data_source="Synthetic",
+            timestamp="2024-01-15T00:00:00Z",
+        )
+    return zones
@@ -0,0 +1,129 @@
+"""Depth-damage curves for flood loss estimation.
+
+Curves are piecewise-linear ``depth (m) -> damage ratio`` tables keyed by
+construction type and occupancy (``assetType``), loaded from a CSV with the
+columns ``construction_type,asset_type,depth_m,damage_ratio``. ``*`` matches
+any value. The most specific curve wins::
+
+    (construction, occupancy) > (construction, *) > (*, occupancy) > (*, *)
+
+Depths outside a curve's range are clamped to its end points.
+
+All curves are resampled onto the union of their breakpoints, which is exact
+for piecewise-linear curves. Evaluating any mix of curves over a depth array
+is then one ``searchsorted`` plus one linear blend.
+"""
+
+import csv
+import hashlib
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from asset_store import AssetStore
+
+WILDCARD = "*"
+
+CurveKey = Tuple[str, str]
+
+
+class DamageCurveSet:
+    """A versioned set of depth-damage curves evaluated over whole arrays."""
+
+    def __init__(self, curves: Dict[CurveKey, Tuple[np.ndarray, np.ndarray]], version: str):
+        if (WILDCARD, WILDCARD) not in curves:
+            raise ValueError("Damage curve table needs a default '*,*' curve")
+        self.version = version
+        self.keys: List[CurveKey] = sorted(curves)
+        self.curves = curves
+        self.grid = np.unique(np.concatenate([depths for depths, _ in curves.values()]))
+        # (curves x grid) damage ratios; np.interp clamps beyond each curve's ends
+        self.table = np.vstack([np.interp(self.grid, *curves[key]) for key in self.keys])
+        self._curve_of_key = {key: i for i, key in enumerate(self.keys)}
+        self._lookup_cache: Dict[Tuple[int, int], np.ndarray] = {}
+
+    @classmethod
+    def from_rows(cls, rows: List[dict], version: str) -> "DamageCurveSet":
+        points: Dict[CurveKey, List[Tuple[float, float]]] = {}
+        for row in rows:
+            key = (row["construction_type"].strip(), row["asset_type"].strip())
+            points.setdefault(key, []).append((float(row["depth_m"]), float(row["damage_ratio"])))
+        curves = {}
+        for key, pts in points.items():
+            pts.sort()
+            depths = np.array([d for d, _ in pts])
+            if len(np.unique(depths)) != len(depths):
+                raise ValueError(f"Damage curve {key} repeats a depth")
+            curves[key] = (depths, np.array([r for _, r in pts]))
+        return cls(curves, version)
+
+    def curve_for(self, construction: str, occupancy: str) -> int:
+        for key in (
+            (construction, occupancy),
+            (construction, WILDCARD),
+            (WILDCARD, occupancy),
+            (WILDCARD, WILDCARD),
+        ):
+            curve = self._curve_of_key.get(key)
+            if curve is not None:
+                return curve
+        raise AssertionError("default curve is always present")
+
+    def curve_lookup(self, store: AssetStore) -> np.ndarray:
+        """(construction code, occupancy code) -> curve index, cached per vocabulary size.
+
+        Codes only ever get appended, so the vocabulary sizes identify the
+        mapping. The trailing row/column handles the missing code -1.
+        """
+        constructions = store.categories["constructionType"].labels
+        occupancies = store.categories["assetType"].labels
+        cache_key = (len(constructions), len(occupancies))
+        lookup = self._lookup_cache.get(cache_key)
+        if lookup is None:
+            lookup = np.array(
+                [
+                    [self.curve_for(c, o) for o in occupancies + [WILDCARD]]
+                    for c in constructions + [WILDCARD]
+                ],
+                dtype=np.intp,
+            ).reshape(len(constructions) + 1, len(occupancies) + 1)
+            self._lookup_cache[cache_key] = lookup
+        return lookup
+
+    def damage_ratios(self, curve: np.ndarray, depth: np.ndarray) -> np.ndarray:
+        """Interpolated damage ratio of ``curve[i]`` at ``depth[i]``, vectorized."""
+        grid = self.grid
+        if len(grid) == 1:
+            return self.table[curve, 0]
+        hi = np.clip(np.searchsorted(grid, depth, side="right"), 1, len(grid) - 1)
+        lo = hi - 1
+        t = np.clip((depth - grid[lo]) / (grid[hi] - grid[lo]), 0.0, 1.0)
+        return self.table[curve, lo] * (1 - t) + self.table[curve, hi] * t
+
+    def loss_ratios(self, store: AssetStore, rows: np.ndarray) -> np.ndarray:
+        """Damage ratio at each row's ``floodDepth``; matches ``LossFactorFn``."""
+        lookup = self.curve_lookup(store)
+        curve = lookup[store.column("constructionType")[rows], store.column("assetType")[rows]]
+        return self.damage_ratios(curve, store.column("floodDepth")[rows])
+
+    def describe(self) -> dict:
+        return {
+            "version": self.version,
+            "curves": [
+                {
+                    "constructionType": construction,
+                    "assetType": occupancy,
+                    "depths": self.curves[(construction, occupancy)][0].tolist(),
+                    "damageRatios": self.curves[(construction, occupancy)][1].tolist(),
+                }
+                for construction, occupancy in self.keys
+            ],
+        }
+
+
+def load_damage_curves(path: Path) -> DamageCurveSet:
+    """Load a curve table; its version is a hash of the file contents."""
+    text = Path(path).read_text()
+    version = hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+    return DamageCurveSet.from_rows(list(csv.DictReader(text.splitlines())), version)
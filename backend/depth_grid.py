@@ -0,0 +1,126 @@
+"""Raster flood-depth grids sampled from memory-mapped arrays.
+
+A depth grid is a directory holding ``depth.npy`` (a 2-D float array, one
+value per cell) and ``grid.json`` with its GDAL-style affine transform and
+nodata value. The array is opened with ``np.load(mmap_mode="r")``, so
+nothing is read up front and grids far larger than RAM work. The mapping
+is advised as random access, so sampling reads only the pages holding the
+cells around the sampled points rather than read-ahead around them.
+
+Depths are bilinearly interpolated between the four cell centres around
+each point, in one vectorized pass over blocks of points. Points are sorted
+by cell first, so each block walks the file in order and touches each page
+once. Corners holding nodata (or NaN) are left out and the remaining
+weights renormalized; points outside the grid, or with no valid corner,
+get NaN.
+"""
+
+import json
+import mmap
+from pathlib import Path
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+DEPTH_FILE = "depth.npy"
+GRID_FILE = "grid.json"
+# Points interpolated per block; bounds the temporary index arrays
+SAMPLE_BLOCK = 1 << 20
+
+
+def write_depth_grid(
+    path: Path, values: np.ndarray, transform: Sequence[float], nodata: Optional[float] = None
+) -> None:
+    """Save ``values`` and their transform as a depth grid directory at ``path``."""
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    np.save(path / DEPTH_FILE, np.asarray(values))
+    (path / GRID_FILE).write_text(json.dumps({"transform": list(map(float, transform)), "nodata": nodata}))
+
+
+class DepthGrid:
+    """Flood depths on a raster grid with an affine transform.
+
+    ``transform`` is GDAL's ``(x0, dx, rx, y0, ry, dy)``: the cell corner
+    at (``col``, ``row``) lies at ``lng = x0 + col * dx + row * rx`` and
+    ``lat = y0 + col * ry + row * dy``. North-up grids have ``rx = ry = 0``
+    and a negative ``dy``.
+    """
+
+    def __init__(self, values: np.ndarray, transform: Sequence[float], nodata: Optional[float] = None):
+        if values.ndim != 2 or values.size == 0:
+            raise ValueError("Depth grid must be a non-empty 2-D array")
+        x0, dx, rx, y0, ry, dy = map(float, transform)
+        det = dx * dy - rx * ry
+        if det == 0:
+            raise ValueError("Depth grid transform is not invertible")
+        self.values = values
+        self.transform = (x0, dx, rx, y0, ry, dy)
+        self.nodata = nodata
+        # (lng, lat) -> (col, row)
+        self._inverse = (dy / det, -rx / det, -ry / det, dx / det)
+
+    @classmethod
+    def open(cls, path: Path) -> "DepthGrid":
+        """Memory-map the depth grid directory at ``path``."""
+        path = Path(path)
+        meta = json.loads((path / GRID_FILE).read_text())
+        values = np.load(path / DEPTH_FILE, mmap_mode="r")
+        mapping = getattr(values, "_mmap", None)
+        if mapping is not None and hasattr(mmap, "MADV_RANDOM"):
+            mapping.madvise(mmap.MADV_RANDOM)
+        return cls(values, meta["transform"], meta.get("nodata"))
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.values.shape
+
+    def pixel(self, lat: np.ndarray, lng: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Fractional ``(col, row)`` of each point; cell ``(c, r)`` spans ``[c, c + 1) x [r, r + 1)``."""
+        x0, _, _, y0, _, _ = self.transform
+        a, b, c, d = self._inverse
+        x, y = np.asarray(lng, dtype=np.float64) - x0, np.asarray(lat, dtype=np.float64) - y0
+        return a * x + b * y, c * x + d * y
+
+    def sample(self, lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+        """Bilinear depth at each point; NaN outside the grid or where no corner has data."""
+        lat = np.asarray(lat, dtype=np.float64)
+        lng = np.asarray(lng, dtype=np.float64)
+        out = np.full(len(lat), np.nan)
+        for start in range(0, len(lat), SAMPLE_BLOCK):
+            block = slice(start, start + SAMPLE_BLOCK)
+            out[block] = self._sample_block(lat[block], lng[block])
+        return out
+
+    def _sample_block(self, lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+        height, width = self.values.shape
+        col, row = self.pixel(lat, lng)
+        out = np.full(len(lat), np.nan)
+        inside = np.flatnonzero((col >= 0) & (col < width) & (row >= 0) & (row < height))
+        if len(inside) == 0:
+            return out
+        # Offsets from the cell centre up and to the left; edges clamp to the outermost centres
+        u, v = col[inside] - 0.5, row[inside] - 0.5
+        c0 = np.clip(np.floor(u), 0, width - 1).astype(np.int64)
+        r0 = np.clip(np.floor(v), 0, height - 1).astype(np.int64)
+        c1, r1 = np.minimum(c0 + 1, width - 1), np.minimum(r0 + 1, height - 1)
+        fu, fv = np.clip(u - c0, 0.0, 1.0), np.clip(v - r0, 0.0, 1.0)
+
+        # Gather in file order so each page is faulted in once; 2-D indexing never copies the array
+        values = self.values
+        strides = np.array(values.strides, dtype=np.int64) // values.itemsize
+        order = np.argsort(r0 * strides[0] + c0 * strides[1], kind="stable")
+        corners = np.empty((4, len(inside)))
+        for k, (r, c) in enumerate(((r0, c0), (r0, c1), (r1, c0), (r1, c1))):
+            corners[k, order] = values[r[order], c[order]]
+        weights = np.stack([(1 - fu) * (1 - fv), fu * (1 - fv), (1 - fu) * fv, fu * fv])
+
+        valid = np.isfinite(corners)
+        if self.nodata is not None:
+            valid &= corners != self.nodata
+        weights = np.where(valid, weights, 0.0)
+        total = weights.sum(axis=0)
+        has_data = total > 0
+        values = np.where(valid, corners, 0.0)
+        out[inside[has_data]] = (weights * values).sum(axis=0)[has_data] / total[has_data]
+        return out
@@ -0,0 +1,214 @@
+"""Paginated and streaming asset export.
+
+Rows come straight from the columnar store in fixed-size chunks and are
+encoded without going through the ``Asset`` model again; the store only
+ever holds validated data. Each chunk is encoded and handed to the client
+before the next one is built, so server memory stays flat however many
+assets are exported.
+
+NDJSON is always available. Arrow IPC and Parquet need ``pyarrow``, which is
+imported on first use.
+"""
+
+import base64
+import binascii
+import json
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+from asset_store import ASSET_FIELDS, AssetStore, patch_sort_order
+from metrics import serialization_timer
+
+EXPORT_CHUNK_ROWS = 10000
+
+
+def dumps_records(records: List[dict]) -> bytes:
+    """Compact JSON of already-validated response data (Asset dicts, KPIs, zones)."""
+    with serialization_timer():
+        return json.dumps(records, separators=(",", ":")).encode("utf-8")
+
+
+def encode_cursor(asset_id: str) -> str:
+    return base64.urlsafe_b64encode(asset_id.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> str:
+    """Inverse of ``encode_cursor``; raises ``ValueError`` on malformed input."""
+    try:
+        return base64.b64decode(cursor.encode("ascii"), altchars=b"-_", validate=True).decode("utf-8")
+    except (binascii.Error, UnicodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+class IdOrder:
+    """Rows sorted by assetId, for keyset (cursor) pagination.
+
+    Cursors name the last assetId served rather than a row number, so pages
+    stay consistent when deletes move rows around. After writes only
+    inserted, deleted and moved rows are re-placed.
+    """
+
+    def __init__(self, store: AssetStore):
+        self.store = store
+        self.rows_version = -1
+        self.row_ids = None
+        self.refresh()
+
+    def refresh(self) -> None:
+        if self.rows_version == self.store.rows_version:
+            return
+        ids = self.store.column("assetId").astype(object)
+        patched = None
+        if self.row_ids is not None:
+            patched = patch_sort_order(self.order, self.sorted_ids, self.row_ids, ids)
+        if patched is None:
+            order = np.argsort(ids.astype(str), kind="stable")
+            patched = order, ids[order]
+        self.order, self.sorted_ids = patched
+        self.row_ids = ids
+        self.rows_version = self.store.rows_version
+
+    def page(self, after: Optional[str], limit: int) -> np.ndarray:
+        """Rows of up to ``limit`` assets whose ID sorts after ``after``."""
+        start = 0 if after is None else int(np.searchsorted(self.sorted_ids, after, side="right"))
+        return self.order[start:start + limit]
+
+
+def iter_row_chunks(store: AssetStore, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[np.ndarray]:
+    """Consecutive row ranges covering the store.
+
+    The size is re-read for every chunk, so rows appended mid-export are
+    included; rows moved by a concurrent delete may be skipped or repeated.
+    """
+    start = 0
+    while start < len(store):
+        end = min(start + chunk_rows, len(store))
+        yield np.arange(start, end)
+        start = end
+
+
+def ndjson_chunks(store: AssetStore, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """One JSON object per line, formatted column-wise from a fixed template.
+
+    Equivalent to ``json.dumps`` per record, several times faster: floats and
+    ints use ``repr`` (as ``json`` does), category labels are JSON-encoded
+    once per chunk and only the free-text fields go through the C escaper.
+    """
+    template = "{" + ",".join(f'"{name}":%s' for name in ASSET_FIELDS) + "}"
+    escape = json.encoder.encode_basestring_ascii
+    for rows in iter_row_chunks(store, chunk_rows):
+        columns = []
+        for name in ASSET_FIELDS:
+            values = store.column(name)[rows]
+            if name in store.categories:
+                labels = [escape(label) for label in store.categories[name].labels] + ["null"]
+                columns.append([labels[code] for code in values.tolist()])
+            elif name in ("assetId", "address"):
+                columns.append([escape(v) for v in values.tolist()])
+            elif values.dtype == bool:
+                columns.append(["true" if v else "false" for v in values.tolist()])
+            else:
+                columns.append([repr(v) for v in values.tolist()])
+        lines = [template % row for row in zip(*columns)]
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _arrow_schema():
+    import pyarrow as pa
+
+    dictionary = pa.dictionary(pa.int16(), pa.string())
+    types = {
+        "assetId": pa.string(),
+        "latitude": pa.float64(),
+        "longitude": pa.float64(),
+        "giv": pa.float64(),
+        "pnl": pa.float64(),
+        "assetType": dictionary,
+        "constructionType": dictionary,
+        "yearBuilt": pa.int64(),
+        "coverageType": dictionary,
+        "riskScore": pa.int64(),
+        "address": pa.string(),
+        "inFloodZone": pa.bool_(),
+        "floodDepth": pa.float64(),
+        "floodCategory": dictionary,
+    }
+    return pa.schema([(name, types[name]) for name in ASSET_FIELDS])
+
+
+def record_batch(store: AssetStore, rows: np.ndarray, schema=None):
+    """Arrow record batch for ``rows``; numeric columns are passed through as-is
+    and categoricals become dictionary arrays over the store's own codes."""
+    import pyarrow as pa
+
+    schema = schema or _arrow_schema()
+    arrays = []
+    for name in ASSET_FIELDS:
+        values = store.column(name)[rows]
+        if name in store.categories:
+            indices = pa.array(values, mask=values < 0, type=pa.int16())
+            labels = pa.array(store.categories[name].labels, type=pa.string())
+            arrays.append(pa.DictionaryArray.from_arrays(indices, labels))
+        else:
+            arrays.append(pa.array(values, type=schema.field(name).type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _DrainableSink:
+    """Write-only file object whose buffered bytes can be taken between writes."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def arrow_chunks(store: AssetStore, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """Arrow IPC stream, one record batch per chunk."""
+    import pyarrow as pa
+
+    schema = _arrow_schema()
+    sink = _DrainableSink()
+    # Dictionaries may grow between batches when new labels are registered
+    options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+    with pa.ipc.new_stream(sink, schema, options=options) as writer:
+        for rows in iter_row_chunks(store, chunk_rows):
+            writer.write_batch(record_batch(store, rows, schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def parquet_chunks(store: AssetStore, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """Parquet file, one row group per chunk; the footer follows the last one."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema()
+    sink = _DrainableSink()
+    with pq.ParquetWriter(sink, schema, compression="snappy") as writer:
+        for rows in iter_row_chunks(store, chunk_rows):
+            writer.write_table(pa.Table.from_batches([record_batch(store, rows, schema)]))
+            yield sink.drain()
+    yield sink.drain()
+
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson", ndjson_chunks),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows", arrow_chunks),
+    "parquet": ("application/vnd.apache.parquet", "parquet", parquet_chunks),
+}
@@ -0,0 +1,262 @@
+"""Point-in-polygon flood exposure engine.
+
+Flood zone rings are indexed in a uniform grid keyed on their bounding
+boxes. Asset points are bucketed into the same grid, so each polygon is only
+tested against the points in the cells its bounding box covers, and those
+candidates are classified with a vectorized even-odd ray cast. Large rings
+are additionally split into horizontal slabs so each candidate only meets
+the handful of edges that span its latitude.
+
+An optional ``DepthGrid`` refines depths: zones still decide which assets
+flood, but where the grid has data its sampled depth replaces the zone's
+single ``flood_depth_m``.
+
+Coordinates follow ``FloodZone.coordinates``: ``[lat, lng]`` pairs.
+"""
+
+from typing import Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+
+from asset_store import AssetStore
+from depth_grid import DepthGrid
+
+# Upper bound on the (points x edges) boolean matrices built per ray-cast block
+RAY_CAST_BLOCK_ELEMENTS = 1 << 20
+# Rings with at least this many edges are split into horizontal slabs
+SLAB_MIN_EDGES = 64
+
+
+def _ray_cast(lat: np.ndarray, lng: np.ndarray, y0, x0, y1, slope) -> np.ndarray:
+    """Crossing parity of a horizontal ray from each point against the given edges."""
+    inside = np.zeros(len(lat), dtype=bool)
+    if len(lat) == 0 or len(y0) == 0:
+        return inside
+    py = lat[:, None]
+    px = lng[:, None]
+    block = max(1, RAY_CAST_BLOCK_ELEMENTS // len(lat))
+    for start in range(0, len(y0), block):
+        end = start + block
+        ey0, ey1 = y0[start:end], y1[start:end]
+        crosses = (ey0 > py) != (ey1 > py)
+        x_cross = x0[start:end] + (py - ey0) * slope[start:end]
+        hits = crosses & (px < x_cross)
+        inside ^= (np.count_nonzero(hits, axis=1) & 1).astype(bool)
+    return inside
+
+
+def points_in_ring(lat: np.ndarray, lng: np.ndarray, ring: np.ndarray) -> np.ndarray:
+    """Even-odd test of every (lat, lng) point against one polygon ring.
+
+    Edges are broadcast against the points in blocks. Rings with many edges are
+    first cut into horizontal slabs so each point is only tested against the
+    edges spanning its own slab.
+    """
+    if len(lat) == 0 or len(ring) < 3:
+        return np.zeros(len(lat), dtype=bool)
+    y1, x1 = ring[:, 0], ring[:, 1]
+    y0, x0 = np.roll(y1, 1), np.roll(x1, 1)
+    # Horizontal edges never cross the ray; dropping them also avoids 0/0
+    keep = y0 != y1
+    y0, x0, y1, x1 = y0[keep], x0[keep], y1[keep], x1[keep]
+    slope = (x1 - x0) / (y1 - y0)
+    if len(y0) < SLAB_MIN_EDGES:
+        return _ray_cast(lat, lng, y0, x0, y1, slope)
+
+    n_slabs = int(np.sqrt(len(y0)))
+    lo = ring[:, 0].min()
+    width = (ring[:, 0].max() - lo) / n_slabs
+
+    def slab_of(y):
+        return np.clip(np.floor((y - lo) / width).astype(np.int64), 0, n_slabs - 1)
+
+    edge_lo = slab_of(np.minimum(y0, y1))
+    edge_hi = slab_of(np.maximum(y0, y1))
+    point_slab = slab_of(lat)
+    order = np.argsort(point_slab, kind="stable")
+    bounds = np.searchsorted(point_slab[order], np.arange(n_slabs + 1))
+
+    inside = np.zeros(len(lat), dtype=bool)
+    for slab in range(n_slabs):
+        rows = order[bounds[slab]:bounds[slab + 1]]
+        if len(rows) == 0:
+            continue
+        edges = (edge_lo <= slab) & (edge_hi >= slab)
+        inside[rows] = _ray_cast(lat[rows], lng[rows], y0[edges], x0[edges], y1[edges], slope[edges])
+    return inside
+
+
+def zone_bbox_rows(store: AssetStore, zones: Sequence[dict]) -> np.ndarray:
+    """Rows of assets inside the bounding box of any of ``zones``."""
+    lat = store.column("latitude")
+    lng = store.column("longitude")
+    mask = np.zeros(len(store), dtype=bool)
+    for zone in zones:
+        ring = np.asarray(zone["coordinates"], dtype=np.float64).reshape(-1, 2)
+        if len(ring) == 0:
+            continue
+        mask |= (
+            (lat >= ring[:, 0].min()) & (lat <= ring[:, 0].max())
+            & (lng >= ring[:, 1].min()) & (lng <= ring[:, 1].max())
+        )
+    return np.flatnonzero(mask)
+
+
+class GridIndex:
+    """Uniform grid over polygon bounding boxes; each polygon covers a rectangle of cells.
+
+    Polygons whose rectangle spans more than ``BIG_POLYGON_ROWS`` grid rows
+    (a zone far larger than the typical one) are listed in ``big`` and
+    matched against points by bounding box instead, so one oversized zone
+    costs a single pass over the points rather than work per cell.
+    """
+
+    BIG_POLYGON_ROWS = 1024
+
+    def __init__(self, bboxes: np.ndarray, cell_size: Optional[float] = None):
+        # bboxes: (P, 4) array of [min_lat, min_lng, max_lat, max_lng]
+        self.bboxes = bboxes
+        if len(bboxes) == 0:
+            self.origin = np.zeros(2)
+            self.cell_size = 1.0
+        else:
+            self.origin = bboxes[:, :2].min(axis=0)
+            if cell_size is None:
+                # Roughly one polygon bbox per cell keeps candidate lists short
+                extents = np.maximum(bboxes[:, 2] - bboxes[:, 0], bboxes[:, 3] - bboxes[:, 1])
+                cell_size = float(np.median(extents)) or 1e-3
+            self.cell_size = cell_size
+        # Inclusive (row, col) cell ranges per polygon
+        self.lo = np.stack(self.cell_of(bboxes[:, 0], bboxes[:, 1]), axis=1)
+        self.hi = np.stack(self.cell_of(bboxes[:, 2], bboxes[:, 3]), axis=1)
+        self.big = set(np.flatnonzero(self.hi[:, 0] - self.lo[:, 0] + 1 > self.BIG_POLYGON_ROWS).tolist())
+
+    def cell_of(self, lat: np.ndarray, lng: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        i = np.floor((np.asarray(lat) - self.origin[0]) / self.cell_size).astype(np.int64)
+        j = np.floor((np.asarray(lng) - self.origin[1]) / self.cell_size).astype(np.int64)
+        return i, j
+
+
+class PointBuckets:
+    """Asset points sorted by grid cell so each cell's points are a contiguous slice."""
+
+    # Cell coordinates are packed into one int64 key: i * CELL_KEY_STRIDE + j
+    CELL_KEY_STRIDE = 1 << 31
+
+    def __init__(self, grid: GridIndex, lat: np.ndarray, lng: np.ndarray):
+        i, j = grid.cell_of(lat, lng)
+        keys = i * self.CELL_KEY_STRIDE + j
+        self.order = np.argsort(keys, kind="stable")
+        self.sorted_keys = keys[self.order]
+
+    def rows_in_box(self, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+        """Points in the cells from ``lo`` to ``hi`` (inclusive ``(row, col)``): one slice per grid row."""
+        rows = np.arange(lo[0], hi[0] + 1, dtype=np.int64) * self.CELL_KEY_STRIDE
+        starts = np.searchsorted(self.sorted_keys, rows + lo[1], side="left")
+        ends = np.searchsorted(self.sorted_keys, rows + hi[1], side="right")
+        lengths = ends - starts
+        idx = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+        return self.order[idx]
+
+
+class FloodExposureEngine:
+    """Batch-classifies asset points against flood zone polygons.
+
+    Where zones overlap, the deepest zone wins; equal depths fall back to the
+    lowest ``flood_id`` so results do not depend on input order. Other
+    polygon hazards can name their own ID and value fields.
+    """
+
+    def __init__(
+        self,
+        zones: Sequence[dict],
+        cell_size: Optional[float] = None,
+        id_field: str = "flood_id",
+        value_field: str = "flood_depth_m",
+        depth_grid: Optional[DepthGrid] = None,
+    ):
+        self.depth_grid = depth_grid
+        self.zones = sorted(zones, key=lambda z: z[id_field])
+        self.rings = [np.asarray(z["coordinates"], dtype=np.float64).reshape(-1, 2) for z in self.zones]
+        self.depths = np.array([z[value_field] for z in self.zones], dtype=np.float64)
+        bboxes = np.array(
+            [[r[:, 0].min(), r[:, 1].min(), r[:, 0].max(), r[:, 1].max()] for r in self.rings],
+            dtype=np.float64,
+        ).reshape(-1, 4)
+        self.grid = GridIndex(bboxes, cell_size)
+
+    def _zone_hits(self, lat: np.ndarray, lng: np.ndarray) -> Iterator[Tuple[int, np.ndarray]]:
+        """``(zone index, points inside it)`` for every zone holding any of the points."""
+        buckets = PointBuckets(self.grid, lat, lng)
+        for idx, ring in enumerate(self.rings):
+            min_lat, min_lng, max_lat, max_lng = self.grid.bboxes[idx]
+            if idx in self.grid.big:
+                rows = np.flatnonzero((lat >= min_lat) & (lat <= max_lat) & (lng >= min_lng) & (lng <= max_lng))
+            else:
+                rows = buckets.rows_in_box(self.grid.lo[idx], self.grid.hi[idx])
+                plat, plng = lat[rows], lng[rows]
+                rows = rows[(plat >= min_lat) & (plat <= max_lat) & (plng >= min_lng) & (plng <= max_lng)]
+            if len(rows) == 0:
+                continue
+            rows = rows[points_in_ring(lat[rows], lng[rows], ring)]
+            if len(rows):
+                yield idx, rows
+
+    def classify(self, lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+        """Index into ``self.zones`` of the winning zone per point (-1 if none)."""
+        lat = np.asarray(lat, dtype=np.float64)
+        lng = np.asarray(lng, dtype=np.float64)
+        zone_idx = np.full(len(lat), -1, dtype=np.int64)
+        best_depth = np.full(len(lat), -np.inf)
+        if len(lat) == 0 or not self.zones:
+            return zone_idx
+        for idx, rows in self._zone_hits(lat, lng):
+            rows = rows[self.depths[idx] > best_depth[rows]]
+            zone_idx[rows] = idx
+            best_depth[rows] = self.depths[idx]
+        return zone_idx
+
+    def memberships(self, lat: np.ndarray, lng: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """``(point, zone)`` index pairs for every zone each point lies in, overlapping zones included."""
+        lat = np.asarray(lat, dtype=np.float64)
+        lng = np.asarray(lng, dtype=np.float64)
+        if len(lat) == 0 or not self.zones:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        hits = list(self._zone_hits(lat, lng))
+        if not hits:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        points = np.concatenate([rows for _, rows in hits]).astype(np.int64)
+        zones = np.concatenate([np.full(len(rows), idx, dtype=np.int64) for idx, rows in hits])
+        return points, zones
+
+    def grid_depths(self, lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+        """The depth grid's depth per point, NaN without a grid or where it has no data."""
+        if self.depth_grid is None:
+            return np.full(len(lat), np.nan)
+        return np.maximum(self.depth_grid.sample(lat, lng), 0.0)
+
+    def point_depths(self, lat: np.ndarray, lng: np.ndarray, zone_idx: np.ndarray) -> np.ndarray:
+        """Flood depth per point: the depth grid's where it has data, else its zone's (0 outside zones)."""
+        depths = np.append(self.depths, 0.0)[zone_idx]
+        if self.depth_grid is not None:
+            hit = np.flatnonzero(zone_idx >= 0)
+            sampled = self.grid_depths(np.asarray(lat)[hit], np.asarray(lng)[hit])
+            covered = ~np.isnan(sampled)
+            depths[hit[covered]] = sampled[covered]
+        return depths
+
+    def apply(self, store: AssetStore, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Write inFloodZone/floodDepth/floodCategory for ``rows`` (default all) back onto ``store``."""
+        if rows is None:
+            rows = np.arange(len(store))
+        lat, lng = store.column("latitude")[rows], store.column("longitude")[rows]
+        zone_idx = self.classify(lat, lng)
+        hit = zone_idx >= 0
+        categories = store.categories["floodCategory"]
+        zone_codes = np.array([categories.code(z["flood_category"]) for z in self.zones] + [-1], dtype=np.int16)
+
+        store.column("inFloodZone")[rows] = hit
+        store.column("floodDepth")[rows] = self.point_depths(lat, lng, zone_idx)
+        store.column("floodCategory")[rows] = zone_codes[zone_idx]
+        store.touch()
+        return zone_idx
@@ -0,0 +1,52 @@
+"""Flood zone registry with an ID index."""
+
+from typing import Dict, Iterator, List, Optional, Sequence
+
+
+class FloodZoneStore:
+    """Ordered list of flood zone dicts with a ``flood_id -> position`` index.
+
+    ``version`` increases on every upsert and delete.
+    """
+
+    def __init__(self, zones: Sequence[dict] = ()):
+        self._zones: List[dict] = []
+        self._index: Dict[str, int] = {}
+        self.version = 0
+        for zone in zones:
+            self.upsert(zone)
+
+    def __len__(self) -> int:
+        return len(self._zones)
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(self._zones)
+
+    def all(self) -> List[dict]:
+        return list(self._zones)
+
+    def get(self, zone_id: str) -> Optional[dict]:
+        pos = self._index.get(zone_id)
+        return None if pos is None else self._zones[pos]
+
+    def upsert(self, zone: dict) -> None:
+        self.version += 1
+        pos = self._index.get(zone["flood_id"])
+        if pos is None:
+            self._index[zone["flood_id"]] = len(self._zones)
+            self._zones.append(zone)
+        else:
+            self._zones[pos] = zone
+
+    def delete(self, zone_id: str) -> Optional[dict]:
+        """Remove a zone, moving the last zone into its slot. Returns the removed zone."""
+        pos = self._index.pop(zone_id, None)
+        if pos is None:
+            return None
+        self.version += 1
+        removed = self._zones[pos]
+        last = self._zones.pop()
+        if pos < len(self._zones):
+            self._zones[pos] = last
+            self._index[last["flood_id"]] = pos
+        return removed
@@ -0,0 +1,248 @@
+"""Multi-peril hazard layers and the per-asset hazard matrix.
+
+A hazard layer gives one peril's intensity at each asset (NaN where the
+asset is not exposed):
+
+- ``PolygonHazardLayer``: zones with an intensity each, classified with the
+  flood engine's grid-indexed ray cast; the most intense zone wins.
+- ``RasterHazardLayer``: a regular lat/lng grid, sampled at the cell each
+  asset falls in.
+- ``FloodHazardLayer``: the flood exposure the store already holds
+  (``floodDepth`` where ``inFloodZone``), so flood is not classified twice.
+
+``HazardMatrix`` keeps every layer's intensities for every asset in one
+dense float32 (assets x perils) array. Adding a layer samples all assets
+in one vectorized pass; per-peril and combined KPIs are reductions over the
+array, sampled on first use. Writers keep it in step with the store like
+``KPIAggregates``: ``refresh(rows)`` once rows hold their new values,
+``move(src, dst)`` after deletes.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from asset_store import AssetStore
+from exposure import FloodExposureEngine
+
+FLOOD_PERIL = "flood"
+
+
+class PolygonHazardLayer:
+    kind = "polygon"
+
+    def __init__(self, peril: str, zones: Sequence[dict], unit: str = "", description: str = ""):
+        """``zones`` are ``{"id", "intensity", "coordinates"}`` dicts, coordinates as ``[lat, lng]`` pairs."""
+        self.peril, self.unit, self.description = peril, unit, description
+        self.engine = FloodExposureEngine(zones, id_field="id", value_field="intensity")
+
+    def sample(self, store: AssetStore, rows: np.ndarray) -> np.ndarray:
+        zone_idx = self.engine.classify(store.column("latitude")[rows], store.column("longitude")[rows])
+        return np.append(self.engine.depths, np.nan)[zone_idx]
+
+    def info(self) -> dict:
+        return {"zoneCount": len(self.engine.zones)}
+
+
+class RasterHazardLayer:
+    kind = "raster"
+
+    def __init__(
+        self,
+        peril: str,
+        values: np.ndarray,
+        origin: Tuple[float, float],
+        cell_size: Tuple[float, float],
+        nodata: Optional[float] = None,
+        unit: str = "",
+        description: str = "",
+    ):
+        """``values[i, j]`` covers the cell ``i`` rows south and ``j`` columns east of ``origin``.
+
+        ``origin`` is the grid's ``(north lat, west lng)`` corner and
+        ``cell_size`` its ``(lat, lng)`` step in degrees. Cells holding
+        ``nodata`` (or NaN) leave assets unexposed.
+        """
+        self.peril, self.unit, self.description = peril, unit, description
+        self.values = np.asarray(values, dtype=np.float32)
+        if self.values.ndim != 2 or self.values.size == 0:
+            raise ValueError("Raster values must be a non-empty 2-D grid")
+        if cell_size[0] <= 0 or cell_size[1] <= 0:
+            raise ValueError("Raster cell sizes must be positive")
+        self.origin, self.cell_size, self.nodata = tuple(origin), tuple(cell_size), nodata
+
+    def sample(self, store: AssetStore, rows: np.ndarray) -> np.ndarray:
+        lat, lng = store.column("latitude")[rows], store.column("longitude")[rows]
+        i = np.floor((self.origin[0] - lat) / self.cell_size[0]).astype(np.int64)
+        j = np.floor((lng - self.origin[1]) / self.cell_size[1]).astype(np.int64)
+        height, width = self.values.shape
+        inside = (i >= 0) & (i < height) & (j >= 0) & (j < width)
+        out = np.full(len(rows), np.nan, dtype=np.float32)
+        out[inside] = self.values[i[inside], j[inside]]
+        if self.nodata is not None:
+            out[out == self.nodata] = np.nan
+        return out
+
+    def info(self) -> dict:
+        return {"shape": list(self.values.shape)}
+
+
+class FloodHazardLayer:
+    kind = "flood_zones"
+
+    def __init__(self, unit: str = "m", description: str = "Flood depth from the flood zones"):
+        self.peril, self.unit, self.description = FLOOD_PERIL, unit, description
+
+    def sample(self, store: AssetStore, rows: np.ndarray) -> np.ndarray:
+        depth = store.column("floodDepth")[rows]
+        return np.where(store.column("inFloodZone")[rows], depth, np.nan)
+
+    def info(self) -> dict:
+        return {}
+
+
+def hazard_layer(spec: dict):
+    """Build a polygon or raster layer from its API/spec form; raises ``ValueError`` on bad specs."""
+    common = dict(unit=spec.get("unit") or "", description=spec.get("description") or "")
+    if spec["kind"] == "polygon":
+        for zone in spec["zones"]:
+            if len(zone["coordinates"]) < 3 or any(len(p) != 2 for p in zone["coordinates"]):
+                raise ValueError(f"Zone {zone['id']} needs at least 3 [lat, lng] vertices")
+        return PolygonHazardLayer(spec["peril"], spec["zones"], **common)
+    if spec["kind"] == "raster":
+        values = spec["values"]
+        if not isinstance(values, np.ndarray) and len({len(row) for row in values}) > 1:
+            raise ValueError("Raster rows must all be the same length")
+        return RasterHazardLayer(
+            spec["peril"], values, tuple(spec["origin"]), tuple(spec["cellSize"]), spec.get("nodata"), **common
+        )
+    raise ValueError(f"Unknown hazard layer kind {spec['kind']}")
+
+
+class HazardMatrix:
+    """Dense (assets x perils) hazard intensities over an ``AssetStore``."""
+
+    def __init__(self, store: AssetStore, layers: Sequence = ()):
+        self.store = store
+        self.layers: List = list(layers)
+        # Bumped whenever the values change, for response caching
+        self.version = 0
+        self._values: Optional[np.ndarray] = None
+
+    def warm(self) -> None:
+        """Sample every layer at every asset now instead of on the first ``values`` read."""
+        if self._values is None:
+            self._values = self._sample(np.arange(len(self.store)), self.layers)
+
+    @property
+    def values(self) -> np.ndarray:
+        """(assets x perils) intensities."""
+        self.warm()
+        return self._values
+
+    @property
+    def perils(self) -> List[str]:
+        return [layer.peril for layer in self.layers]
+
+    def layer(self, peril: str):
+        return next((layer for layer in self.layers if layer.peril == peril), None)
+
+    def _sample(self, rows: np.ndarray, layers: Sequence) -> np.ndarray:
+        columns = [layer.sample(self.store, rows) for layer in layers]
+        return np.column_stack(columns).astype(np.float32) if columns else np.empty((len(rows), 0), np.float32)
+
+    def rebuild(self) -> None:
+        """Drop the values; every layer is sampled at every asset again on next use."""
+        self._values = None
+        self.version += 1
+
+    def set_layer(self, layer) -> None:
+        """Add ``layer``, or replace the one for the same peril; only its column is sampled."""
+        index = self.perils.index(layer.peril) if layer.peril in self.perils else None
+        if self._values is not None:
+            column = self._sample(np.arange(len(self.store)), [layer])
+            if index is None:
+                self._values = np.hstack([self._values, column])
+            else:
+                self._values[:, index] = column[:, 0]
+        if index is None:
+            self.layers.append(layer)
+        else:
+            self.layers[index] = layer
+        self.version += 1
+
+    def remove_layer(self, peril: str):
+        """Drop a peril's layer and column; returns the layer (None if there was none)."""
+        if peril not in self.perils:
+            return None
+        index = self.perils.index(peril)
+        if self._values is not None:
+            self._values = np.delete(self._values, index, axis=1)
+        self.version += 1
+        return self.layers.pop(index)
+
+    def refresh(self, rows: np.ndarray, perils: Optional[Sequence[str]] = None) -> None:
+        """Re-sample ``rows`` (grown to the store's size first) for ``perils`` (default all)."""
+        self.version += 1
+        if self._values is None:
+            return
+        rows = np.asarray(rows, dtype=np.intp)
+        if len(self._values) < len(self.store):
+            grown = np.full((len(self.store) - len(self._values), len(self.layers)), np.nan, dtype=np.float32)
+            self._values = np.vstack([self._values, grown])
+        columns = [i for i, layer in enumerate(self.layers) if perils is None or layer.peril in perils]
+        if len(rows) and columns:
+            self._values[np.ix_(rows, columns)] = self._sample(rows, [self.layers[i] for i in columns])
+
+    def move(self, src: np.ndarray, dst: np.ndarray) -> None:
+        """Follow ``AssetStore.delete``: rows at ``src`` now live at ``dst``, the tail is gone."""
+        self.version += 1
+        if self._values is None:
+            return
+        self._values[dst] = self._values[src]
+        self._values = self._values[:len(self.store)]
+
+    def intensities(self, row: int) -> Dict[str, Optional[float]]:
+        """One asset's hazard vector, None where it is not exposed."""
+        # str() gives the shortest float32 repr, so 0.406 is not reported as 0.4059999883
+        return {p: None if np.isnan(v) else float(str(v)) for p, v in zip(self.perils, self.values[row])}
+
+    def kpis(self, rows: Optional[np.ndarray] = None) -> dict:
+        """Per-peril exposure KPIs and combined multi-peril KPIs for ``rows`` (default all)."""
+        if rows is None:
+            rows = np.arange(len(self.store))
+        values = self.values[rows]
+        giv, pnl = self.store.column("giv")[rows], self.store.column("pnl")[rows]
+        exposed = ~np.isnan(values)
+        counts = exposed.sum(axis=0)
+        intensity = np.where(exposed, values, 0).astype(np.float64)
+        perils = []
+        for i, layer in enumerate(self.layers):
+            n = int(counts[i])
+            perils.append({
+                "peril": layer.peril,
+                "unit": layer.unit,
+                "exposedAssetCount": n,
+                "exposedGIV": float(giv @ exposed[:, i]),
+                "exposedPnL": float(pnl @ exposed[:, i]),
+                "meanIntensity": float(intensity[:, i].sum() / n) if n else 0.0,
+                "givWeightedIntensity": float(giv @ intensity[:, i] / (giv @ exposed[:, i])) if n else 0.0,
+                "maxIntensity": float(str(values[exposed[:, i], i].max())) if n else 0.0,
+            })
+        per_asset = exposed.sum(axis=1)
+        by_count = [
+            {"perilCount": k, "assetCount": int((per_asset == k).sum()), "giv": float(giv[per_asset == k].sum())}
+            for k in range(len(self.layers) + 1)
+        ]
+        return {
+            "perils": perils,
+            "combined": {
+                "totalAssets": len(giv),
+                "totalGIV": float(giv.sum()),
+                "anyPerilAssetCount": int((per_asset > 0).sum()),
+                "anyPerilGIV": float(giv[per_asset > 0].sum()),
+                "multiPerilAssetCount": int((per_asset > 1).sum()),
+                "multiPerilGIV": float(giv[per_asset > 1].sum()),
+                "byPerilCount": by_count,
+            },
+        }
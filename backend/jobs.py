@@ -0,0 +1,193 @@
+"""Background jobs for long-running analytics.
+
+Handlers run as asyncio tasks, at most ``max_concurrent`` at a time, and
+push their CPU-bound work onto a thread pool of the same size with
+``JobRunner.run_sync``. The event loop stays free for other requests;
+NumPy releases the GIL for the heavy array work.
+
+Job documents live in a MongoDB collection so they can still be looked up
+after a restart. Status changes are written straight away. Progress
+updates are written at most every ``PROGRESS_WRITE_INTERVAL`` seconds, but
+watchers in this process see every update.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED_STATES = (SUCCEEDED, FAILED)
+
+PROGRESS_WRITE_INTERVAL = 1.0
+# Finished jobs kept in memory (with results); older ones are read from MongoDB
+MAX_RETAINED_JOBS = 100
+
+ProgressFn = Callable[[float, Optional[str]], None]
+JobHandler = Callable[[dict, ProgressFn], Awaitable[Any]]
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class JobRunner:
+    """Runs registered job kinds in the background and tracks their state."""
+
+    def __init__(self, collection, max_concurrent: int):
+        self.collection = collection
+        self.max_concurrent = max_concurrent
+        self._handlers: Dict[str, JobHandler] = {}
+        # Jobs submitted by this process; finished ones until evicted
+        self._jobs: Dict[str, dict] = {}
+        self._results: "OrderedDict[str, Any]" = OrderedDict()
+        self._changed: Dict[str, asyncio.Event] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._last_write: Dict[str, float] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    @property
+    def kinds(self) -> List[str]:
+        return sorted(self._handlers)
+
+    async def run_sync(self, fn: Callable, *args) -> Any:
+        """Run blocking ``fn(*args)`` on the job thread pool."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="job")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def submit(self, kind: str, params: dict) -> dict:
+        """Queue a job and return its document; raises ``KeyError`` for unknown kinds."""
+        handler = self._handlers[kind]
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        job = {
+            "id": str(uuid.uuid4()),
+            "kind": kind,
+            "status": QUEUED,
+            "progress": 0.0,
+            "message": None,
+            "params": params,
+            "error": None,
+            "createdAt": _now(),
+            "startedAt": None,
+            "finishedAt": None,
+        }
+        self._jobs[job["id"]] = job
+        self._changed[job["id"]] = asyncio.Event()
+        await self._persist(job, {**job, "result": None})
+        self._tasks[job["id"]] = asyncio.create_task(self._run(job, handler))
+        return dict(job)
+
+    async def _run(self, job: dict, handler: JobHandler) -> None:
+        loop = asyncio.get_running_loop()
+
+        def report(fraction: float, message: Optional[str] = None) -> None:
+            # Called from worker threads as well as from the loop
+            loop.call_soon_threadsafe(self._progress, job, fraction, message)
+
+        async with self._semaphore:
+            await self._update(job, status=RUNNING, startedAt=_now())
+            try:
+                result = await handler(job["params"], report)
+            except Exception as exc:
+                logger.exception("Job %s (%s) failed", job["id"], job["kind"])
+                await self._update(job, status=FAILED, error=str(exc) or type(exc).__name__, finishedAt=_now())
+            else:
+                self._results[job["id"]] = result
+                await self._update(job, {"result": result}, status=SUCCEEDED, progress=1.0, finishedAt=_now())
+            finally:
+                self._tasks.pop(job["id"], None)
+                self._last_write.pop(job["id"], None)
+                self._retain(job["id"])
+
+    def _retain(self, job_id: str) -> None:
+        self._results.setdefault(job_id, None)
+        self._results.move_to_end(job_id)
+        while len(self._results) > MAX_RETAINED_JOBS:
+            evicted, _ = self._results.popitem(last=False)
+            self._jobs.pop(evicted, None)
+            self._changed.pop(evicted, None)
+
+    def _progress(self, job: dict, fraction: float, message: Optional[str]) -> None:
+        if job["status"] != RUNNING:
+            return
+        job["progress"] = min(max(float(fraction), 0.0), 1.0)
+        if message is not None:
+            job["message"] = message
+        self._notify(job["id"])
+        if time.monotonic() - self._last_write.get(job["id"], 0.0) >= PROGRESS_WRITE_INTERVAL:
+            self._last_write[job["id"]] = time.monotonic()
+            asyncio.ensure_future(self._persist(job, {"progress": job["progress"], "message": job["message"]}))
+
+    async def _update(self, job: dict, extra: Optional[dict] = None, **fields) -> None:
+        job.update(fields)
+        self._notify(job["id"])
+        await self._persist(job, {**fields, **(extra or {})})
+
+    def _notify(self, job_id: str) -> None:
+        event = self._changed.get(job_id)
+        if event is not None:
+            event.set()
+            self._changed[job_id] = asyncio.Event()
+
+    async def _persist(self, job: dict, fields: dict) -> None:
+        try:
+            await self.collection.update_one({"id": job["id"]}, {"$set": fields}, upsert=True)
+        except Exception:
+            logger.warning("Could not persist state of job %s", job["id"], exc_info=True)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        """Job document without its result, from memory or MongoDB."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return dict(job)
+        return await self.collection.find_one({"id": job_id}, {"_id": 0, "result": 0})
+
+    async def result(self, job_id: str) -> Any:
+        if job_id in self._results:
+            return self._results[job_id]
+        doc = await self.collection.find_one({"id": job_id}, {"_id": 0, "result": 1})
+        return None if doc is None else doc.get("result")
+
+    async def list(self, limit: int) -> List[dict]:
+        cursor = self.collection.find({}, {"_id": 0, "result": 0}).sort("createdAt", -1)
+        return await cursor.to_list(limit)
+
+    async def watch(self, job_id: str) -> AsyncIterator[dict]:
+        """Yield the job document on every change until it finishes."""
+        while True:
+            event = self._changed.get(job_id)
+            job = await self.get(job_id)
+            if job is None:
+                return
+            yield job
+            if job["status"] in FINISHED_STATES or event is None:
+                return
+            await event.wait()
+
+    async def recover(self) -> None:
+        """Mark jobs a previous process left unfinished as failed."""
+        await self.collection.update_many(
+            {"status": {"$in": [QUEUED, RUNNING]}, "id": {"$nin": list(self._jobs)}},
+            {"$set": {"status": FAILED, "error": "Interrupted by server restart", "finishedAt": _now()}},
+        )
+
+    def shutdown(self) -> None:
+        for task in list(self._tasks.values()):
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
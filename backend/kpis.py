@@ -0,0 +1,264 @@
+"""Portfolio and flood KPI aggregates.
+
+``KPIAggregates`` keeps running totals for the dashboard KPIs so reads are
+O(1). Writers bracket every change to the asset store: ``remove(rows)``
+while the rows still hold their old values, ``add(rows)`` once the new
+values (including exposure fields) are in place.
+"""
+
+import heapq
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from asset_store import AssetStore
+
+LossFactorFn = Callable[[AssetStore, np.ndarray], np.ndarray]
+
+
+def grouped_kpis(
+    store: AssetStore,
+    rows: np.ndarray,
+    loss_factors: LossFactorFn,
+    group_by: Optional[str] = None,
+) -> List[dict]:
+    """Portfolio and flood KPIs for ``rows``, optionally split by a categorical column.
+
+    ``group_by`` may be a categorical column name or ``"inFloodZone"``. Sums
+    are ``np.bincount`` reductions over group codes; per-group medians come
+    from one lexsort. Groups with no rows are omitted.
+    """
+    rows = np.asarray(rows, dtype=np.intp)
+    if group_by is None:
+        codes = np.zeros(len(rows), dtype=np.intp)
+        labels: List[Optional[str]] = [None]
+    elif group_by == "inFloodZone":
+        codes = store.column("inFloodZone")[rows].astype(np.intp)
+        labels = ["false", "true"]
+    else:
+        # Shift so the "missing" code -1 lands in bucket 0
+        codes = store.column(group_by)[rows].astype(np.intp) + 1
+        labels = [None] + store.categories[group_by].labels
+    n = len(labels)
+
+    giv, pnl = store.column("giv")[rows], store.column("pnl")[rows]
+    flooded = store.column("inFloodZone")[rows]
+    depth = store.column("floodDepth")[rows]
+    loss = np.zeros(len(rows))
+    loss[flooded] = giv[flooded] * loss_factors(store, rows[flooded])
+
+    count = np.bincount(codes, minlength=n)
+    total_giv = np.bincount(codes, weights=giv, minlength=n)
+    total_pnl = np.bincount(codes, weights=pnl, minlength=n)
+    flooded_count = np.bincount(codes, weights=flooded, minlength=n)
+    flooded_giv = np.bincount(codes, weights=giv * flooded, minlength=n)
+    flooded_pnl = np.bincount(codes, weights=pnl * flooded, minlength=n)
+    flood_loss = np.bincount(codes, weights=loss, minlength=n)
+
+    # Upper median of positive flooded depths per group: sort by (group, depth)
+    wet = flooded & (depth > 0)
+    wet_codes, wet_depth = codes[wet], depth[wet]
+    order = np.lexsort((wet_depth, wet_codes))
+    wet_codes, wet_depth = wet_codes[order], wet_depth[order]
+    starts = np.searchsorted(wet_codes, np.arange(n), side="left")
+    ends = np.searchsorted(wet_codes, np.arange(n), side="right")
+
+    groups = []
+    for g in np.flatnonzero(count).tolist():
+        wet_n = ends[g] - starts[g]
+        median = float(wet_depth[starts[g] + wet_n // 2]) if wet_n else 0
+        groups.append(
+            {
+                "key": labels[g],
+                "portfolio": {
+                    "totalGIV": float(total_giv[g]),
+                    "totalPnL": float(total_pnl[g]),
+                    "impactedGIV": float(flooded_giv[g]),
+                    "impactedPnL": float(flooded_pnl[g]),
+                    "assetCount": int(count[g]),
+                },
+                "flood": {
+                    "floodedGIV": float(flooded_giv[g]),
+                    "estimatedFloodLoss": float(flood_loss[g]),
+                    "exposedAssetCount": int(flooded_count[g]),
+                    "medianFloodDepth": median,
+                    "totalAssets": int(count[g]),
+                },
+            }
+        )
+    return groups
+
+
+class RunningMedian:
+    """Multiset of floats with O(log N) add/remove and O(1) upper median.
+
+    Two heaps split the sorted values: ``_low`` (negated max-heap) holds the
+    smallest ``len // 2``, ``_high`` the rest, so the median is ``_high[0]``.
+    Removals are lazy: a removed value is counted against the heap holding
+    it and popped once it reaches the top. Equal values are interchangeable,
+    so it never matters which copy goes. Building from N values is one
+    ``np.partition`` and two ``heapify`` calls, O(N).
+    """
+
+    def __init__(self, values: Sequence[float] = ()):
+        values = np.asarray(values, dtype=np.float64)
+        half = len(values) // 2
+        if len(values):
+            values = np.partition(values, half)
+        self._low: List[float] = (-values[:half]).tolist()
+        self._high: List[float] = values[half:].tolist()
+        heapq.heapify(self._low)
+        heapq.heapify(self._high)
+        self._low_size, self._high_size = half, len(values) - half
+        self._low_deleted: Counter = Counter()
+        self._high_deleted: Counter = Counter()
+        self._pending = 0
+
+    def __len__(self) -> int:
+        return self._low_size + self._high_size
+
+    @property
+    def median(self) -> float:
+        return self._high[0] if self._high_size else 0
+
+    def _prune(self) -> None:
+        for heap, deleted, sign in ((self._low, self._low_deleted, -1), (self._high, self._high_deleted, 1)):
+            while heap and deleted[sign * heap[0]]:
+                value = sign * heapq.heappop(heap)
+                deleted[value] -= 1
+                if not deleted[value]:
+                    del deleted[value]
+                self._pending -= 1
+
+    def _rebalance(self) -> None:
+        target_low = len(self) // 2
+        while self._low_size > target_low:
+            self._prune()
+            heapq.heappush(self._high, -heapq.heappop(self._low))
+            self._low_size -= 1
+            self._high_size += 1
+        while self._low_size < target_low:
+            self._prune()
+            heapq.heappush(self._low, -heapq.heappop(self._high))
+            self._low_size += 1
+            self._high_size -= 1
+        self._prune()
+        if self._pending > len(self) + 1024:
+            self.__init__(self._live())
+
+    def _live(self) -> np.ndarray:
+        live = []
+        for heap, deleted, sign in ((self._low, self._low_deleted, -1), (self._high, self._high_deleted, 1)):
+            deleted = Counter(deleted)
+            for value in heap:
+                value = sign * value
+                if deleted[value]:
+                    deleted[value] -= 1
+                else:
+                    live.append(value)
+        return np.array(live)
+
+    def add(self, values: np.ndarray) -> None:
+        for value in np.asarray(values, dtype=np.float64).tolist():
+            if self._high_size and value >= self._high[0]:
+                heapq.heappush(self._high, value)
+                self._high_size += 1
+            else:
+                heapq.heappush(self._low, -value)
+                self._low_size += 1
+        self._rebalance()
+
+    def remove(self, values: np.ndarray) -> None:
+        """Take out one copy of each of ``values``, which must all be present."""
+        for value in np.asarray(values, dtype=np.float64).tolist():
+            # A live top equal to ``value`` is a copy of it, so the heap choice is always right
+            self._prune()
+            if self._high_size and value >= self._high[0]:
+                self._high_deleted[value] += 1
+                self._high_size -= 1
+            else:
+                self._low_deleted[value] += 1
+                self._low_size -= 1
+            self._pending += 1
+        self._rebalance()
+
+
+class KPIAggregates:
+    """Running totals behind ``/api/kpis/portfolio`` and ``/api/kpis/flood``."""
+
+    def __init__(self, store: AssetStore, loss_factors: LossFactorFn):
+        self.store = store
+        self.loss_factors = loss_factors
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        """Recompute everything from the store in one vectorized pass."""
+        store = self.store
+        giv, pnl = store.column("giv"), store.column("pnl")
+        flooded = np.flatnonzero(store.column("inFloodZone"))
+        self.asset_count = len(store)
+        self.total_giv = float(giv.sum())
+        self.total_pnl = float(pnl.sum())
+        self.flooded_count = len(flooded)
+        self.flooded_giv = float(giv[flooded].sum())
+        self.flooded_pnl = float(pnl[flooded].sum())
+        self.estimated_loss = float(np.dot(giv[flooded], self.loss_factors(store, flooded)))
+        # Built from the store by warm() or the first flood() read, then kept up to date
+        self._depths: Optional[RunningMedian] = None
+
+    def warm(self) -> None:
+        """Build the flood depth median now instead of on the first ``flood()`` read."""
+        if self._depths is None:
+            self._depths = RunningMedian(self._positive_depths(np.flatnonzero(self.store.column("inFloodZone"))))
+
+    def _positive_depths(self, flooded_rows: np.ndarray) -> np.ndarray:
+        depth = self.store.column("floodDepth")[flooded_rows]
+        return depth[depth > 0]
+
+    def _apply(self, rows: np.ndarray, sign: int) -> None:
+        store = self.store
+        rows = np.asarray(rows, dtype=np.intp)
+        giv, pnl = store.column("giv")[rows], store.column("pnl")[rows]
+        flooded = rows[store.column("inFloodZone")[rows]]
+        flooded_giv = store.column("giv")[flooded]
+        self.asset_count += sign * len(rows)
+        self.total_giv += sign * float(giv.sum())
+        self.total_pnl += sign * float(pnl.sum())
+        self.flooded_count += sign * len(flooded)
+        self.flooded_giv += sign * float(flooded_giv.sum())
+        self.flooded_pnl += sign * float(store.column("pnl")[flooded].sum())
+        self.estimated_loss += sign * float(np.dot(flooded_giv, self.loss_factors(store, flooded)))
+        if self._depths is not None:
+            update = self._depths.add if sign > 0 else self._depths.remove
+            update(self._positive_depths(flooded))
+
+    def add(self, rows: np.ndarray) -> None:
+        """Count ``rows`` in, using their current values."""
+        self._apply(rows, 1)
+
+    def remove(self, rows: np.ndarray) -> None:
+        """Take ``rows`` out, using their current (about to change) values."""
+        self._apply(rows, -1)
+
+    def _median(self) -> float:
+        self.warm()
+        return self._depths.median
+
+    def portfolio(self) -> Dict[str, float]:
+        return {
+            "totalGIV": self.total_giv,
+            "totalPnL": self.total_pnl,
+            "impactedGIV": self.flooded_giv,
+            "impactedPnL": self.flooded_pnl,
+            "assetCount": self.asset_count,
+        }
+
+    def flood(self) -> Dict[str, float]:
+        return {
+            "floodedGIV": self.flooded_giv,
+            "estimatedFloodLoss": self.estimated_loss,
+            "exposedAssetCount": self.flooded_count,
+            "medianFloodDepth": self._median(),
+            "totalAssets": self.asset_count,
+        }
@@ -0,0 +1,338 @@
+"""Request, event-loop and MongoDB metrics in Prometheus text format.
+
+``MetricsMiddleware`` records, per route template, method and status:
+- total latency, split into JSON serialization and handler time;
+- request and response body sizes.
+
+Serialization is timed wherever ``serialization_timer`` wraps JSON
+encoding (``dumps_records`` and ``TimedJSONResponse``), through a
+per-request context variable. ``monitor_event_loop`` samples how late
+the loop wakes from a fixed sleep, and ``MongoCommandListener`` times
+every MongoDB command via pymongo's command monitoring.
+
+The middleware can also profile single requests that ask for it with
+``?profile=1`` (``RequestProfiler``). It uses pyinstrument's sampling
+profiler when installed and cProfile otherwise, one request at a time.
+"""
+
+import asyncio
+import bisect
+import cProfile
+import importlib.util
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs
+
+from fastapi.responses import JSONResponse
+from pymongo import monitoring
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (128, 1024, 8192, 65536, 524288, 4194304, 33554432, 268435456)
+LOOP_LAG_INTERVAL = 0.5
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, k)} {_format_value(v)}" for k, v in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DURATION_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        # labels -> (per-bucket counts incl. +Inf, sum)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        counts, total = self._values.setdefault(labels, ([0] * (len(self.buckets) + 1), [0.0]))
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total[0])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Metrics:
+    """The app's metric families; updates and rendering are serialized by one lock."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        http = ("method", "route", "status")
+        self.requests = Counter("http_requests_total", "HTTP requests handled", http)
+        self.in_progress = Gauge("http_requests_in_progress", "HTTP requests being handled")
+        self.duration = Histogram("http_request_duration_seconds", "Time from request to last body byte", http)
+        self.handler = Histogram(
+            "http_handler_duration_seconds", "Request time excluding JSON serialization", ("method", "route")
+        )
+        self.serialization = Histogram(
+            "http_serialization_duration_seconds", "Time spent encoding JSON response bodies", ("method", "route")
+        )
+        self.request_size = Histogram(
+            "http_request_size_bytes", "Request body size", ("method", "route"), SIZE_BUCKETS
+        )
+        self.response_size = Histogram(
+            "http_response_size_bytes", "Response body size (as sent, after compression)", ("method", "route"),
+            SIZE_BUCKETS,
+        )
+        self.loop_lag = Histogram("event_loop_lag_seconds", "How late the event loop woke from a timed sleep")
+        self.mongo = Histogram(
+            "mongodb_command_duration_seconds", "MongoDB command round trips", ("command", "collection", "outcome")
+        )
+        self.families = [
+            self.requests, self.in_progress, self.duration, self.handler, self.serialization,
+            self.request_size, self.response_size, self.loop_lag, self.mongo,
+        ]
+        self._collectors: List[Callable[[], None]] = []
+
+    def callback(self, name: str, help: str, read: Callable[[], float], kind: str = "gauge") -> None:
+        """A gauge (or counter kept elsewhere) whose value is read when metrics are rendered."""
+        family = Gauge(name, help)
+        family.kind = kind
+        self.families.append(family)
+        self._collectors.append(lambda: family.set(float(read())))
+
+    def observe_request(
+        self, method: str, route: str, status: int, seconds: float, serialization: float, in_bytes: int, out_bytes: int
+    ) -> None:
+        with self.lock:
+            self.requests.inc(method, route, str(status))
+            self.duration.observe(seconds, method, route, str(status))
+            self.handler.observe(max(seconds - serialization, 0.0), method, route)
+            self.serialization.observe(serialization, method, route)
+            self.request_size.observe(in_bytes, method, route)
+            self.response_size.observe(out_bytes, method, route)
+
+    def render(self) -> str:
+        for collect in self._collectors:
+            collect()
+        lines = []
+        with self.lock:
+            for family in self.families:
+                lines.append(f"# HELP {family.name} {family.help}")
+                lines.append(f"# TYPE {family.name} {family.kind}")
+                lines.extend(family.samples())
+        return "\n".join(lines) + "\n"
+
+
+class _RequestStats:
+    __slots__ = ("serialization",)
+
+    def __init__(self):
+        self.serialization = 0.0
+
+
+_current_request: ContextVar[Optional[_RequestStats]] = ContextVar("current_request", default=None)
+
+
+@contextmanager
+def serialization_timer():
+    """Count the enclosed block as serialization time of the current request, if any."""
+    stats = _current_request.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serialization += time.perf_counter() - started
+
+
+class TimedJSONResponse(JSONResponse):
+    """``JSONResponse`` whose encoding counts as serialization time."""
+
+    def render(self, content) -> bytes:
+        with serialization_timer():
+            return super().render(content)
+
+
+class RequestProfiler:
+    """Profiles one request at a time into ``directory``."""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.use_pyinstrument = importlib.util.find_spec("pyinstrument") is not None
+        self._busy = threading.Lock()
+
+    def acquire(self, route: str) -> Optional[Path]:
+        """Reserve the profiler and pick the output file; None if another request is being profiled."""
+        if not self._busy.acquire(blocking=False):
+            return None
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        name = route.strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+        return self.directory / f"{stamp}-{name}.{'html' if self.use_pyinstrument else 'prof'}"
+
+    async def run(self, call, path: Path) -> None:
+        """Await ``call()`` under the profiler and write the result to ``path``."""
+        try:
+            if self.use_pyinstrument:
+                from pyinstrument import Profiler
+
+                profiler = Profiler(async_mode="enabled")
+                profiler.start()
+                try:
+                    await call()
+                finally:
+                    profiler.stop()
+                    path.write_text(profiler.output_html())
+            else:
+                # cProfile sees every coroutine on the loop while this one runs
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    await call()
+                finally:
+                    profiler.disable()
+                    profiler.dump_stats(path)
+        finally:
+            self._busy.release()
+
+
+class MetricsMiddleware:
+    """ASGI middleware feeding ``Metrics``; labels requests by matched route template."""
+
+    def __init__(self, app, metrics: Metrics, profiler: Optional[RequestProfiler] = None):
+        self.app = app
+        self.metrics = metrics
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = _RequestStats()
+        token = _current_request.set(stats)
+        sizes = {"in": 0, "out": 0}
+        status = 500
+        profile_path = None
+        if self.profiler is not None and parse_qs(scope.get("query_string", b"").decode()).get("profile") == ["1"]:
+            profile_path = self.profiler.acquire(scope["path"])
+
+        async def counting_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                sizes["in"] += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if profile_path is not None:
+                    headers = [*message.get("headers", []), (b"x-profile", profile_path.name.encode())]
+                    message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                sizes["out"] += len(message.get("body", b""))
+            await send(message)
+
+        with self.metrics.lock:
+            self.metrics.in_progress.inc(amount=1)
+        started = time.perf_counter()
+        try:
+            if profile_path is not None:
+                await self.profiler.run(lambda: self.app(scope, counting_receive, counting_send), profile_path)
+            else:
+                await self.app(scope, counting_receive, counting_send)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = scope.get("route")
+            self.metrics.observe_request(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                status,
+                elapsed,
+                stats.serialization,
+                sizes["in"],
+                sizes["out"],
+            )
+            with self.metrics.lock:
+                self.metrics.in_progress.inc(amount=-1)
+            _current_request.reset(token)
+
+
+async def monitor_event_loop(metrics: Metrics, interval: float = LOOP_LAG_INTERVAL) -> None:
+    """Record how late each ``interval`` sleep wakes up; runs until cancelled."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(loop.time() - started - interval, 0.0)
+        with metrics.lock:
+            metrics.loop_lag.observe(lag)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Times MongoDB commands by name and collection (called from driver threads)."""
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+        self._pending: Dict[Tuple, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event) -> None:
+        target = event.command.get(event.command_name)
+        collection = target if isinstance(target, str) else str(event.command.get("collection", ""))
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (event.command_name, collection)
+
+    def _finish(self, event, outcome: str) -> None:
+        with self._lock:
+            command, collection = self._pending.pop((event.connection_id, event.request_id), (event.command_name, ""))
+        with self.metrics.lock:
+            self.metrics.mongo.observe(event.duration_micros / 1e6, command, collection, outcome)
+
+    def succeeded(self, event) -> None:
+        self._finish(event, "success")
+
+    def failed(self, event) -> None:
+        self._finish(event, "failure")
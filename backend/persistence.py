@@ -0,0 +1,231 @@
+"""MongoDB persistence for assets and flood zones.
+
+MongoDB is the system of record; the in-memory store and indexes are loaded
+from it at startup and kept in step on every write. Documents carry a
+GeoJSON ``location`` (assets) or ``geometry`` (zones) with a ``2dsphere``
+index, so the collections can be queried spatially on their own.
+
+Exposure fields (``inFloodZone``, ``floodDepth``, ``floodCategory``) are
+derived from the zones and are not stored.
+
+Bulk writes are unordered ``ReplaceOne`` upserts keyed on the asset/zone
+ID, sent in batches. A bad document fails on its own and is reported
+without stopping the rest of its batch.
+"""
+
+import csv
+import json
+import time
+import uuid
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError
+
+INGEST_BATCH = 5000
+# Derived by the exposure engine, never persisted
+EXPOSURE_FIELDS = ("inFloodZone", "floodDepth", "floodCategory")
+
+
+def asset_document(asset: dict) -> dict:
+    doc = {k: v for k, v in asset.items() if k not in EXPOSURE_FIELDS}
+    doc["_id"] = asset["assetId"]
+    doc["location"] = {"type": "Point", "coordinates": [asset["longitude"], asset["latitude"]]}
+    return doc
+
+
+def zone_ring(coordinates: Sequence[Sequence[float]]) -> List[List[float]]:
+    """``[lat, lng]`` vertices as a closed GeoJSON ``[lng, lat]`` ring."""
+    ring = [[lng, lat] for lat, lng in coordinates]
+    if ring and ring[0] != ring[-1]:
+        ring.append(ring[0])
+    return ring
+
+
+def zone_document(zone: dict) -> dict:
+    doc = dict(zone)
+    doc["_id"] = zone["flood_id"]
+    doc["geometry"] = {"type": "Polygon", "coordinates": [zone_ring(zone["coordinates"])]}
+    return doc
+
+
+def zones_from_geojson(collection: dict) -> List[dict]:
+    """FloodZone-shaped dicts from a FeatureCollection of Polygon features.
+
+    Zone attributes come from each feature's ``properties``; only the outer
+    ring of each polygon is kept.
+    """
+    if collection.get("type") != "FeatureCollection":
+        raise ValueError("Expected a GeoJSON FeatureCollection")
+    zones = []
+    for i, feature in enumerate(collection.get("features", [])):
+        geometry = feature.get("geometry") or {}
+        if geometry.get("type") != "Polygon" or not geometry.get("coordinates"):
+            raise ValueError(f"Feature {i} is not a Polygon")
+        ring = geometry["coordinates"][0]
+        if len(ring) > 1 and ring[0] == ring[-1]:
+            ring = ring[:-1]
+        zones.append({**(feature.get("properties") or {}), "coordinates": [[lat, lng] for lng, lat, *_ in ring]})
+    return zones
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decoded lines of a streamed body, without holding the whole body."""
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8").rstrip("\r")
+    if pending:
+        yield pending.decode("utf-8").rstrip("\r")
+
+
+async def iter_record_batches(
+    lines: AsyncIterator[str],
+    fmt: str,
+    batch_size: int = INGEST_BATCH,
+) -> AsyncIterator[List[dict]]:
+    """Batches of raw records from CSV (header row first) or NDJSON lines.
+
+    CSV values stay strings; model validation coerces them. Quoted fields
+    may not span lines.
+    """
+    header: Optional[List[str]] = None
+    batch: List[dict] = []
+    async for line in lines:
+        if not line.strip():
+            continue
+        if fmt == "ndjson":
+            batch.append(json.loads(line))
+        elif header is None:
+            header = next(csv.reader([line]))
+            continue
+        else:
+            batch.append(dict(zip(header, next(csv.reader([line])))))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@lru_cache(maxsize=None)
+def list_adapter(model) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+
+def validate_records(model, records: List[dict], id_field: str) -> Tuple[List[dict], List[dict]]:
+    """Split raw records into validated dicts and ``IngestError`` dicts.
+
+    The batch is validated in one pydantic-core call; if any record fails,
+    the failures are reported and the rest re-validated in one more call.
+    """
+    adapter = list_adapter(model)
+    try:
+        return adapter.dump_python(adapter.validate_python(records)), []
+    except ValidationError as exc:
+        failures: Dict[int, List[dict]] = {}
+        for err in exc.errors(include_url=False):
+            failures.setdefault(err["loc"][0], []).append({**err, "loc": err["loc"][1:]})
+    errors = [
+        {"id": records[i].get(id_field) if isinstance(records[i], dict) else None, "message": str(errs)}
+        for i, errs in sorted(failures.items())
+    ]
+    rest = [r for i, r in enumerate(records) if i not in failures]
+    return adapter.dump_python(adapter.validate_python(rest)), errors
+
+
+class PortfolioRepository:
+    """Asset and flood zone collections with geospatial indexes."""
+
+    def __init__(self, db, batch_size: int = INGEST_BATCH):
+        self.assets = db.assets
+        self.zones = db.flood_zones
+        self.meta = db.portfolio_meta
+        self.batch_size = batch_size
+
+    async def ensure_indexes(self) -> None:
+        await self.assets.create_index([("location", "2dsphere")])
+        await self.zones.create_index([("geometry", "2dsphere")])
+
+    async def _bulk_replace(self, collection, docs: List[dict]) -> Dict[str, Any]:
+        """Unordered upserts in batches; returns counts and per-document errors."""
+        started = time.perf_counter()
+        result = {"received": len(docs), "upserted": 0, "modified": 0, "errors": []}
+        for start in range(0, len(docs), self.batch_size):
+            batch = docs[start:start + self.batch_size]
+            ops = [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in batch]
+            try:
+                res = await collection.bulk_write(ops, ordered=False)
+                details = res.bulk_api_result
+            except BulkWriteError as exc:
+                details = exc.details
+                result["errors"].extend(
+                    {"id": batch[err["index"]]["_id"], "message": err.get("errmsg", "")}
+                    for err in details.get("writeErrors", [])
+                )
+            result["upserted"] += details.get("nUpserted", 0)
+            result["modified"] += details.get("nModified", 0)
+        result["seconds"] = time.perf_counter() - started
+        return result
+
+    async def upsert_assets(self, assets: List[dict]) -> Dict[str, Any]:
+        return await self._bulk_replace(self.assets, [asset_document(a) for a in assets])
+
+    async def upsert_zones(self, zones: List[dict]) -> Dict[str, Any]:
+        return await self._bulk_replace(self.zones, [zone_document(z) for z in zones])
+
+    async def get_version(self) -> Optional[str]:
+        """Opaque token that changes on every portfolio write, for snapshot freshness."""
+        doc = await self.meta.find_one({"_id": "portfolio"})
+        return None if doc is None else doc["version"]
+
+    async def set_version(self, version: Optional[str] = None) -> str:
+        version = version or uuid.uuid4().hex
+        await self.meta.replace_one({"_id": "portfolio"}, {"_id": "portfolio", "version": version}, upsert=True)
+        return version
+
+    async def delete_assets(self, asset_ids: List[str]) -> int:
+        deleted = 0
+        for start in range(0, len(asset_ids), self.batch_size):
+            res = await self.assets.delete_many({"_id": {"$in": asset_ids[start:start + self.batch_size]}})
+            deleted += res.deleted_count
+        return deleted
+
+    async def delete_zone(self, zone_id: str) -> None:
+        await self.zones.delete_one({"_id": zone_id})
+
+    async def count_assets(self) -> int:
+        return await self.assets.count_documents({})
+
+    async def load_assets(self) -> List[dict]:
+        cursor = self.assets.find({}, {"_id": 0, "location": 0}, batch_size=self.batch_size)
+        return await cursor.to_list(None)
+
+    async def load_zones(self) -> List[dict]:
+        return await self.zones.find({}, {"_id": 0, "geometry": 0}).sort("flood_id", 1).to_list(None)
+
+    async def asset_ids_within(self, zone: dict) -> List[str]:
+        """IDs of assets inside a zone polygon (``$geoWithin``)."""
+        geometry = zone_document(zone)["geometry"]
+        cursor = self.assets.find({"location": {"$geoWithin": {"$geometry": geometry}}}, {"_id": 1})
+        return [doc["_id"] for doc in await cursor.to_list(None)]
+
+    async def zone_ids_intersecting(self, geometry: dict) -> List[str]:
+        """IDs of zones intersecting a GeoJSON geometry (``$geoIntersects``)."""
+        cursor = self.zones.find({"geometry": {"$geoIntersects": {"$geometry": geometry}}}, {"_id": 1})
+        return [doc["_id"] for doc in await cursor.to_list(None)]
+
+
+def bbox_polygon(min_lat: float, min_lng: float, max_lat: float, max_lng: float) -> dict:
+    return {
+        "type": "Polygon",
+        "coordinates": [zone_ring([[min_lat, min_lng], [min_lat, max_lng], [max_lat, max_lng], [max_lat, min_lng]])],
+    }
+
+
+def failed_ids(result: Dict[str, Any]) -> Iterable[str]:
+    return {err["id"] for err in result["errors"]}
@@ -0,0 +1,141 @@
+"""Pre-serialized response cache with ETags.
+
+Entries are keyed by path, query string and the version of the data the
+response was built from. Once that version moves on, its old entries are
+never hit again and age out of the LRU. Bodies are stored already
+serialized, along with a gzip copy that is compressed on first request.
+Revalidations that match the content-hash ETag get a bodyless 304. The
+ETag is weak because the gzip and identity encodings share it.
+
+Bodies too large to cache (a full portfolio dump) keep only their ETag, so
+revalidating them is still free; a full response is rebuilt each time and
+sent uncompressed rather than paying for gzip on every request.
+"""
+
+import gzip
+import hashlib
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+# Bodies smaller than this are not worth compressing
+GZIP_MIN_BYTES = 1024
+
+
+class CachedBody:
+    __slots__ = ("body", "etag", "media_type", "_gzipped")
+
+    def __init__(self, body: Optional[bytes], media_type: str, etag: Optional[str] = None):
+        self.body = body
+        self.etag = etag or 'W/"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.media_type = media_type
+        self._gzipped: Optional[bytes] = None
+
+    def stub(self) -> "CachedBody":
+        """ETag-only copy for bodies too large to keep."""
+        return CachedBody(None, self.media_type, self.etag)
+
+    def gzipped(self) -> bytes:
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, compresslevel=6)
+        return self._gzipped
+
+    @property
+    def size(self) -> int:
+        return len(self.body or b"") + len(self._gzipped or b"")
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison (RFC 9110 8.8.3.2): opaque tags match with or without W/
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+
+def _accepts_gzip(header: Optional[str]) -> bool:
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+class ResponseCache:
+    """Byte-bounded LRU of serialized responses."""
+
+    def __init__(self, max_bytes: int, max_entry_fraction: float = 0.25):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = int(max_bytes * max_entry_fraction)
+        self._entries: "OrderedDict[Tuple, CachedBody]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.bytes = 0
+
+    def _lookup(self, key: Tuple) -> Optional[CachedBody]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: Tuple, entry: CachedBody) -> None:
+        if entry.size > self.max_entry_bytes:
+            entry = entry.stub()
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old.size
+        self._entries[key] = entry
+        self.bytes += entry.size
+        while self.bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes -= evicted.size
+
+    def respond(
+        self,
+        request: Request,
+        version: Hashable,
+        build: Callable[[], bytes],
+        media_type: str = "application/json",
+        headers: Optional[dict] = None,
+    ) -> Response:
+        """Serve ``build()``'s body for this request and data ``version``, from cache when possible.
+
+        ``headers`` are added to this response only; they are not cached.
+        """
+        key = (request.url.path, request.url.query, version)
+        entry = self._lookup(key)
+        if entry is None:
+            self.misses += 1
+            entry = CachedBody(build(), media_type)
+            self._store(key, entry)
+            cached = self._entries.get(key) is entry
+        else:
+            self.hits += 1
+            cached = True
+
+        out_headers = {"ETag": entry.etag, "Vary": "Accept-Encoding", **(headers or {})}
+        if _etag_matches(request.headers.get("if-none-match"), entry.etag):
+            return Response(status_code=304, headers=out_headers)
+        if entry.body is None:
+            entry = CachedBody(build(), media_type, entry.etag)
+            cached = False
+        if cached and len(entry.body) >= GZIP_MIN_BYTES and _accepts_gzip(request.headers.get("accept-encoding")):
+            before = entry.size
+            body = entry.gzipped()
+            self.bytes += entry.size - before
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted.size
+            return Response(body, media_type=entry.media_type, headers={**out_headers, "Content-Encoding": "gzip"})
+        return Response(entry.body, media_type=entry.media_type, headers=out_headers)
@@ -0,0 +1,220 @@
+"""Typeahead search over asset IDs and addresses.
+
+Two trigram inverted indexes (one per field) are stored CSR-style: a sorted
+array of trigram codes, offsets into one flat array of row numbers. Asset
+IDs additionally get a sorted array for O(log N) prefix lookups.
+
+Results are ranked in tiers and produced lazily, so a page costs roughly
+``offset + limit`` verified candidates rather than a scan of every match:
+
+1. asset ID starts with the query (ID order)
+2. asset ID contains the query elsewhere (row order)
+3. address contains the query (row order)
+
+The last one or two characters of each text are indexed too, as windows
+padded with zero bytes. Every occurrence of a one- or two-byte query then
+starts some indexed window, so short queries read the contiguous range of
+codes beginning with them instead of scanning rows.
+
+After writes ``refresh`` re-indexes only rows whose text changed: their old
+postings are masked out and a small overlay index covers their new text.
+Once enough rows have changed the whole index is rebuilt.
+"""
+
+from itertools import islice
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from asset_store import AssetStore, patch_sort_order
+
+NGRAM = 3
+# Candidates verified per step while walking a posting list
+VERIFY_CHUNK = 1024
+# Past this fraction of re-indexed rows, rebuilding beats masking and overlaying
+REBUILD_FRACTION = 0.1
+_PREFIX_END = "\U0010ffff"
+
+
+def _postings(texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """``(codes, offsets, rows)``: the rows holding ``codes[i]`` are ``rows[offsets[i]:offsets[i + 1]]``."""
+    codes, offsets, rows = np.empty(0, dtype=np.int64), np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int64)
+    if not texts:
+        return codes, offsets, rows
+    encoded = [t.encode("utf-8") for t in texts]
+    lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+    # Documents are joined with NUL separators; a window starting in one is
+    # cut off at its NUL, so it never reaches into the next document
+    buf = np.frombuffer(b"\0".join(encoded) + b"\0\0\0", dtype=np.uint8).astype(np.int64)
+    doc = np.repeat(np.arange(len(encoded), dtype=np.int64), lengths + 1)
+    a, b, c = buf[:-2], buf[1:-1], buf[2:]
+    c = np.where(b != 0, c, 0)
+    valid = a != 0
+    keys = (((a << 16) | (b << 8) | c)[valid] << 32) | doc[valid]
+    if len(keys) == 0:
+        return codes, offsets, rows
+    # Sort + adjacent-diff dedupe; much faster than np.unique on tens of millions of keys
+    keys.sort()
+    keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+    all_codes = keys >> 32
+    rows = keys & 0xFFFFFFFF
+    starts = np.flatnonzero(np.concatenate(([True], all_codes[1:] != all_codes[:-1])))
+    return all_codes[starts], np.append(starts, len(all_codes)).astype(np.int64), rows
+
+
+class TrigramPostings:
+    """Trigram -> sorted rows, for one text column."""
+
+    def __init__(self, texts: Sequence[str]):
+        self.size = len(texts)
+        self.codes, self.offsets, self.rows = _postings(texts)
+        # Rows whose postings above no longer describe their text, and the
+        # overlay indexing the current text of changed rows
+        self.stale = np.zeros(self.size, dtype=bool)
+        self.changed = np.empty(0, dtype=np.int64)
+        self.overlay: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+    def update(self, texts: Sequence[str], rows: np.ndarray) -> None:
+        """Re-index ``rows`` of ``texts``, the column's current contents; rows past its end are dropped."""
+        self.size = len(texts)
+        self.stale[rows[rows < len(self.stale)]] = True
+        self.stale[self.size:] = True
+        changed = np.union1d(self.changed, rows)
+        self.changed = changed[changed < self.size]
+        codes, offsets, local = _postings([texts[row] for row in self.changed.tolist()])
+        self.overlay = codes, offsets, self.changed[local]
+
+    @staticmethod
+    def query_codes(text: str) -> List[int]:
+        data = text.encode("utf-8")
+        return sorted({(data[i] << 16) | (data[i + 1] << 8) | data[i + 2] for i in range(len(data) - 2)})
+
+    @staticmethod
+    def _range(postings: Tuple[np.ndarray, np.ndarray, np.ndarray], lo: int, hi: int) -> np.ndarray:
+        """Rows of every code in ``[lo, hi)``, unsorted and possibly repeated."""
+        codes, offsets, rows = postings
+        start, end = np.searchsorted(codes, [lo, hi])
+        return rows[offsets[start]:offsets[end]]
+
+    def postings(self, code: int) -> np.ndarray:
+        rows = self._range((self.codes, self.offsets, self.rows), code, code + 1)
+        if self.overlay is None:
+            return rows
+        rows = rows[~self.stale[rows]]
+        return np.sort(np.concatenate([rows, self._range(self.overlay, code, code + 1)]))
+
+    def candidates(self, text: str) -> np.ndarray:
+        """Rows of the rarest trigram in ``text``; a superset of the true matches."""
+        lists = [self.postings(code) for code in self.query_codes(text)]
+        return min(lists, key=len) if lists else self.rows[:0]
+
+    def containing(self, text: str) -> np.ndarray:
+        """Sorted rows containing ``text``, which is one or two bytes of UTF-8."""
+        data = text.encode("utf-8")
+        lo = int.from_bytes(data.ljust(NGRAM, b"\0"), "big")
+        hi = lo + (1 << 8 * (NGRAM - len(data)))
+        hit = np.zeros(self.size, dtype=bool)
+        base = self._range((self.codes, self.offsets, self.rows), lo, hi)
+        if self.overlay is not None:
+            base = base[~self.stale[base]]
+        hit[base] = True
+        if self.overlay is not None:
+            hit[self._range(self.overlay, lo, hi)] = True
+        return np.flatnonzero(hit)
+
+
+class AssetSearchIndex:
+    """Search index over a snapshot of an ``AssetStore``.
+
+    ``version`` records the store ``rows_version`` it reflects; ``refresh``
+    brings it up to date after writes.
+    """
+
+    def __init__(self, asset_ids: Sequence[str], addresses: Sequence[str], version: int = 0):
+        self._index(asset_ids, addresses, version)
+
+    def _index(self, asset_ids: Sequence[str], addresses: Sequence[str], version: int) -> None:
+        self.version = version
+        self.raw_ids = np.array(asset_ids, dtype=object)
+        self.raw_addresses = np.array(addresses, dtype=object)
+        self.ids = [s.lower() for s in asset_ids]
+        self.addresses = [s.lower() for s in addresses]
+        self.id_postings = TrigramPostings(self.ids)
+        self.address_postings = TrigramPostings(self.addresses)
+        self.sorted_id_rows = np.argsort(np.array(self.ids, dtype=str), kind="stable")
+        # Object dtype so searchsorted compares Python strings instead of
+        # re-casting the whole array to the query's width
+        self.sorted_ids = np.array(self.ids, dtype=object)[self.sorted_id_rows]
+
+    @classmethod
+    def build(cls, store: AssetStore) -> "AssetSearchIndex":
+        return cls(store.column("assetId").tolist(), store.column("address").tolist(), store.rows_version)
+
+    @staticmethod
+    def _changed(old: np.ndarray, new: np.ndarray) -> np.ndarray:
+        m = min(len(old), len(new))
+        return np.concatenate([np.flatnonzero(old[:m] != new[:m]), np.arange(len(old), len(new))])
+
+    @staticmethod
+    def _patch(lowered: List[str], new: np.ndarray, rows: np.ndarray) -> None:
+        del lowered[len(new):]
+        lowered.extend([""] * (len(new) - len(lowered)))
+        for row, text in zip(rows.tolist(), new[rows].tolist()):
+            lowered[row] = text.lower()
+
+    def refresh(self, store: AssetStore) -> None:
+        """Catch up with ``store``, re-indexing only rows whose ID or address changed."""
+        if self.version == store.rows_version:
+            return
+        ids = store.column("assetId").astype(object)
+        addresses = store.column("address").astype(object)
+        changed_ids = self._changed(self.raw_ids, ids)
+        changed_addresses = self._changed(self.raw_addresses, addresses)
+        pending = max(len(self.id_postings.changed) + len(changed_ids),
+                      len(self.address_postings.changed) + len(changed_addresses))
+        if pending > REBUILD_FRACTION * len(ids):
+            self._index(ids.tolist(), addresses.tolist(), store.rows_version)
+            return
+        old_ids = np.array(self.ids, dtype=object)
+        self._patch(self.ids, ids, changed_ids)
+        self._patch(self.addresses, addresses, changed_addresses)
+        self.id_postings.update(self.ids, changed_ids)
+        self.address_postings.update(self.addresses, changed_addresses)
+        new_ids = np.array(self.ids, dtype=object)
+        patched = patch_sort_order(self.sorted_id_rows, self.sorted_ids, old_ids, new_ids)
+        if patched is None:
+            order = np.argsort(new_ids.astype(str), kind="stable")
+            patched = order, new_ids[order]
+        self.sorted_id_rows, self.sorted_ids = patched
+        self.raw_ids, self.raw_addresses = ids, addresses
+        self.version = store.rows_version
+
+    def _verified(self, candidates: np.ndarray, keep) -> Iterator[int]:
+        for start in range(0, len(candidates), VERIFY_CHUNK):
+            for row in candidates[start:start + VERIFY_CHUNK].tolist():
+                if keep(row):
+                    yield row
+
+    def _ranked(self, q: str) -> Iterator[int]:
+        ids, addresses = self.ids, self.addresses
+        lo = int(np.searchsorted(self.sorted_ids, q, side="left"))
+        hi = int(np.searchsorted(self.sorted_ids, q + _PREFIX_END, side="left"))
+        for start in range(lo, hi, VERIFY_CHUNK):
+            yield from self.sorted_id_rows[start:min(hi, start + VERIFY_CHUNK)].tolist()
+
+        if len(q.encode("utf-8")) >= NGRAM:
+            id_candidates = self.id_postings.candidates(q)
+            address_candidates = self.address_postings.candidates(q)
+        else:
+            id_candidates = self.id_postings.containing(q)
+            address_candidates = self.address_postings.containing(q)
+        yield from self._verified(id_candidates, lambda row: q in ids[row] and not ids[row].startswith(q))
+        yield from self._verified(address_candidates, lambda row: q in addresses[row] and q not in ids[row])
+
+    def search(self, query: str, limit: int = 50, offset: int = 0) -> np.ndarray:
+        """Rows of the ranked matches in ``[offset, offset + limit)``."""
+        q = query.lower()
+        if not q:
+            return np.empty(0, dtype=np.intp)
+        page = islice(self._ranked(q), offset, offset + limit)
+        return np.fromiter(page, dtype=np.intp)
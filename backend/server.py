@@ -1,26 +1,99 @@
-from fastapi import FastAPI, APIRouter, HTTPException
-from dotenv import load_dotenv
-from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
+import asyncio
+import importlib.util
+import json
 import logging
-from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+import os
+import random
+import threading
+import time
 import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timezone
-import random
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    List,
+    Literal,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+from dotenv import load_dotenv
+from fastapi import APIRouter, FastAPI, HTTPException
+from fastapi import Path as PathParam
+from fastapi import Query, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorClient
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from pymongo.errors import PyMongoError
+from starlette.middleware.cors import CORSMiddleware
+
+from accumulation import hotspots
+from asset_store import AssetStore
+from damage import load_damage_curves
+from depth_grid import DepthGrid
+from export import EXPORT_FORMATS, IdOrder, decode_cursor, dumps_records, encode_cursor
+from exposure import FloodExposureEngine, zone_bbox_rows
+from flood_zones import FloodZoneStore
+from hazards import (
+    FLOOD_PERIL,
+    FloodHazardLayer,
+    HazardMatrix,
+    RasterHazardLayer,
+    hazard_layer,
+)
+from jobs import SUCCEEDED, JobRunner
+from kpis import KPIAggregates, grouped_kpis
+from metrics import (
+    Metrics,
+    MetricsMiddleware,
+    MongoCommandListener,
+    RequestProfiler,
+    TimedJSONResponse,
+    monitor_event_loop,
+)
+from persistence import (
+    INGEST_BATCH,
+    PortfolioRepository,
+    failed_ids,
+    iter_lines,
+    iter_record_batches,
+    validate_records,
+    zones_from_geojson,
+)
+from response_cache import ResponseCache
+from scenarios import canonical_scenario, changed_zones, evaluate_scenario, scenario_id
+from search_index import AssetSearchIndex
+from simulation import (
+    LOSS_TABLE_COLUMNS,
+    plan_chunks,
+    simulate_chunk,
+    summarize,
+    zone_loss_table,
+)
+from snapshot import load_snapshot, save_snapshot, snapshot_exists
+from status_log import StatusLog, parse_status_cursor, status_cursor
+from tiles import ASSET_MIN_ZOOM, MAX_TILE_ASSETS, MAX_TILE_ZOOM, TileIndex
+from zone_lod import ZoneLOD
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+METRICS = Metrics()
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandListener(METRICS)])
 db = client[os.environ['DB_NAME']]
 
 # Create the main app without a prefix
-app = FastAPI(title="INSpace Insurance Risk Analytics API")
+app = FastAPI(title="INSpace Insurance Risk Analytics API", default_response_class=TimedJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -34,12 +107,27 @@ logger = logging.getLogger(__name__)
 
 # ============== Models ==============
 
+MAX_BATCH_IDS = 10000
+MAX_SEARCH_LIMIT = 1000
+DEFAULT_PAGE_SIZE = 1000
+MAX_SIMULATION_YEARS = 1000000
+MAX_PAGE_SIZE = 10000
+MAX_JOB_LIST = 500
+MAX_INGEST_ERRORS = 100
+MAX_SCENARIOS = 256
+MAX_RASTER_CELLS = 4000000
+DEFAULT_STATUS_PAGE = 100
+MAX_STATUS_PAGE = 1000
+ACCUMULATION_RADII_M = (250.0, 500.0, 1000.0)
+MAX_ACCUMULATION_RADIUS_M = 5000
+MAX_ACCUMULATION_HOTSPOTS = 100
+
 class Asset(BaseModel):
     model_config = ConfigDict(extra="ignore")
     
     assetId: str
-    latitude: float
-    longitude: float
+    latitude: float = Field(ge=-90, le=90)
+    longitude: float = Field(ge=-180, le=180)
     giv: float
     pnl: float
     assetType: str
@@ -64,6 +152,17 @@ class FloodZone(BaseModel):
     timestamp: str
     coordinates: List[List[float]]
 
+class FloodZoneView(BaseModel):
+    flood_id: str
+    flood_category: str
+    flood_depth_m: float
+    return_period_yr: int
+    probability_pct: float
+    data_source: str
+    timestamp: str
+    coordinates: Optional[List[List[float]]] = None
+    polyline: Optional[str] = None
+
 class KPIResponse(BaseModel):
     totalGIV: float
     totalPnL: float
@@ -78,6 +177,239 @@ class FloodKPIResponse(BaseModel):
     medianFloodDepth: float
     totalAssets: int
 
+class KPIQueryGroup(BaseModel):
+    key: Optional[str] = None
+    portfolio: KPIResponse
+    flood: FloodKPIResponse
+
+class KPIQueryResponse(BaseModel):
+    groupBy: Optional[str] = None
+    groups: List[KPIQueryGroup]
+
+class AssetCluster(BaseModel):
+    latitude: float
+    longitude: float
+    count: int
+    giv: float
+    pnl: float
+    exposedCount: int
+
+class AssetTileResponse(BaseModel):
+    z: int
+    x: int
+    y: int
+    clustered: bool
+    clusters: List[AssetCluster]
+    assets: List[Asset]
+
+class FloodSimulationRequest(BaseModel):
+    years: int = Field(10000, ge=1, le=MAX_SIMULATION_YEARS)
+    seed: Optional[int] = Field(None, ge=0)
+    depthSigma: float = Field(0.3, ge=0, le=2)
+    returnPeriods: List[float] = Field(default_factory=lambda: [10, 25, 50, 100, 250, 500])
+
+class PMLPoint(BaseModel):
+    returnPeriod: float
+    aepLoss: float
+    oepLoss: float
+
+class ExceedancePoint(BaseModel):
+    returnPeriod: float
+    exceedanceProbability: float
+    loss: float
+
+class FloodSimulationResponse(BaseModel):
+    years: int
+    seed: int
+    aal: float
+    pml: List[PMLPoint]
+    epCurve: List[ExceedancePoint]
+    damageCurveVersion: str
+
+class ZoneOverride(BaseModel):
+    flood_id: str
+    flood_category: Optional[str] = None
+    flood_depth_m: Optional[float] = Field(None, ge=0)
+    depth_delta_m: Optional[float] = None
+    coordinates: Optional[List[List[float]]] = None
+
+class ScenarioRequest(BaseModel):
+    zoneOverrides: List[ZoneOverride] = Field(default_factory=list)
+    addZones: List[FloodZone] = Field(default_factory=list)
+    removeZones: List[str] = Field(default_factory=list)
+
+class ScenarioKPIs(BaseModel):
+    portfolio: KPIResponse
+    flood: FloodKPIResponse
+
+class ScenarioResponse(BaseModel):
+    scenarioId: str
+    baseline: ScenarioKPIs
+    scenario: ScenarioKPIs
+    delta: ScenarioKPIs
+    recomputedAssetCount: int
+    changedAssetCount: int
+    newlyExposedCount: int
+    noLongerExposedCount: int
+
+class AccumulationHotspot(BaseModel):
+    latitude: float
+    longitude: float
+    giv: float
+    assetCount: int
+
+class RadiusAccumulation(BaseModel):
+    radiusM: float
+    maxGIV: float
+    hotspots: List[AccumulationHotspot]
+
+class AccumulationResponse(BaseModel):
+    assetCount: int
+    totalGIV: float
+    radii: List[RadiusAccumulation]
+
+class HazardZone(BaseModel):
+    id: str
+    intensity: float
+    coordinates: List[List[float]]
+
+class HazardLayerRequest(BaseModel):
+    kind: Literal["polygon", "raster"]
+    unit: Optional[str] = None
+    description: Optional[str] = None
+    zones: List[HazardZone] = Field(default_factory=list)
+    values: List[List[float]] = Field(default_factory=list)
+    origin: Optional[Tuple[float, float]] = Field(None, description="North-west corner [lat, lng] of a raster")
+    cellSize: Optional[Tuple[float, float]] = Field(None, description="Raster [lat, lng] step in degrees")
+    nodata: Optional[float] = None
+
+class HazardLayerInfo(BaseModel):
+    peril: str
+    kind: str
+    unit: str
+    description: str
+    exposedAssetCount: int
+    details: Dict[str, Any]
+
+class PerilKPIs(BaseModel):
+    peril: str
+    unit: str
+    exposedAssetCount: int
+    exposedGIV: float
+    exposedPnL: float
+    meanIntensity: float
+    givWeightedIntensity: float
+    maxIntensity: float
+
+class PerilCountKPIs(BaseModel):
+    perilCount: int
+    assetCount: int
+    giv: float
+
+class CombinedHazardKPIs(BaseModel):
+    totalAssets: int
+    totalGIV: float
+    anyPerilAssetCount: int
+    anyPerilGIV: float
+    multiPerilAssetCount: int
+    multiPerilGIV: float
+    byPerilCount: List[PerilCountKPIs]
+
+class HazardKPIResponse(BaseModel):
+    perils: List[PerilKPIs]
+    combined: CombinedHazardKPIs
+
+class AssetHazards(BaseModel):
+    assetId: str
+    hazards: Dict[str, Optional[float]]
+
+JobKind = Literal["kpi_query", "flood_simulation", "exposure_refresh", "export", "snapshot", "accumulation"]
+GroupByField = Literal["assetType", "constructionType", "coverageType", "floodCategory", "inFloodZone"]
+
+class KPIQueryJobParams(BaseModel):
+    assetTypes: Optional[List[str]] = None
+    constructionTypes: Optional[List[str]] = None
+    coverageTypes: Optional[List[str]] = None
+    riskMin: Optional[int] = Field(None, ge=0, le=100)
+    riskMax: Optional[int] = Field(None, ge=0, le=100)
+    bbox: Optional[Tuple[float, float, float, float]] = None
+    assetIds: Optional[List[str]] = None
+    groupBy: Optional[GroupByField] = None
+
+class ExposureRefreshJobParams(BaseModel):
+    pass
+
+class SnapshotJobParams(BaseModel):
+    pass
+
+class AccumulationJobParams(BaseModel):
+    radii: List[float] = Field(default_factory=lambda: list(ACCUMULATION_RADII_M))
+    topK: int = Field(10, ge=1, le=MAX_ACCUMULATION_HOTSPOTS)
+    floodedOnly: bool = False
+    assetTypes: Optional[List[str]] = None
+
+class ExportJobParams(BaseModel):
+    format: Literal["ndjson", "arrow", "parquet"] = "ndjson"
+
+class JobRequest(BaseModel):
+    kind: JobKind
+    params: Dict[str, Any] = Field(default_factory=dict)
+
+class Job(BaseModel):
+    id: str
+    kind: str
+    status: Literal["queued", "running", "succeeded", "failed"]
+    progress: float
+    message: Optional[str] = None
+    params: Dict[str, Any]
+    error: Optional[str] = None
+    createdAt: str
+    startedAt: Optional[str] = None
+    finishedAt: Optional[str] = None
+
+class IngestError(BaseModel):
+    id: Optional[str] = None
+    message: str
+
+class IngestResponse(BaseModel):
+    received: int
+    upserted: int
+    modified: int
+    rejected: int
+    errors: List[IngestError]
+    batches: int
+    seconds: float
+    recordsPerSecond: float
+
+class AssetBulkRequest(BaseModel):
+    upserts: List[Dict[str, Any]] = Field(default_factory=list)
+    deletes: List[str] = Field(default_factory=list)
+
+class BulkBatchStats(BaseModel):
+    operation: Literal["upsert", "delete"]
+    records: int
+    applied: int
+    seconds: float
+    recordsPerSecond: float
+
+class AssetBulkResponse(BaseModel):
+    received: int
+    upserted: int
+    modified: int
+    deleted: int
+    rejected: int
+    errors: List[IngestError]
+    batches: List[BulkBatchStats]
+    seconds: float
+    recordsPerSecond: float
+
+class AssetBatchRequest(BaseModel):
+    assetIds: List[str] = Field(max_length=MAX_BATCH_IDS)
+
+class AssetBatchResponse(BaseModel):
+    assets: List[Asset]
+    missing: List[str]
+
 class StatusCheck(BaseModel):
     model_config = ConfigDict(extra="ignore")
     
@@ -114,9 +446,6 @@ def generate_mock_assets(count: int = 85) -> List[dict]:
         lat = SF_CENTER["lat"] + (random.random() - 0.5) * 0.15
         lng = SF_CENTER["lng"] + (random.random() - 0.5) * 0.25
         
-        in_flood_zone = random.random() < 0.4
-        flood_depth = round(random.random() * 8, 1) if in_flood_zone else 0
-        
         assets.append({
             "assetId": f"{asset_type.upper()[:4]}-{str(i + 1).zfill(5)}",
             "latitude": lat,
@@ -129,9 +458,10 @@ def generate_mock_assets(count: int = 85) -> List[dict]:
             "coverageType": random.choice(COVERAGE_TYPES),
             "riskScore": random.randint(0, 100),
             "address": generate_address(),
-            "inFloodZone": in_flood_zone,
-            "floodDepth": flood_depth,
-            "floodCategory": random.choice(["primary", "secondary", "fringe"]) if in_flood_zone else None,
+            # Flood fields are filled in by the exposure engine
+            "inFloodZone": False,
+            "floodDepth": 0,
+            "floodCategory": None,
         })
     
     return assets
@@ -204,137 +534,1012 @@ def generate_flood_zones() -> List[dict]:
         },
     ]
 
-# Generate mock data on startup
-MOCK_ASSETS = generate_mock_assets(85)
-FLOOD_ZONES = generate_flood_zones()
+ASSET_SNAPSHOT_PATH = os.environ.get("ASSET_SNAPSHOT_PATH")
+# Memory-mapped flood depth raster; where it has data it replaces zone depths inside flood zones
+FLOOD_DEPTH_GRID_PATH = os.environ.get("FLOOD_DEPTH_GRID_PATH")
+DEPTH_GRID = DepthGrid.open(Path(FLOOD_DEPTH_GRID_PATH)) if FLOOD_DEPTH_GRID_PATH else None
+
+def generate_hazard_layers() -> list:
+    """Mock earthquake, wildfire and storm-surge layers over San Francisco"""
+    # Peak ground acceleration decaying with distance from the San Andreas fault trace
+    cell = 0.002
+    lats = SF_CENTER["lat"] + 0.1 - (np.arange(100) + 0.5) * cell
+    lngs = SF_CENTER["lng"] - 0.15 + (np.arange(150) + 0.5) * cell
+    lat, lng = np.meshgrid(lats, lngs, indexing="ij")
+    fault_lng = -122.50 - (lat - 37.70) * 0.55
+    distance_km = np.abs(lng - fault_lng) * 88.0
+    pga = np.round(0.25 + 0.55 * np.exp(-distance_km / 12.0), 3)
+    earthquake = RasterHazardLayer(
+        "earthquake", pga, (SF_CENTER["lat"] + 0.1, SF_CENTER["lng"] - 0.15), (cell, cell),
+        unit="g", description="Peak ground acceleration, 475-year return period",
+    )
+    wildfire = hazard_layer({
+        "peril": "wildfire",
+        "kind": "polygon",
+        "unit": "index",
+        "description": "Wildland-urban interface fire hazard severity (1-5)",
+        "zones": [
+            {"id": "WF-001", "intensity": 4, "coordinates": [
+                [37.7580, -122.4620], [37.7640, -122.4500], [37.7560, -122.4430], [37.7500, -122.4540],
+            ]},
+            {"id": "WF-002", "intensity": 3, "coordinates": [
+                [37.8050, -122.4750], [37.8060, -122.4550], [37.7950, -122.4520], [37.7910, -122.4700],
+            ]},
+            {"id": "WF-003", "intensity": 2, "coordinates": [
+                [37.7220, -122.4260], [37.7240, -122.4120], [37.7140, -122.4100], [37.7120, -122.4230],
+            ]},
+        ],
+    })
+    storm_surge = hazard_layer({
+        "peril": "storm_surge",
+        "kind": "polygon",
+        "unit": "m",
+        "description": "Bay shoreline surge inundation depth, 100-year return period",
+        "zones": [
+            {"id": "SS-001", "intensity": 1.8, "coordinates": [
+                [37.8080, -122.4050], [37.8000, -122.3930], [37.7880, -122.3860], [37.7860, -122.3920],
+                [37.7980, -122.4010],
+            ]},
+            {"id": "SS-002", "intensity": 1.2, "coordinates": [
+                [37.7800, -122.3900], [37.7660, -122.3850], [37.7520, -122.3840], [37.7520, -122.3920],
+                [37.7780, -122.3960],
+            ]},
+            {"id": "SS-003", "intensity": 0.9, "coordinates": [
+                [37.7420, -122.3800], [37.7300, -122.3680], [37.7220, -122.3740], [37.7360, -122.3880],
+            ]},
+        ],
+    })
+    return [earthquake, wildfire, storm_surge]
+
+# Start from the snapshot when there is one (memory-mapped, exposure included),
+# otherwise from generated mock data; load_portfolio reconciles with MongoDB
+if ASSET_SNAPSHOT_PATH and snapshot_exists(ASSET_SNAPSHOT_PATH):
+    ASSET_STORE, _zones, PORTFOLIO_VERSION = load_snapshot(ASSET_SNAPSHOT_PATH)
+    FLOOD_ZONES = FloodZoneStore(_zones)
+    FLOOD_EXPOSURE = FloodExposureEngine(FLOOD_ZONES.all(), depth_grid=DEPTH_GRID)
+    SNAPSHOT_LOADED = True
+else:
+    ASSET_STORE = AssetStore.from_records(
+        generate_mock_assets(85),
+        categories={
+            "assetType": ASSET_TYPES,
+            "constructionType": CONSTRUCTION_TYPES,
+            "coverageType": COVERAGE_TYPES,
+            "floodCategory": ["primary", "secondary", "fringe"],
+        },
+    )
+    FLOOD_ZONES = FloodZoneStore(generate_flood_zones())
+    FLOOD_EXPOSURE = FloodExposureEngine(FLOOD_ZONES.all(), depth_grid=DEPTH_GRID)
+    FLOOD_EXPOSURE.apply(ASSET_STORE)
+    PORTFOLIO_VERSION: Optional[str] = None
+    SNAPSHOT_LOADED = False
+
+# Flood comes from the flood exposure above; other perils are in-memory layers
+HAZARDS = HazardMatrix(ASSET_STORE, [FloodHazardLayer(), *generate_hazard_layers()])
+
+RESPONSE_CACHE = ResponseCache(max_bytes=int(os.environ.get("RESPONSE_CACHE_MB", 64)) * 2 ** 20)
+
+_search_index: Optional[AssetSearchIndex] = None
+
+def get_search_index() -> AssetSearchIndex:
+    """Search index for the current store contents, refreshed after writes"""
+    global _search_index
+    if _search_index is None:
+        _search_index = AssetSearchIndex.build(ASSET_STORE)
+    else:
+        _search_index.refresh(ASSET_STORE)
+    return _search_index
+
+# ============== Loss Model ==============
+
+DAMAGE_CURVES = load_damage_curves(
+    Path(os.environ.get("DAMAGE_CURVES_PATH", ROOT_DIR / "data" / "damage_curves.csv"))
+)
+
+SIMULATION_WORKERS = int(os.environ.get("SIMULATION_WORKERS", os.cpu_count() or 1))
+_simulation_pool: Optional[ProcessPoolExecutor] = None
+
+def get_simulation_pool() -> ProcessPoolExecutor:
+    global _simulation_pool
+    if _simulation_pool is None:
+        _simulation_pool = ProcessPoolExecutor(max_workers=SIMULATION_WORKERS)
+    return _simulation_pool
+
+KPI_AGGREGATES = KPIAggregates(ASSET_STORE, DAMAGE_CURVES.loss_ratios)
+# Serializes exposure writes, which may now also come from job threads
+EXPOSURE_WRITE_LOCK = threading.Lock()
+
+_id_order: Optional[IdOrder] = None
+
+def get_id_order() -> IdOrder:
+    """assetId ordering for cursor pagination, refreshed after writes"""
+    global _id_order
+    if _id_order is None:
+        _id_order = IdOrder(ASSET_STORE)
+    else:
+        _id_order.refresh()
+    return _id_order
+
+_zone_lod: Optional[ZoneLOD] = None
+
+def get_zone_lod() -> ZoneLOD:
+    """Simplified zone rings for the current zones, refreshed after writes"""
+    global _zone_lod
+    if _zone_lod is None or _zone_lod.zones is not FLOOD_ZONES:
+        _zone_lod = ZoneLOD(FLOOD_ZONES)
+    else:
+        _zone_lod.refresh()
+    return _zone_lod
+
+_tile_index: Optional[TileIndex] = None
+
+def get_tile_index() -> TileIndex:
+    """Tile index for the current store contents, refreshed after writes"""
+    global _tile_index
+    if _tile_index is None:
+        _tile_index = TileIndex(ASSET_STORE)
+    else:
+        _tile_index.refresh()
+    return _tile_index
+
+def snapshot_store(names: Optional[Sequence[str]] = None) -> AssetStore:
+    """Copy of the live store for job threads, which must not read it while writes land"""
+    with EXPOSURE_WRITE_LOCK:
+        return ASSET_STORE.snapshot(names)
+
+def refresh_exposure(rows: np.ndarray) -> None:
+    """Re-classify ``rows`` against the current zones and update the KPI aggregates"""
+    with EXPOSURE_WRITE_LOCK:
+        KPI_AGGREGATES.remove(rows)
+        FLOOD_EXPOSURE.apply(ASSET_STORE, rows)
+        KPI_AGGREGATES.add(rows)
+        HAZARDS.refresh(rows, [FLOOD_PERIL])
+
+def apply_zone_changes(upserts: List[dict], deletes: List[str] = ()) -> List[Optional[dict]]:
+    """Upsert and delete flood zones, then re-expose the assets they touch(ed).
+
+    Returns the previous version of each changed zone (None where it is new).
+    """
+    global FLOOD_EXPOSURE
+    old = [FLOOD_ZONES.get(zone["flood_id"]) for zone in upserts]
+    old += [FLOOD_ZONES.delete(zone_id) for zone_id in deletes]
+    for zone in upserts:
+        FLOOD_ZONES.upsert(zone)
+    FLOOD_EXPOSURE = FloodExposureEngine(FLOOD_ZONES.all(), depth_grid=DEPTH_GRID)
+    refresh_exposure(zone_bbox_rows(ASSET_STORE, [z for z in old + upserts if z is not None]))
+    return old
+
+def replace_flood_zone(zone_id: str, zone: Optional[dict]) -> Optional[dict]:
+    """Upsert (or delete, when ``zone`` is None) a flood zone and re-expose affected assets"""
+    if zone is None:
+        return apply_zone_changes([], [zone_id])[0]
+    return apply_zone_changes([zone])[0]
+
+def apply_asset_upserts(records: List[dict]) -> np.ndarray:
+    """Write validated assets into the store and bring exposure and KPIs up to date"""
+    with EXPOSURE_WRITE_LOCK:
+        existing = ASSET_STORE.rows_of([r["assetId"] for r in records])
+        KPI_AGGREGATES.remove(np.unique(existing[existing >= 0]))
+        rows = np.unique(ASSET_STORE.upsert(records))
+        FLOOD_EXPOSURE.apply(ASSET_STORE, rows)
+        KPI_AGGREGATES.add(rows)
+        HAZARDS.refresh(rows)
+    return rows
+
+def apply_asset_deletes(asset_ids: List[str]) -> int:
+    """Remove assets from the store and the KPI aggregates; returns how many existed"""
+    with EXPOSURE_WRITE_LOCK:
+        rows = ASSET_STORE.rows_of(asset_ids)
+        rows = np.unique(rows[rows >= 0])
+        KPI_AGGREGATES.remove(rows)
+        HAZARDS.move(*ASSET_STORE.delete(asset_ids))
+    return len(rows)
+
+class Portfolio(NamedTuple):
+    """A store with everything derived from it, built beside the live one"""
+    zones: FloodZoneStore
+    exposure: FloodExposureEngine
+    store: AssetStore
+    kpis: KPIAggregates
+    hazards: HazardMatrix
+
+def build_portfolio(assets: Union[List[dict], AssetStore], zones: List[dict]) -> Portfolio:
+    """Classify and aggregate a new portfolio without touching the live one (safe off the event loop).
+
+    ``assets`` may be Asset dicts or a store whose columns are taken over as-is.
+    """
+    flood_zones = FloodZoneStore(zones)
+    exposure = FloodExposureEngine(flood_zones.all(), depth_grid=DEPTH_GRID)
+    # Same vocabularies as the live store, so category codes keep their meaning
+    store = AssetStore(categories={name: list(c.labels) for name, c in ASSET_STORE.categories.items()})
+    if isinstance(assets, AssetStore):
+        store.adopt(assets)
+    else:
+        store.load(assets)
+    exposure.apply(store)
+    kpis = KPIAggregates(store, DAMAGE_CURVES.loss_ratios)
+    kpis.warm()
+    hazards = HazardMatrix(store, HAZARDS.layers)
+    hazards.warm()
+    return Portfolio(flood_zones, exposure, store, kpis, hazards)
+
+def publish_portfolio(portfolio: Portfolio) -> None:
+    """Make ``portfolio`` the live one by swapping references.
+
+    Call on the event loop: requests run there, so none sees a mix of old
+    and new state, and the old objects stay intact for jobs still reading
+    them.
+    """
+    global FLOOD_ZONES, FLOOD_EXPOSURE, ASSET_STORE, KPI_AGGREGATES, HAZARDS, _search_index, _id_order, _tile_index
+    zones, exposure, store, kpis, hazards = portfolio
+    with EXPOSURE_WRITE_LOCK:
+        if hazards.layers != HAZARDS.layers:
+            # A layer changed while this was built; sample the current ones on first use
+            hazards = HazardMatrix(store, HAZARDS.layers)
+        # Versions carry on, so cache keys and ETags from the old portfolio never match
+        store.version = ASSET_STORE.version + 1
+        store.rows_version = ASSET_STORE.rows_version + 1
+        zones.version = FLOOD_ZONES.version + 1
+        hazards.version = HAZARDS.version + 1
+        FLOOD_ZONES, FLOOD_EXPOSURE, ASSET_STORE, KPI_AGGREGATES, HAZARDS = zones, exposure, store, kpis, hazards
+        _search_index = _id_order = _tile_index = None
+        RESPONSE_CACHE.clear()
+
+def install_portfolio(assets: Union[List[dict], AssetStore], zones: List[dict]) -> None:
+    """Replace the whole in-memory portfolio and recompute everything derived from it (blocking)"""
+    publish_portfolio(build_portfolio(assets, zones))
+
+# ============== Persistence ==============
+
+PORTFOLIO_REPO = PortfolioRepository(db)
+# Only development setups should write the generated mock portfolio into an empty database
+SEED_MOCK_PORTFOLIO = os.environ.get("SEED_MOCK_PORTFOLIO", "").lower() in ("1", "true", "yes")
+# Times reconcile re-reads MongoDB when writes keep landing while it loads
+RECONCILE_ATTEMPTS = 3
+
+async def mark_portfolio_written() -> None:
+    """Give the portfolio a new version so older snapshots are recognized as stale"""
+    global PORTFOLIO_VERSION
+    PORTFOLIO_VERSION = await PORTFOLIO_REPO.set_version()
+
+def write_snapshot() -> None:
+    with EXPOSURE_WRITE_LOCK:
+        save_snapshot(ASSET_STORE, FLOOD_ZONES.all(), Path(ASSET_SNAPSHOT_PATH), PORTFOLIO_VERSION)
+    logger.info("Wrote portfolio snapshot (%d assets) to %s", len(ASSET_STORE), ASSET_SNAPSHOT_PATH)
+
+def warm_indexes() -> None:
+    """Build the derived indexes ahead of the first request that needs them"""
+    try:
+        ASSET_STORE.id_index()
+        get_id_order()
+        get_search_index()
+        get_tile_index()
+        get_zone_lod()
+        with EXPOSURE_WRITE_LOCK:
+            KPI_AGGREGATES.warm()
+            HAZARDS.warm()
+    except Exception:
+        logger.exception("Index warm-up failed; indexes will build on first use")
+
+async def reconcile_portfolio() -> None:
+    """Bring memory in line with MongoDB: reload when the versions differ, or seed an empty database if asked to"""
+    global PORTFOLIO_VERSION
+    await PORTFOLIO_REPO.ensure_indexes()
+    if await PORTFOLIO_REPO.count_assets() == 0:
+        if SEED_MOCK_PORTFOLIO:
+            await PORTFOLIO_REPO.upsert_zones(FLOOD_ZONES.all())
+            await PORTFOLIO_REPO.upsert_assets(ASSET_STORE.to_records())
+            PORTFOLIO_VERSION = await PORTFOLIO_REPO.set_version(PORTFOLIO_VERSION)
+            return
+        # Serve what the database holds rather than the generated placeholder
+        logger.warning("MongoDB has no assets; serving an empty portfolio (set SEED_MOCK_PORTFOLIO=1 to seed mock data)")
+    version = await PORTFOLIO_REPO.get_version()
+    if SNAPSHOT_LOADED and version is not None and version == PORTFOLIO_VERSION:
+        return
+    for _ in range(RECONCILE_ATTEMPTS):
+        # A write landing while this loads may be missing from what was read; load again if one did
+        seen = (ASSET_STORE.version, FLOOD_ZONES.version)
+        zones = await PORTFOLIO_REPO.load_zones()
+        assets = await PORTFOLIO_REPO.load_assets()
+        portfolio = await asyncio.get_running_loop().run_in_executor(None, build_portfolio, assets, zones)
+        if (ASSET_STORE.version, FLOOD_ZONES.version) == seen:
+            break
+    else:
+        logger.warning("Portfolio kept changing while loading from MongoDB; recent writes may be missing until the next reload")
+    publish_portfolio(portfolio)
+    PORTFOLIO_VERSION = version or await PORTFOLIO_REPO.set_version()
+    logger.info("Loaded %d assets and %d flood zones from MongoDB", len(assets), len(zones))
+    if ASSET_SNAPSHOT_PATH:
+        await asyncio.get_running_loop().run_in_executor(None, write_snapshot)
+
+def ingest_summary(results: List[dict], validation_errors: List[dict], received: int, seconds: float) -> dict:
+    errors = validation_errors + [e for r in results for e in r["errors"]]
+    return {
+        "received": received,
+        "upserted": sum(r["upserted"] for r in results),
+        "modified": sum(r["modified"] for r in results),
+        "rejected": len(errors),
+        "errors": errors[:MAX_INGEST_ERRORS],
+        "batches": len(results),
+        "seconds": seconds,
+        "recordsPerSecond": received / seconds if seconds > 0 else 0.0,
+    }
+
+def batch_stats(operation: str, records: int, applied: int, seconds: float) -> dict:
+    return {
+        "operation": operation,
+        "records": records,
+        "applied": applied,
+        "seconds": seconds,
+        "recordsPerSecond": records / seconds if seconds > 0 else 0.0,
+    }
+
+# ============== Analytics ==============
+
+def query_kpi_groups(
+    store: AssetStore,
+    group_by: Optional[str] = None,
+    **filters,
+) -> List[dict]:
+    """Grouped KPIs over the assets matching ``AssetStore.filter_mask`` filters"""
+    mask = store.filter_mask(**filters)
+    return grouped_kpis(store, np.flatnonzero(mask), DAMAGE_CURVES.loss_ratios, group_by)
+
+def valid_radii(radii: List[float]) -> bool:
+    return bool(radii) and all(0 < r <= MAX_ACCUMULATION_RADIUS_M for r in radii)
+
+# Store columns accumulation_report reads
+ACCUMULATION_COLUMNS = ("assetType", "inFloodZone", "latitude", "longitude", "giv")
+
+def accumulation_report(
+    store: AssetStore,
+    radii: List[float],
+    top_k: int,
+    flooded_only: bool = False,
+    asset_types: Optional[List[str]] = None,
+) -> dict:
+    """Largest GIV within each radius, with the top non-overlapping hotspots"""
+    mask = store.filter_mask(asset_types=asset_types)
+    if flooded_only:
+        mask &= store.column("inFloodZone")
+    rows = np.flatnonzero(mask)
+    lat, lng = store.column("latitude")[rows], store.column("longitude")[rows]
+    giv = store.column("giv")[rows]
+    report = []
+    for radius in radii:
+        spots = hotspots(lat, lng, giv, radius, top_k)
+        report.append({"radiusM": radius, "maxGIV": spots[0]["giv"] if spots else 0.0, "hotspots": spots})
+    return {"assetCount": len(rows), "totalGIV": float(giv.sum()), "radii": report}
+
+async def run_flood_simulation(request: FloodSimulationRequest, report=None) -> dict:
+    """Loss table in a thread, year chunks on the simulation process pool"""
+    seed = request.seed if request.seed is not None else random.SystemRandom().randrange(2 ** 63)
+    loop = asyncio.get_running_loop()
+    # The table takes seconds to build, so it reads copies that writes can't shrink under it
+    with EXPOSURE_WRITE_LOCK:
+        store, engine = ASSET_STORE.snapshot(LOSS_TABLE_COLUMNS), FLOOD_EXPOSURE
+    model = await loop.run_in_executor(None, zone_loss_table, store, engine, DAMAGE_CURVES, request.depthSigma)
+    pool = get_simulation_pool()
+    chunks = plan_chunks(request.years, seed)
+    futures = [
+        loop.run_in_executor(pool, simulate_chunk, model, chunk_seed, years)
+        for chunk_seed, years in chunks
+    ]
+    if report is not None:
+        done = 0
+        for future in asyncio.as_completed(futures):
+            await future
+            done += 1
+            report(done / len(futures), f"{done}/{len(futures)} chunks simulated")
+    results = await asyncio.gather(*futures)
+    annual = np.concatenate([r[0] for r in results])
+    max_event = np.concatenate([r[1] for r in results])
+    summary = summarize(annual, max_event, request.returnPeriods)
+    return {**summary, "seed": seed, "damageCurveVersion": DAMAGE_CURVES.version}
+
+# Canonical scenario specs by content hash, most recently used last
+SCENARIOS: "OrderedDict[str, dict]" = OrderedDict()
+
+def register_scenario(request: ScenarioRequest) -> str:
+    spec = canonical_scenario(request.model_dump())
+    key = scenario_id(spec)
+    SCENARIOS[key] = spec
+    SCENARIOS.move_to_end(key)
+    while len(SCENARIOS) > MAX_SCENARIOS:
+        SCENARIOS.popitem(last=False)
+    return key
+
+def run_scenario(key: str) -> dict:
+    """KPIs for a registered scenario against the current portfolio"""
+    with EXPOSURE_WRITE_LOCK:
+        before, after = changed_zones(FLOOD_ZONES, SCENARIOS[key])
+        baseline = {"portfolio": KPI_AGGREGATES.portfolio(), "flood": KPI_AGGREGATES.flood()}
+        result = evaluate_scenario(ASSET_STORE, FLOOD_EXPOSURE, DAMAGE_CURVES, baseline, before, after)
+    return {"scenarioId": key, **result}
+
+def scenario_response(request: Request, key: str) -> Response:
+    # Validate before building so bad edits are a 400, not a cached 500
+    try:
+        changed_zones(FLOOD_ZONES, SCENARIOS[key])
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return RESPONSE_CACHE.respond(
+        request,
+        (key, ASSET_STORE.version, FLOOD_ZONES.version),
+        lambda: dumps_records(run_scenario(key)),
+    )
+
+# ============== Background Jobs ==============
+
+JOB_CONCURRENCY = int(os.environ.get("JOB_CONCURRENCY", 2))
+JOB_OUTPUT_DIR = Path(os.environ.get("JOB_OUTPUT_DIR", ROOT_DIR / "job_output"))
+EXPOSURE_JOB_BLOCK = 100000
+
+JOB_RUNNER = JobRunner(db.jobs, max_concurrent=JOB_CONCURRENCY)
+
+JOB_PARAM_MODELS = {
+    "kpi_query": KPIQueryJobParams,
+    "flood_simulation": FloodSimulationRequest,
+    "exposure_refresh": ExposureRefreshJobParams,
+    "export": ExportJobParams,
+    "snapshot": SnapshotJobParams,
+    "accumulation": AccumulationJobParams,
+}
+
+async def kpi_query_job(params: dict, report) -> dict:
+    p = KPIQueryJobParams(**params)
+    store = snapshot_store()
+    groups = await JOB_RUNNER.run_sync(
+        lambda: query_kpi_groups(
+            store,
+            group_by=p.groupBy,
+            asset_types=p.assetTypes,
+            construction_types=p.constructionTypes,
+            coverage_types=p.coverageTypes,
+            risk_min=p.riskMin,
+            risk_max=p.riskMax,
+            bbox=p.bbox,
+            asset_ids=p.assetIds,
+        )
+    )
+    return {"groupBy": p.groupBy, "groups": groups}
+
+async def flood_simulation_job(params: dict, report) -> dict:
+    return await run_flood_simulation(FloodSimulationRequest(**params), report)
+
+async def exposure_refresh_job(params: dict, report) -> dict:
+    """Re-classify every asset in blocks; readers see each block land as it is done"""
+    start = 0
+    while start < len(ASSET_STORE):
+        total = len(ASSET_STORE)
+        rows = np.arange(start, min(start + EXPOSURE_JOB_BLOCK, total))
+        await JOB_RUNNER.run_sync(refresh_exposure, rows)
+        start += len(rows)
+        report(start / total, f"{start}/{total} assets classified")
+    return {"assetCount": start, "exposedAssetCount": KPI_AGGREGATES.flooded_count}
+
+async def export_job(params: dict, report) -> dict:
+    fmt = ExportJobParams(**params).format
+    _, extension, chunks = EXPORT_FORMATS[fmt]
+    file_name = f"assets-{uuid.uuid4()}.{extension}"
+    store = snapshot_store()
+
+    def write() -> int:
+        JOB_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        size = 0
+        with open(JOB_OUTPUT_DIR / file_name, "wb") as out:
+            for chunk in chunks(store):
+                out.write(chunk)
+                size += len(chunk)
+        return size
+
+    size = await JOB_RUNNER.run_sync(write)
+    return {"format": fmt, "fileName": file_name, "bytes": size, "assetCount": len(store)}
+
+async def snapshot_job(params: dict, report) -> dict:
+    await JOB_RUNNER.run_sync(write_snapshot)
+    return {"path": ASSET_SNAPSHOT_PATH, "assetCount": len(ASSET_STORE), "version": PORTFOLIO_VERSION}
+
+async def accumulation_job(params: dict, report) -> dict:
+    p = AccumulationJobParams(**params)
+    store = snapshot_store(ACCUMULATION_COLUMNS)
+    radii = sorted(set(p.radii))
+    return await JOB_RUNNER.run_sync(accumulation_report, store, radii, p.topK, p.floodedOnly, p.assetTypes)
+
+JOB_RUNNER.register("kpi_query", kpi_query_job)
+JOB_RUNNER.register("flood_simulation", flood_simulation_job)
+JOB_RUNNER.register("exposure_refresh", exposure_refresh_job)
+JOB_RUNNER.register("export", export_job)
+JOB_RUNNER.register("snapshot", snapshot_job)
+JOB_RUNNER.register("accumulation", accumulation_job)
 
 # ============== API Routes ==============
 
+def parse_bbox(bbox: Optional[str]) -> Optional[Tuple[float, float, float, float]]:
+    """Parse a ``minLat,minLng,maxLat,maxLng`` query parameter"""
+    if bbox is None:
+        return None
+    try:
+        min_lat, min_lng, max_lat, max_lng = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be minLat,minLng,maxLat,maxLng")
+    return min_lat, min_lng, max_lat, max_lng
+
 @api_router.get("/")
 async def root():
     return {"message": "INSpace Insurance Risk Analytics API", "version": "1.0.0"}
 
+@api_router.get("/metrics")
+async def get_metrics():
+    """Request, event-loop and MongoDB metrics in Prometheus text format"""
+    return Response(METRICS.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @api_router.get("/health")
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now(timezone.utc).isoformat()}
 
 # Asset routes
 @api_router.get("/assets", response_model=List[Asset])
-async def get_assets():
-    """Get all assets"""
-    return MOCK_ASSETS
+async def get_assets(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    """Get all assets, or one assetId-ordered page when limit/cursor is given"""
+    headers = {}
+    rows = None
+    if limit is not None or cursor is not None:
+        try:
+            after = None if cursor is None else decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        limit = limit or DEFAULT_PAGE_SIZE
+        rows = get_id_order().page(after, limit)
+        if len(rows) == limit:
+            headers["X-Next-Cursor"] = encode_cursor(ASSET_STORE.column("assetId")[rows[-1]])
+    # Store rows are already validated; skip re-validating them through the model
+    return RESPONSE_CACHE.respond(
+        request, ASSET_STORE.version, lambda: dumps_records(ASSET_STORE.to_records(rows)), headers=headers
+    )
+
+@api_router.get("/assets/export")
+async def export_assets(format: Literal["ndjson", "arrow", "parquet"] = "ndjson"):
+    """Stream every asset as NDJSON, an Arrow IPC stream or Parquet"""
+    media_type, extension, chunks = EXPORT_FORMATS[format]
+    if format != "ndjson" and importlib.util.find_spec("pyarrow") is None:
+        raise HTTPException(status_code=501, detail=f"{format} export requires pyarrow")
+    return StreamingResponse(
+        chunks(ASSET_STORE),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="assets.{extension}"'},
+    )
 
 @api_router.get("/assets/{asset_id}", response_model=Asset)
 async def get_asset(asset_id: str):
     """Get a specific asset by ID"""
-    for asset in MOCK_ASSETS:
-        if asset["assetId"] == asset_id:
-            return asset
-    raise HTTPException(status_code=404, detail="Asset not found")
+    row = ASSET_STORE.row_of(asset_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return ASSET_STORE.to_record(row)
+
+@api_router.get("/assets/{asset_id}/hazards", response_model=AssetHazards)
+async def get_asset_hazards(asset_id: str):
+    """Hazard intensity per peril for one asset (null where it is not exposed)"""
+    row = ASSET_STORE.row_of(asset_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return {"assetId": asset_id, "hazards": HAZARDS.intensities(row)}
+
+@api_router.get("/assets/tiles/{z}/{x}/{y}", response_model=AssetTileResponse)
+async def get_asset_tile(
+    z: int = PathParam(ge=0, le=MAX_TILE_ZOOM),
+    x: int = PathParam(ge=0),
+    y: int = PathParam(ge=0),
+    asset_type: Optional[List[str]] = Query(None),
+):
+    """Assets in an XYZ map tile: clusters at low zoom, individual assets at high zoom"""
+    if x >= 2 ** z or y >= 2 ** z:
+        raise HTTPException(status_code=400, detail="Tile coordinates out of range for zoom")
+    index = get_tile_index()
+    mask = None if asset_type is None else ASSET_STORE.filter_mask(asset_types=asset_type)
+    tile = {"z": z, "x": x, "y": y, "clustered": True, "clusters": [], "assets": []}
+    if z >= ASSET_MIN_ZOOM:
+        rows = index.tile_rows(z, x, y)
+        if mask is not None:
+            rows = rows[mask[rows]]
+        if len(rows) <= MAX_TILE_ASSETS:
+            tile.update(clustered=False, assets=ASSET_STORE.to_records(rows))
+            return tile
+    tile["clusters"] = index.clusters(z, x, y) if mask is None else index.filtered_clusters(z, x, y, mask)
+    return tile
+
+@api_router.post("/assets/batch", response_model=AssetBatchResponse)
+async def get_assets_batch(request: AssetBatchRequest):
+    """Resolve many asset IDs in one round trip"""
+    rows = ASSET_STORE.rows_of(request.assetIds)
+    found = rows >= 0
+    return {
+        "assets": ASSET_STORE.to_records(rows[found]),
+        "missing": [asset_id for asset_id, ok in zip(request.assetIds, found.tolist()) if not ok],
+    }
 
 @api_router.get("/assets/search/{query}")
-async def search_assets(query: str):
-    """Search assets by ID or address"""
-    query_lower = query.lower()
-    results = [
-        asset for asset in MOCK_ASSETS
-        if query_lower in asset["assetId"].lower() or query_lower in asset["address"].lower()
-    ]
-    return results
+async def search_assets(
+    query: str,
+    limit: int = Query(50, ge=1, le=MAX_SEARCH_LIMIT),
+    offset: int = Query(0, ge=0),
+):
+    """Search assets by ID or address, ranked ID-prefix first"""
+    return ASSET_STORE.to_records(get_search_index().search(query, limit=limit, offset=offset))
+
+@api_router.post("/assets/ingest", response_model=IngestResponse)
+async def ingest_assets(request: Request):
+    """Bulk upsert assets from a CSV (text/csv) or NDJSON (application/x-ndjson) body"""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    fmt = {"text/csv": "csv", "application/x-ndjson": "ndjson"}.get(content_type)
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Send text/csv or application/x-ndjson")
+    started = time.perf_counter()
+    received, results, validation_errors = 0, [], []
+    try:
+        async for batch in iter_record_batches(iter_lines(request.stream()), fmt):
+            received += len(batch)
+            valid, errors = validate_records(Asset, batch, "assetId")
+            validation_errors += errors
+            result = await PORTFOLIO_REPO.upsert_assets(valid)
+            failed = failed_ids(result)
+            apply_asset_upserts([a for a in valid if a["assetId"] not in failed])
+            results.append(result)
+            await mark_portfolio_written()
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise HTTPException(status_code=400, detail=f"Malformed {fmt} after {received} records: {exc}")
+    return ingest_summary(results, validation_errors, received, time.perf_counter() - started)
+
+@api_router.post("/assets/bulk", response_model=AssetBulkResponse)
+async def bulk_write_assets(request: AssetBulkRequest):
+    """Upsert then delete assets in batches, updating indexes, exposure and KPIs incrementally"""
+    started = time.perf_counter()
+    batches, errors = [], []
+    upserted = modified = deleted = 0
+    for start in range(0, len(request.upserts), INGEST_BATCH):
+        batch_started = time.perf_counter()
+        batch = request.upserts[start:start + INGEST_BATCH]
+        valid, invalid = validate_records(Asset, batch, "assetId")
+        result = await PORTFOLIO_REPO.upsert_assets(valid)
+        failed = failed_ids(result)
+        applied = [a for a in valid if a["assetId"] not in failed]
+        apply_asset_upserts(applied)
+        await mark_portfolio_written()
+        errors += invalid + result["errors"]
+        upserted += result["upserted"]
+        modified += result["modified"]
+        batches.append(batch_stats("upsert", len(batch), len(applied), time.perf_counter() - batch_started))
+    for start in range(0, len(request.deletes), INGEST_BATCH):
+        batch_started = time.perf_counter()
+        batch = request.deletes[start:start + INGEST_BATCH]
+        await PORTFOLIO_REPO.delete_assets(batch)
+        removed = apply_asset_deletes(batch)
+        await mark_portfolio_written()
+        deleted += removed
+        batches.append(batch_stats("delete", len(batch), removed, time.perf_counter() - batch_started))
+    seconds = time.perf_counter() - started
+    received = len(request.upserts) + len(request.deletes)
+    return {
+        "received": received,
+        "upserted": upserted,
+        "modified": modified,
+        "deleted": deleted,
+        "rejected": len(errors),
+        "errors": errors[:MAX_INGEST_ERRORS],
+        "batches": batches,
+        "seconds": seconds,
+        "recordsPerSecond": received / seconds if seconds > 0 else 0.0,
+    }
 
 # Flood zone routes
-@api_router.get("/flood-zones", response_model=List[FloodZone])
-async def get_flood_zones():
-    """Get all flood zones"""
-    return FLOOD_ZONES
+@api_router.get("/flood-zones", response_model=List[FloodZoneView])
+async def get_flood_zones(
+    request: Request,
+    zoom: Optional[int] = Query(None, ge=0, le=MAX_TILE_ZOOM),
+    bbox: Optional[str] = Query(None, description="minLat,minLng,maxLat,maxLng"),
+    encoding: Literal["coordinates", "polyline"] = "coordinates",
+):
+    """Get flood zones, optionally simplified for a map zoom, clipped to a bbox or polyline-encoded"""
+    bounds = parse_bbox(bbox)
+    return RESPONSE_CACHE.respond(
+        request,
+        FLOOD_ZONES.version,
+        lambda: dumps_records(get_zone_lod().view(zoom=zoom, bbox=bounds, encoding=encoding)),
+    )
+
+@api_router.post("/flood-zones/ingest", response_model=IngestResponse)
+async def ingest_flood_zones(collection: Dict[str, Any]):
+    """Bulk upsert flood zones from a GeoJSON FeatureCollection of polygons"""
+    started = time.perf_counter()
+    try:
+        raw = zones_from_geojson(collection)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    zones, validation_errors = validate_records(FloodZone, raw, "flood_id")
+    result = await PORTFOLIO_REPO.upsert_zones(zones)
+    failed = failed_ids(result)
+    apply_zone_changes([z for z in zones if z["flood_id"] not in failed])
+    await mark_portfolio_written()
+    return ingest_summary([result], validation_errors, len(raw), time.perf_counter() - started)
 
 @api_router.get("/flood-zones/{zone_id}", response_model=FloodZone)
 async def get_flood_zone(zone_id: str):
     """Get a specific flood zone by ID"""
-    for zone in FLOOD_ZONES:
-        if zone["flood_id"] == zone_id:
-            return zone
-    raise HTTPException(status_code=404, detail="Flood zone not found")
+    zone = FLOOD_ZONES.get(zone_id)
+    if zone is None:
+        raise HTTPException(status_code=404, detail="Flood zone not found")
+    return zone
+
+@api_router.put("/flood-zones/{zone_id}", response_model=FloodZone)
+async def put_flood_zone(zone_id: str, zone: FloodZone):
+    """Create or replace a flood zone and update exposure for the assets it touches"""
+    if zone.flood_id != zone_id:
+        raise HTTPException(status_code=400, detail="flood_id does not match the URL")
+    await PORTFOLIO_REPO.upsert_zones([zone.model_dump()])
+    replace_flood_zone(zone_id, zone.model_dump())
+    await mark_portfolio_written()
+    return zone
+
+@api_router.delete("/flood-zones/{zone_id}", response_model=FloodZone)
+async def delete_flood_zone(zone_id: str):
+    """Delete a flood zone and update exposure for the assets it covered"""
+    if FLOOD_ZONES.get(zone_id) is None:
+        raise HTTPException(status_code=404, detail="Flood zone not found")
+    await PORTFOLIO_REPO.delete_zone(zone_id)
+    old = replace_flood_zone(zone_id, None)
+    await mark_portfolio_written()
+    return old
+
+# Hazard layer routes
+def hazard_layer_info(layer) -> dict:
+    column = HAZARDS.values[:, HAZARDS.perils.index(layer.peril)]
+    return {
+        "peril": layer.peril,
+        "kind": layer.kind,
+        "unit": layer.unit,
+        "description": layer.description,
+        "exposedAssetCount": int((~np.isnan(column)).sum()),
+        "details": layer.info(),
+    }
+
+@api_router.get("/hazards", response_model=List[HazardLayerInfo])
+async def list_hazard_layers():
+    """Registered hazard layers, one per peril"""
+    return [hazard_layer_info(layer) for layer in HAZARDS.layers]
+
+@api_router.put("/hazards/{peril}", response_model=HazardLayerInfo)
+async def put_hazard_layer(peril: str, layer: HazardLayerRequest):
+    """Register or replace a polygon or raster hazard layer and sample it at every asset"""
+    if peril == FLOOD_PERIL:
+        raise HTTPException(status_code=400, detail="The flood peril follows the flood zones; edit those instead")
+    if layer.kind == "raster":
+        if layer.origin is None or layer.cellSize is None:
+            raise HTTPException(status_code=400, detail="Raster layers need origin and cellSize")
+        if sum(len(row) for row in layer.values) > MAX_RASTER_CELLS:
+            raise HTTPException(status_code=413, detail=f"Rasters are limited to {MAX_RASTER_CELLS} cells")
+    try:
+        built = hazard_layer({**layer.model_dump(), "peril": peril})
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    with EXPOSURE_WRITE_LOCK:
+        HAZARDS.set_layer(built)
+    return hazard_layer_info(built)
+
+@api_router.delete("/hazards/{peril}", response_model=HazardLayerInfo)
+async def delete_hazard_layer(peril: str):
+    """Remove a hazard layer"""
+    if peril == FLOOD_PERIL:
+        raise HTTPException(status_code=400, detail="The flood peril follows the flood zones; edit those instead")
+    layer = HAZARDS.layer(peril)
+    if layer is None:
+        raise HTTPException(status_code=404, detail="Hazard layer not found")
+    info = hazard_layer_info(layer)
+    with EXPOSURE_WRITE_LOCK:
+        HAZARDS.remove_layer(peril)
+    return info
 
 # KPI routes
 @api_router.get("/kpis/portfolio", response_model=KPIResponse)
-async def get_portfolio_kpis():
+async def get_portfolio_kpis(request: Request):
     """Get portfolio-wide KPIs"""
-    total_giv = sum(a["giv"] for a in MOCK_ASSETS)
-    total_pnl = sum(a["pnl"] for a in MOCK_ASSETS)
-    impacted_assets = [a for a in MOCK_ASSETS if a["inFloodZone"]]
-    impacted_giv = sum(a["giv"] for a in impacted_assets)
-    impacted_pnl = sum(a["pnl"] for a in impacted_assets)
-    
-    return {
-        "totalGIV": total_giv,
-        "totalPnL": total_pnl,
-        "impactedGIV": impacted_giv,
-        "impactedPnL": impacted_pnl,
-        "assetCount": len(MOCK_ASSETS),
-    }
+    return RESPONSE_CACHE.respond(request, ASSET_STORE.version, lambda: dumps_records(KPI_AGGREGATES.portfolio()))
 
 @api_router.get("/kpis/flood", response_model=FloodKPIResponse)
-async def get_flood_kpis():
+async def get_flood_kpis(request: Request):
     """Get flood-specific KPIs"""
-    flooded_assets = [a for a in MOCK_ASSETS if a["inFloodZone"]]
-    flooded_giv = sum(a["giv"] for a in flooded_assets)
-    
-    # Calculate estimated loss based on depth and construction
-    def get_exposure_factor(depth, construction):
-        base_factors = {
-            "Wood Frame": 0.15,
-            "Steel Frame": 0.08,
-            "Concrete": 0.06,
-            "Masonry": 0.10,
-            "Mixed": 0.12,
-        }
-        base = base_factors.get(construction, 0.10)
-        if depth < 1:
-            return base * 0.5
-        elif depth < 2:
-            return base * 1.0
-        elif depth < 3:
-            return base * 1.5
-        return base * 2.0
-    
-    estimated_loss = sum(
-        a["giv"] * get_exposure_factor(a["floodDepth"], a["constructionType"])
-        for a in flooded_assets
+    return RESPONSE_CACHE.respond(request, ASSET_STORE.version, lambda: dumps_records(KPI_AGGREGATES.flood()))
+
+@api_router.get("/kpis/hazards", response_model=HazardKPIResponse)
+async def get_hazard_kpis(
+    request: Request,
+    asset_type: Optional[List[str]] = Query(None),
+    construction_type: Optional[List[str]] = Query(None),
+    coverage_type: Optional[List[str]] = Query(None),
+    risk_min: Optional[int] = Query(None, ge=0, le=100),
+    risk_max: Optional[int] = Query(None, ge=0, le=100),
+    bbox: Optional[str] = Query(None, description="minLat,minLng,maxLat,maxLng"),
+):
+    """Per-peril exposure and combined multi-peril KPIs, optionally for a filtered subset"""
+    filters = dict(
+        asset_types=asset_type,
+        construction_types=construction_type,
+        coverage_types=coverage_type,
+        risk_min=risk_min,
+        risk_max=risk_max,
+        bbox=parse_bbox(bbox),
     )
-    
-    depths = [a["floodDepth"] for a in flooded_assets if a["floodDepth"] > 0]
-    median_depth = sorted(depths)[len(depths) // 2] if depths else 0
-    
-    return {
-        "floodedGIV": flooded_giv,
-        "estimatedFloodLoss": estimated_loss,
-        "exposedAssetCount": len(flooded_assets),
-        "medianFloodDepth": median_depth,
-        "totalAssets": len(MOCK_ASSETS),
-    }
+    return RESPONSE_CACHE.respond(
+        request,
+        (ASSET_STORE.version, HAZARDS.version),
+        lambda: dumps_records(HAZARDS.kpis(np.flatnonzero(ASSET_STORE.filter_mask(**filters)))),
+    )
+
+@api_router.get("/kpis/query", response_model=KPIQueryResponse)
+async def query_kpis(
+    request: Request,
+    asset_type: Optional[List[str]] = Query(None),
+    construction_type: Optional[List[str]] = Query(None),
+    coverage_type: Optional[List[str]] = Query(None),
+    risk_min: Optional[int] = Query(None, ge=0, le=100),
+    risk_max: Optional[int] = Query(None, ge=0, le=100),
+    bbox: Optional[str] = Query(None, description="minLat,minLng,maxLat,maxLng"),
+    asset_ids: Optional[List[str]] = Query(None),
+    group_by: Optional[GroupByField] = None,
+):
+    """Portfolio and flood KPIs for a filtered subset, optionally grouped"""
+    filters = dict(
+        asset_types=asset_type,
+        construction_types=construction_type,
+        coverage_types=coverage_type,
+        risk_min=risk_min,
+        risk_max=risk_max,
+        bbox=parse_bbox(bbox),
+        asset_ids=asset_ids,
+    )
+    return RESPONSE_CACHE.respond(
+        request,
+        ASSET_STORE.version,
+        lambda: dumps_records(
+            {"groupBy": group_by, "groups": query_kpi_groups(ASSET_STORE, group_by=group_by, **filters)}
+        ),
+    )
+
+@api_router.get("/accumulation", response_model=AccumulationResponse)
+async def get_accumulation(
+    request: Request,
+    radius_m: List[float] = Query(list(ACCUMULATION_RADII_M)),
+    top_k: int = Query(10, ge=1, le=MAX_ACCUMULATION_HOTSPOTS),
+    flooded_only: bool = False,
+    asset_type: Optional[List[str]] = Query(None),
+):
+    """Most GIV within any circle of each radius, plus the top-K hotspots"""
+    if not valid_radii(radius_m):
+        raise HTTPException(status_code=400, detail=f"Radii must be in (0, {MAX_ACCUMULATION_RADIUS_M}] metres")
+    radii = sorted(set(radius_m))
+    return RESPONSE_CACHE.respond(
+        request,
+        ASSET_STORE.version,
+        lambda: dumps_records(accumulation_report(ASSET_STORE, radii, top_k, flooded_only, asset_type)),
+    )
+
+@api_router.post("/simulations/flood", response_model=FloodSimulationResponse)
+async def simulate_flood(request: FloodSimulationRequest):
+    """Monte Carlo flood years: AAL, PML at return periods and the EP curve"""
+    if any(rp < 1 for rp in request.returnPeriods):
+        raise HTTPException(status_code=400, detail="Return periods must be at least 1 year")
+    return await run_flood_simulation(request)
+
+@api_router.post("/scenarios", response_model=ScenarioResponse)
+async def evaluate_flood_scenario(request: Request, scenario: ScenarioRequest):
+    """KPI deltas for hypothetical zone overrides, new polygons or removals"""
+    return scenario_response(request, register_scenario(scenario))
+
+@api_router.get("/scenarios/{scenario_id}", response_model=ScenarioResponse)
+async def get_flood_scenario(request: Request, scenario_id: str):
+    """Re-evaluate a previously posted scenario against the current portfolio"""
+    if scenario_id not in SCENARIOS:
+        raise HTTPException(status_code=404, detail="Scenario not found")
+    SCENARIOS.move_to_end(scenario_id)
+    return scenario_response(request, scenario_id)
+
+@api_router.get("/damage-curves")
+async def get_damage_curves():
+    """Depth-damage curves used for estimatedFloodLoss, with their table version"""
+    return DAMAGE_CURVES.describe()
+
+# Job routes
+@api_router.post("/jobs", response_model=Job, status_code=202)
+async def submit_job(request: JobRequest):
+    """Start a long-running job in the background"""
+    try:
+        params = JOB_PARAM_MODELS[request.kind](**request.params)
+    except ValidationError as exc:
+        raise HTTPException(status_code=422, detail=exc.errors(include_url=False))
+    if request.kind == "export" and params.format != "ndjson" and importlib.util.find_spec("pyarrow") is None:
+        raise HTTPException(status_code=501, detail=f"{params.format} export requires pyarrow")
+    if request.kind == "snapshot" and not ASSET_SNAPSHOT_PATH:
+        raise HTTPException(status_code=400, detail="ASSET_SNAPSHOT_PATH is not configured")
+    if request.kind == "flood_simulation" and any(rp < 1 for rp in params.returnPeriods):
+        raise HTTPException(status_code=400, detail="Return periods must be at least 1 year")
+    if request.kind == "accumulation" and not valid_radii(params.radii):
+        raise HTTPException(status_code=400, detail=f"Radii must be in (0, {MAX_ACCUMULATION_RADIUS_M}] metres")
+    return await JOB_RUNNER.submit(request.kind, params.model_dump())
+
+@api_router.get("/jobs", response_model=List[Job])
+async def list_jobs(limit: int = Query(50, ge=1, le=MAX_JOB_LIST)):
+    """Most recent jobs first"""
+    return await JOB_RUNNER.list(limit)
+
+@api_router.get("/jobs/{job_id}", response_model=Job)
+async def get_job(job_id: str):
+    """Get a job's status and progress"""
+    job = await JOB_RUNNER.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@api_router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """Server-sent events with the job document on every progress or status change"""
+    if await JOB_RUNNER.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        async for job in JOB_RUNNER.watch(job_id):
+            yield f"data: {json.dumps(Job(**job).model_dump())}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@api_router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """Result of a finished job; export jobs return the exported file"""
+    job = await JOB_RUNNER.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    result = await JOB_RUNNER.result(job_id)
+    if job["kind"] == "export":
+        path = JOB_OUTPUT_DIR / result["fileName"]
+        if not path.exists():
+            raise HTTPException(status_code=410, detail="Export file is no longer available")
+        media_type = EXPORT_FORMATS[result["format"]][0]
+        return FileResponse(path, media_type=media_type, filename=result["fileName"])
+    return result
+
+# Status check routes
+STATUS_LOG = StatusLog(db.status_checks, ttl_seconds=int(os.environ.get("STATUS_TTL_DAYS", 30)) * 86400)
 
-# Status check routes (existing)
 @api_router.post("/status", response_model=StatusCheck)
 async def create_status_check(input: StatusCheckCreate):
-    status_dict = input.model_dump()
-    status_obj = StatusCheck(**status_dict)
-    
-    doc = status_obj.model_dump()
-    doc['timestamp'] = doc['timestamp'].isoformat()
-    
-    _ = await db.status_checks.insert_one(doc)
+    """Record a status check; it is written to MongoDB with the next batch"""
+    status_obj = StatusCheck(**input.model_dump())
+    STATUS_LOG.add(status_obj.model_dump())
     return status_obj
 
 @api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find({}, {"_id": 0}).to_list(1000)
-    
-    for check in status_checks:
-        if isinstance(check['timestamp'], str):
-            check['timestamp'] = datetime.fromisoformat(check['timestamp'])
-    
-    return status_checks
+async def get_status_checks(
+    response: Response,
+    client_name: Optional[str] = None,
+    since: Optional[datetime] = Query(None, description="Inclusive lower bound on timestamp"),
+    until: Optional[datetime] = Query(None, description="Exclusive upper bound on timestamp"),
+    limit: int = Query(DEFAULT_STATUS_PAGE, ge=1, le=MAX_STATUS_PAGE),
+    cursor: Optional[str] = None,
+):
+    """Status checks, newest first, one page at a time (next cursor in X-Next-Cursor)"""
+    try:
+        after = None if cursor is None else parse_status_cursor(decode_cursor(cursor))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    checks = await STATUS_LOG.page(limit, client_name=client_name, since=since, until=until, after=after)
+    if len(checks) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(status_cursor(checks[-1]))
+    return checks
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -345,8 +1550,112 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Profile"],
+)
+
+# ?profile=1 is honoured only when PROFILE_REQUESTS is set
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", ROOT_DIR / "profiles"))
+app.add_middleware(
+    MetricsMiddleware,
+    metrics=METRICS,
+    profiler=RequestProfiler(PROFILE_DIR) if os.environ.get("PROFILE_REQUESTS") else None,
 )
+METRICS.callback("portfolio_assets", "Assets in the in-memory store", lambda: len(ASSET_STORE))
+METRICS.callback("portfolio_flood_zones", "Flood zones in memory", lambda: len(FLOOD_ZONES))
+METRICS.callback("response_cache_bytes", "Bytes held by the response cache", lambda: RESPONSE_CACHE.bytes)
+METRICS.callback("response_cache_hits_total", "Response cache hits", lambda: RESPONSE_CACHE.hits, "counter")
+METRICS.callback("response_cache_misses_total", "Response cache misses", lambda: RESPONSE_CACHE.misses, "counter")
+
+_loop_monitor: Optional[asyncio.Task] = None
+# One-off startup work; the loop only keeps weak references to tasks
+_startup_tasks: Set[asyncio.Task] = set()
+
+def _startup_task_done(task: asyncio.Task) -> None:
+    _startup_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Startup task %s failed", task.get_name(), exc_info=task.exception())
+
+def start_background(coro, name: str) -> asyncio.Task:
+    """Run ``coro`` without holding up startup, keeping it alive until done and cancelling it on shutdown"""
+    task = asyncio.create_task(coro, name=name)
+    _startup_tasks.add(task)
+    task.add_done_callback(_startup_task_done)
+    return task
+
+@app.on_event("startup")
+async def start_loop_monitor():
+    global _loop_monitor
+    _loop_monitor = asyncio.create_task(monitor_event_loop(METRICS))
+
+@app.on_event("startup")
+async def load_portfolio():
+    """Reconcile with MongoDB behind live traffic, which is served from the snapshot or seed meanwhile"""
+    async def reconcile():
+        try:
+            await reconcile_portfolio()
+        except PyMongoError:
+            logger.warning("MongoDB unavailable; serving the portfolio already in memory", exc_info=True)
+        asyncio.get_running_loop().run_in_executor(None, warm_indexes)
+
+    # Don't hold up startup on MongoDB server selection
+    start_background(reconcile(), "reconcile_portfolio")
+
+_status_flusher: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def start_status_log():
+    global _status_flusher
+    _status_flusher = asyncio.create_task(STATUS_LOG.run())
+
+    async def prepare():
+        try:
+            await STATUS_LOG.ensure_indexes()
+            migrated = await STATUS_LOG.migrate_timestamps()
+            if migrated:
+                logger.info("Converted %d status check timestamps to datetimes", migrated)
+        except PyMongoError:
+            logger.warning("Could not prepare the status check collection", exc_info=True)
+
+    start_background(prepare(), "prepare_status_log")
+
+@app.on_event("startup")
+async def recover_jobs():
+    async def recover():
+        try:
+            await JOB_RUNNER.recover()
+        except Exception:
+            logger.warning("Could not mark interrupted jobs as failed", exc_info=True)
+
+    # Don't hold up startup on MongoDB server selection
+    start_background(recover(), "recover_jobs")
+
+@app.on_event("shutdown")
+async def stop_loop_monitor():
+    if _loop_monitor is not None:
+        _loop_monitor.cancel()
+
+@app.on_event("shutdown")
+async def cancel_startup_tasks():
+    tasks = list(_startup_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+@app.on_event("shutdown")
+async def flush_status_log():
+    if _status_flusher is not None:
+        _status_flusher.cancel()
+    await STATUS_LOG.flush()
+
+@app.on_event("shutdown")
+async def shutdown_jobs():
+    JOB_RUNNER.shutdown()
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
+
+@app.on_event("shutdown")
+async def shutdown_simulation_pool():
+    if _simulation_pool is not None:
+        _simulation_pool.shutdown(wait=False, cancel_futures=True)
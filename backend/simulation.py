@@ -0,0 +1,201 @@
+"""Monte Carlo flood event simulation.
+
+Each simulated year, every flood zone floods independently with its annual
+probability (``probability_pct``). A flooding zone's depth at each asset is
+its ``flood_depth_m`` (or the depth grid's, where the engine has one)
+scaled by a lognormal factor with median 1 and log-sd ``depth_sigma``,
+shared by the zone's assets for that event. An asset inside several zones
+counts once per year, at the deepest of the zones that flood that year
+(depth times factor), and its loss is part of that zone's event.
+
+The lognormal is discretized into ``QUANTILE_LEVELS`` equiprobable levels,
+and each zone's loss at every level is computed once, vectorized over its
+assets. Assets inside the same set of overlapping zones are grouped, with
+a loss row for each zone that could be the one to count. Simulating a year
+then needs no per-asset work: one Bernoulli draw and one table lookup per
+zone, and for each overlap group a pick of its deepest flooding zone. Years are split into fixed-size chunks with
+their own ``SeedSequence`` children. Results depend only on the seed, not
+on how many worker processes run the chunks.
+"""
+
+from statistics import NormalDist
+from typing import List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from asset_store import AssetStore
+from damage import DamageCurveSet
+from exposure import FloodExposureEngine
+
+QUANTILE_LEVELS = 256
+YEARS_PER_CHUNK = 10000
+# Assets evaluated per block when building the zone loss table
+LOSS_TABLE_BLOCK = 8192
+# Store columns zone_loss_table reads
+LOSS_TABLE_COLUMNS = ("inFloodZone", "latitude", "longitude", "constructionType", "assetType", "giv")
+# Upper bound on the (years x zones) and (years x overlap memberships) matrices built at once
+SAMPLE_BLOCK_ELEMENTS = 1 << 21
+
+
+def depth_factors(sigma: float, levels: int = QUANTILE_LEVELS) -> np.ndarray:
+    """Midpoint quantiles of a lognormal with median 1 and log-sd ``sigma``."""
+    normal = NormalDist()
+    z = np.array([normal.inv_cdf((k + 0.5) / levels) for k in range(levels)])
+    return np.exp(sigma * z)
+
+
+class ZoneLossTable(NamedTuple):
+    """Everything a simulation chunk needs; plain arrays so it pickles cheaply to workers.
+
+    ``table[z, level]`` is the loss of the assets inside zone ``z`` alone.
+    Each overlap group holds the assets inside the same ``m`` zones as
+    ``(zones, weights, tables)``: the groups' zones (groups x m, deepest
+    first), the depth each zone floods them at before its event's factor
+    (1 where the depth grid sets the depth) and their loss should each zone
+    be the one that counts (groups x m x levels).
+    """
+
+    probabilities: np.ndarray
+    table: np.ndarray
+    factors: np.ndarray
+    overlaps: List[Tuple[np.ndarray, np.ndarray, np.ndarray]]
+
+
+def _asset_losses(
+    store: AssetStore, curves: DamageCurveSet, rows: np.ndarray, depth: np.ndarray, factors: np.ndarray
+) -> np.ndarray:
+    """(levels x assets) loss of each asset at ``depth`` scaled by every factor."""
+    curve = curves.curve_lookup(store)[store.column("constructionType")[rows], store.column("assetType")[rows]]
+    depths = factors[:, None] * depth[None, :]
+    return curves.damage_ratios(np.broadcast_to(curve, depths.shape), depths) * store.column("giv")[rows]
+
+
+def _add_losses(out: np.ndarray, cells: np.ndarray, losses: np.ndarray) -> None:
+    """``out[cells[i]] += losses[:, i]`` for (levels x n) ``losses``; equal cells must be adjacent."""
+    starts = np.flatnonzero(np.r_[True, cells[1:] != cells[:-1]])
+    out[cells[starts]] += np.add.reduceat(losses, starts, axis=1).T
+
+
+def zone_loss_table(
+    store: AssetStore,
+    engine: FloodExposureEngine,
+    curves: DamageCurveSet,
+    depth_sigma: float,
+) -> ZoneLossTable:
+    """Annual probability per zone and the event loss tables, overlapping zones included."""
+    factors = depth_factors(depth_sigma)
+    levels = len(factors)
+    probabilities = np.array([z["probability_pct"] / 100.0 for z in engine.zones], dtype=np.float64)
+    table = np.zeros((len(engine.zones), levels))
+
+    flooded = np.flatnonzero(store.column("inFloodZone"))
+    lat, lng = store.column("latitude")[flooded], store.column("longitude")[flooded]
+    points, zones = engine.memberships(lat, lng)
+    gridded = ~np.isnan(engine.grid_depths(lat, lng))
+    # Each asset's zones deepest first (lowest index on ties, as classify picks)
+    order = np.lexsort((zones, -engine.depths[zones], points))
+    points, zones = points[order], zones[order]
+    counts = np.bincount(points, minlength=len(flooded))
+    first = np.cumsum(counts) - counts
+    # Depth each membership floods at: the grid's where it covers the asset, else the zone's
+    depth = np.where(gridded[points], engine.grid_depths(lat, lng)[points], engine.depths[zones])
+    weight = np.where(gridded[points], 1.0, engine.depths[zones])
+
+    overlaps = []
+    for m in np.unique(counts[counts > 0]).tolist():
+        assets = np.flatnonzero(counts == m)
+        slots = first[assets][:, None] + np.arange(m)[None, :]
+        if m == 1:
+            out, group = table, zones[slots[:, 0]]
+        else:
+            # Assets inside the same zones with the same depth source form one group
+            keys, group = np.unique(np.column_stack([zones[slots], gridded[assets]]), axis=0, return_inverse=True)
+            group = group.ravel()
+            out = np.zeros((len(keys) * m, levels))
+        # Sorted by group and taken slot by slot, each block's equal cells are adjacent
+        by_group = np.argsort(group, kind="stable")
+        slots, group = slots[by_group], group[by_group]
+        cells = group[:, None] * m + np.arange(m)[None, :] if m > 1 else group[:, None]
+        step = max(1, LOSS_TABLE_BLOCK // m)
+        for start in range(0, len(assets), step):
+            block = slots[start:start + step].ravel(order="F")
+            losses = _asset_losses(store, curves, flooded[points[block]], depth[block], factors)
+            _add_losses(out, cells[start:start + step].ravel(order="F"), losses)
+        if m > 1:
+            weights = weight[slots[np.searchsorted(group, np.arange(len(keys)))]]
+            overlaps.append((keys[:, :m], weights, out.reshape(len(keys), m, levels)))
+    return ZoneLossTable(probabilities, table, factors, overlaps)
+
+
+def plan_chunks(years: int, seed: int) -> List[Tuple[np.random.SeedSequence, int]]:
+    """Fixed-size year chunks, each with its own child seed."""
+    sizes = [YEARS_PER_CHUNK] * (years // YEARS_PER_CHUNK)
+    if years % YEARS_PER_CHUNK:
+        sizes.append(years % YEARS_PER_CHUNK)
+    return list(zip(np.random.SeedSequence(seed).spawn(len(sizes)), sizes))
+
+
+def simulate_chunk(
+    model: ZoneLossTable,
+    seed: np.random.SeedSequence,
+    years: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Annual aggregate loss and largest single-event loss for ``years`` years.
+
+    Runs in a worker process; takes and returns only plain arrays.
+    """
+    rng = np.random.default_rng(seed)
+    n_zones, levels = model.table.shape
+    annual = np.zeros(years)
+    max_event = np.zeros(years)
+    if n_zones == 0:
+        return annual, max_event
+    # Bound the (years x zones) draws; block sizes depend only on the inputs
+    width = max([n_zones] + [zones.size for zones, _, _ in model.overlaps])
+    block = max(1, SAMPLE_BLOCK_ELEMENTS // width)
+    zones = np.arange(n_zones)
+    for start in range(0, years, block):
+        n = min(block, years - start)
+        occurs = rng.random((n, n_zones)) < model.probabilities
+        level = rng.integers(0, levels, size=(n, n_zones))
+        event_loss = np.where(occurs, model.table[zones, level], 0.0)
+        for group_zones, weights, tables in model.overlaps:
+            # (years x groups x m): flooding depth per membership, the deepest flooding one counts
+            depth = np.where(occurs[:, group_zones], weights * model.factors[level[:, group_zones]], -1.0)
+            pick = depth.argmax(axis=2)
+            year, group = np.nonzero(np.take_along_axis(depth, pick[..., None], axis=2)[..., 0] >= 0)
+            pick = pick[year, group]
+            zone = group_zones[group, pick]
+            loss = tables[group, pick, level[year, zone]]
+            event_loss += np.bincount(year * n_zones + zone, weights=loss, minlength=n * n_zones).reshape(n, n_zones)
+        annual[start:start + n] = event_loss.sum(axis=1)
+        max_event[start:start + n] = event_loss.max(axis=1)
+    return annual, max_event
+
+
+def summarize(
+    annual: np.ndarray,
+    max_event: np.ndarray,
+    return_periods: Sequence[float],
+    curve_points: int = 50,
+) -> dict:
+    """AAL, PML at ``return_periods`` and an exceedance-probability curve.
+
+    PML at return period T is the empirical (1 - 1/T) quantile: annual
+    aggregate losses for AEP, largest event per year for OEP.
+    """
+    years = len(annual)
+
+    def at(losses: np.ndarray, rp: float) -> float:
+        return float(np.quantile(losses, max(0.0, 1.0 - 1.0 / rp)))
+
+    curve_rps = np.unique(np.round(np.geomspace(1, years, num=min(curve_points, years)), 2))
+    return {
+        "years": years,
+        "aal": float(annual.mean()),
+        "pml": [{"returnPeriod": rp, "aepLoss": at(annual, rp), "oepLoss": at(max_event, rp)} for rp in return_periods],
+        "epCurve": [
+            {"returnPeriod": float(rp), "exceedanceProbability": float(1.0 / rp), "loss": at(annual, rp)}
+            for rp in curve_rps.tolist()
+        ],
+    }
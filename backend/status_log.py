@@ -0,0 +1,174 @@
+"""Buffered, indexed status check history.
+
+Clients ping constantly, so checks are not written one request at a time:
+``StatusLog.add`` buffers them and ``insert_many`` writes a batch once
+``batch_size`` are pending or every ``flush_interval`` seconds, whichever
+comes first. Reads flush first, so a client always sees its own checks.
+
+Timestamps are stored as native datetimes (millisecond precision, as
+MongoDB keeps them). Older versions stored ISO strings; those are
+converted once at startup and read as datetimes until then. A TTL index expires checks after ``ttl_seconds``, and
+reads are keyset pages, newest first, on ``(timestamp, id)``. One compound
+index serves them across all clients and another per ``client_name``, so a
+page costs the same however much history there is.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple, Union
+
+from pymongo import DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+STATUS_BATCH = 500
+STATUS_FLUSH_INTERVAL = 1.0
+# Unwritten checks kept while MongoDB is unreachable; the oldest are dropped beyond this
+MAX_PENDING_STATUS = 50000
+DUPLICATE_KEY = 11000
+
+
+def status_time(moment: Union[datetime, str]) -> datetime:
+    """``moment`` in UTC, truncated to what MongoDB stores; ISO strings are parsed first."""
+    if isinstance(moment, str):
+        moment = datetime.fromisoformat(moment.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    moment = moment.astimezone(timezone.utc)
+    return moment.replace(microsecond=moment.microsecond // 1000 * 1000)
+
+
+def status_cursor(doc: dict) -> str:
+    """Keyset position after ``doc``: its timestamp in epoch milliseconds and its id."""
+    return f"{round(status_time(doc['timestamp']).timestamp() * 1000)}:{doc['id']}"
+
+
+def parse_status_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Inverse of ``status_cursor``; raises ``ValueError`` on malformed input."""
+    millis, sep, check_id = cursor.partition(":")
+    if not sep or not check_id:
+        raise ValueError("Invalid cursor")
+    return datetime.fromtimestamp(int(millis) / 1000, tz=timezone.utc), check_id
+
+
+class StatusLog:
+    """Status checks in a MongoDB collection, written in batches."""
+
+    def __init__(
+        self,
+        collection,
+        ttl_seconds: int,
+        batch_size: int = STATUS_BATCH,
+        flush_interval: float = STATUS_FLUSH_INTERVAL,
+    ):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: List[dict] = []
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._tasks = set()
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_index("timestamp", expireAfterSeconds=self.ttl_seconds)
+        await self.collection.create_index([("timestamp", DESCENDING), ("id", DESCENDING)])
+        await self.collection.create_index([("client_name", 1), ("timestamp", DESCENDING), ("id", DESCENDING)])
+
+    async def migrate_timestamps(self) -> int:
+        """Convert ISO-string timestamps left by older versions to datetimes; returns how many."""
+        legacy = {"timestamp": {"$type": "string"}}
+        try:
+            result = await self.collection.update_many(
+                legacy, [{"$set": {"timestamp": {"$dateFromString": {"dateString": "$timestamp"}}}}]
+            )
+            return result.modified_count
+        except OperationFailure:
+            # Servers before 4.2 reject pipeline updates, and one unreadable string fails them all; convert here
+            pass
+        migrated = 0
+        updates = []
+        async for doc in self.collection.find(legacy, {"timestamp": 1}):
+            try:
+                # Matched on the old value too, so a check rewritten meanwhile is left alone
+                updates.append(UpdateOne(doc, {"$set": {"timestamp": status_time(doc["timestamp"])}}))
+            except ValueError:
+                logger.warning("Status check %s has an unreadable timestamp %r", doc["_id"], doc["timestamp"])
+            if len(updates) == self.batch_size:
+                migrated += (await self.collection.bulk_write(updates, ordered=False)).modified_count
+                updates = []
+        if updates:
+            migrated += (await self.collection.bulk_write(updates, ordered=False)).modified_count
+        return migrated
+
+    def add(self, check: dict) -> None:
+        """Buffer a check (``id``, ``client_name``, ``timestamp``) for the next batch."""
+        self._pending.append({**check, "timestamp": status_time(check["timestamp"])})
+        if len(self._pending) >= self.batch_size:
+            task = asyncio.ensure_future(self.flush())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def flush(self) -> int:
+        """Write every buffered check; returns how many were written."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        written = 0
+        async with self._flush_lock:
+            while self._pending:
+                batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+                try:
+                    # Keyed on the check id, so retrying a partly written batch cannot duplicate checks
+                    await self.collection.insert_many([{**doc, "_id": doc["id"]} for doc in batch], ordered=False)
+                    written += len(batch)
+                except BulkWriteError as exc:
+                    written += exc.details.get("nInserted", 0)
+                    errors = [e for e in exc.details.get("writeErrors", []) if e.get("code") != DUPLICATE_KEY]
+                    if errors:
+                        logger.warning(
+                            "Dropped %d status checks MongoDB rejected: %s", len(errors), errors[0].get("errmsg")
+                        )
+                except PyMongoError:
+                    logger.warning("Could not write %d status checks; keeping them for the next flush", len(batch))
+                    self._pending = (batch + self._pending)[-MAX_PENDING_STATUS:]
+                    break
+        return written
+
+    async def run(self) -> None:
+        """Flush every ``flush_interval`` seconds until cancelled."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def page(
+        self,
+        limit: int,
+        client_name: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        after: Optional[Tuple[datetime, str]] = None,
+    ) -> List[dict]:
+        """Up to ``limit`` checks, newest first, in ``[since, until)`` and after the ``after`` keyset position."""
+        await self.flush()
+        query: dict = {}
+        if client_name is not None:
+            query["client_name"] = client_name
+        if since is not None or until is not None:
+            query["timestamp"] = {}
+            if since is not None:
+                query["timestamp"]["$gte"] = status_time(since)
+            if until is not None:
+                query["timestamp"]["$lt"] = status_time(until)
+        if after is not None:
+            timestamp, check_id = after
+            query["$or"] = [{"timestamp": {"$lt": timestamp}}, {"timestamp": timestamp, "id": {"$lt": check_id}}]
+        cursor = self.collection.find(query, {"_id": 0}).sort([("timestamp", DESCENDING), ("id", DESCENDING)])
+        docs = await cursor.to_list(limit)
+        for doc in docs:
+            doc["timestamp"] = status_time(doc["timestamp"])
+        return docs
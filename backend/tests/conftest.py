@@ -0,0 +1,60 @@
+"""Backend unit tests run from ``backend/`` against the modules directly (no MongoDB)."""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# The backend modules import each other as top-level modules
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.portfolio import make_assets, make_flood_zones, make_store  # noqa: E402
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(7)
+
+
+@pytest.fixture
+def portfolio():
+    """A seeded 20k-asset store and 30 flood zones, classified."""
+    from exposure import FloodExposureEngine
+
+    store = make_store(20000, seed=3)
+    zones = make_flood_zones(30, 24, seed=3)
+    FloodExposureEngine(zones).apply(store)
+    return store, zones
+
+
+@pytest.fixture(scope="session")
+def curves():
+    from damage import load_damage_curves
+
+    return load_damage_curves(Path(__file__).resolve().parents[1] / "data" / "damage_curves.csv")
+
+
+@pytest.fixture
+def random_writes(rng):
+    """``batch(store, size)`` draws one random write: ``(records, deleted_ids)``.
+
+    Records revalue and move about ``size`` existing assets (some in and out
+    of flood zones) and add as many new ones; the deletes are other existing
+    assets. Apply the records before the deletes.
+    """
+    counter = iter(range(1 << 30))
+
+    def batch(store, size):
+        picked = rng.choice(len(store), 2 * size, replace=False)
+        records = store.to_records(picked[:size])
+        for record in records:
+            record["giv"] = round(float(rng.lognormal(np.log(8e6), 0.9)), 2)
+            record["latitude"] += float(rng.normal(0, 0.01))
+            record["longitude"] += float(rng.normal(0, 0.01))
+        for record in make_assets(size, seed=int(rng.integers(1 << 31))):
+            record["assetId"] = f"NEW-{next(counter):08d}"
+            records.append(record)
+        return records, store.column("assetId")[picked[size:]].tolist()
+
+    return batch
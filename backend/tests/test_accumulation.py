@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from accumulation import BandIndex, _distance_m, hotspots
+
+
+def clustered(rng, n):
+    lat = 37.7 + np.where(rng.random(n) < 0.5, rng.normal(0, 0.003, n), rng.normal(0, 0.02, n))
+    lng = -122.4 + np.where(rng.random(n) < 0.5, rng.normal(0, 0.003, n), rng.normal(0, 0.02, n))
+    return lat, lng, rng.lognormal(15, 1, n)
+
+
+def brute_force(lat, lng, giv, lat_c, lng_c, radius_m):
+    """GIV and asset count within ``radius_m`` of each centre, testing every asset."""
+    inside = [_distance_m(lat, lng, a, b) <= radius_m for a, b in zip(lat_c, lng_c)]
+    return np.array([giv[m].sum() for m in inside]), np.array([m.sum() for m in inside])
+
+
+@pytest.mark.parametrize("radius_m", [100.0, 250.0, 1000.0])
+def test_maximum_beats_every_asset_centred_circle(rng, radius_m):
+    for _ in range(5):
+        lat, lng, giv = clustered(rng, 2000)
+        spots = hotspots(lat, lng, giv, radius_m, 5)
+        best, _ = brute_force(lat, lng, giv, lat, lng, radius_m)
+        assert spots[0]["giv"] >= best.max() * (1 - 1e-9)
+        assert [s["giv"] for s in spots] == sorted((s["giv"] for s in spots), reverse=True)
+
+
+def test_hotspots_hold_what_they_report_and_do_not_overlap(rng):
+    lat, lng, giv = clustered(rng, 5000)
+    spots = hotspots(lat, lng, giv, 250.0, 8)
+    assert len(spots) == 8
+    centres = np.array([[s["latitude"], s["longitude"]] for s in spots])
+    sums, counts = brute_force(lat, lng, giv, centres[:, 0], centres[:, 1], 250.0)
+    assert sums == pytest.approx([s["giv"] for s in spots], rel=1e-9)
+    assert counts.tolist() == [s["assetCount"] for s in spots]
+    for i, (a, b) in enumerate(centres):
+        assert (_distance_m(centres[i + 1:, 0], centres[i + 1:, 1], a, b) >= 500.0).all()
+
+
+def test_band_index_matches_brute_force(rng):
+    lat, lng, giv = clustered(rng, 5000)
+    lat_c, lng_c = 37.7 + rng.normal(0, 0.01, 300), -122.4 + rng.normal(0, 0.01, 300)
+    index = BandIndex(lat, lng, giv, 250.0 / 16)
+    for radius_m in (10.0, 250.0, 800.0):
+        weight, count = index.circle_sums(lat_c, lng_c, radius_m)
+        sums, counts = brute_force(lat, lng, giv, lat_c, lng_c, radius_m)
+        assert weight == pytest.approx(sums, rel=1e-9)
+        assert np.array_equal(count, counts)
+
+
+def test_fewer_hotspots_than_requested_when_assets_run_out():
+    lat, lng, giv = np.array([37.7, 37.8]), np.array([-122.4, -122.4]), np.array([1.0, 2.0])
+    spots = hotspots(lat, lng, giv, 500.0, 5)
+    assert [(s["giv"], s["assetCount"]) for s in spots] == [(2.0, 1), (1.0, 1)]
+    assert hotspots(lat[:0], lng[:0], giv[:0], 500.0, 5) == []
@@ -0,0 +1,104 @@
+import numpy as np
+
+from asset_store import RESORT_FRACTION, AssetStore, patch_sort_order
+
+
+def by_id(records):
+    return sorted(records, key=lambda record: record["assetId"])
+
+
+def test_patch_sort_order_matches_argsort(rng):
+    keys = rng.integers(0, 50, 5000)  # many equal keys
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    for size in (5000, 5100, 4900, 4900, 5000):
+        new_keys = rng.integers(0, 50, size)
+        m = min(len(keys), size)
+        new_keys[:m] = keys[:m]
+        changed = rng.choice(m, int(RESORT_FRACTION * size) - abs(size - len(keys)), replace=False)
+        new_keys[changed] = rng.integers(0, 60, len(changed))
+        order, sorted_keys = patch_sort_order(order, sorted_keys, keys, new_keys)
+        # Equal keys may come in any row order, so check the invariants rather than argsort's order
+        np.testing.assert_array_equal(sorted_keys, np.sort(new_keys))
+        np.testing.assert_array_equal(np.sort(order), np.arange(size))
+        np.testing.assert_array_equal(new_keys[order], sorted_keys)
+        keys = new_keys
+
+
+def test_patch_sort_order_gives_up_past_resort_fraction(rng):
+    keys = rng.integers(0, 100, 1000)
+    order = np.argsort(keys)
+    new_keys = keys.copy()
+    new_keys[: int(RESORT_FRACTION * 1000) + 1] += 1
+    assert patch_sort_order(order, keys[order], keys, new_keys) is None
+    assert patch_sort_order(order, keys[order], keys, np.concatenate([keys, keys[:200]])) is None
+
+
+def test_writes_match_rebuild(portfolio, random_writes):
+    store, _ = portfolio
+    model = {record["assetId"]: record for record in store.to_records()}
+    for _ in range(10):
+        records, deleted = random_writes(store, 200)
+        rows = store.upsert(records)
+        assert store.column("assetId")[rows].tolist() == [record["assetId"] for record in records]
+        store.delete(deleted + ["NOT-AN-ASSET"])
+        model.update((record["assetId"], dict(record)) for record in records)
+        for asset_id in deleted:
+            del model[asset_id]
+        assert len(store) == len(model)
+        assert by_id(store.to_records()) == by_id(model.values())
+        assert store.id_index() == {asset_id: row for row, asset_id in enumerate(store.column("assetId").tolist())}
+    rebuilt = AssetStore.from_records(list(model.values()))
+    assert by_id(rebuilt.to_records()) == by_id(store.to_records())
+
+
+def test_upsert_last_occurrence_wins(portfolio):
+    store, _ = portfolio
+    record = store.to_record(5)
+    rows = store.upsert([{**record, "giv": 1.0}, {**record, "giv": 2.0}])
+    assert rows.tolist() == [5, 5]
+    assert store.to_record(5)["giv"] == 2.0
+
+
+def test_delete_reports_moved_rows(portfolio, rng):
+    store, _ = portfolio
+    before = store.column("assetId").copy()
+    doomed = rng.choice(len(store), 300, replace=False)
+    doomed[:50] = np.arange(len(store) - 50, len(store))  # some holes in the tail itself
+    rows_version = store.rows_version
+    src, dst = store.delete(before[doomed].tolist())
+    after = store.column("assetId")
+    assert len(after) == len(before) - 300 and store.rows_version == rows_version + 1
+    np.testing.assert_array_equal(after[dst], before[src])
+    kept = np.setdiff1d(np.arange(len(after)), dst)
+    np.testing.assert_array_equal(after[kept], before[kept])
+    assert set(after.tolist()) == set(before.tolist()) - set(before[doomed].tolist())
+
+
+def test_adopted_columns_accept_writes(portfolio):
+    store, _ = portfolio
+    columns = {name: col.copy() for name, col in store.columns.items()}
+    for name in ("assetId", "address"):
+        columns[name] = columns[name].astype(str)  # fixed-width, as in a snapshot
+    categories = {name: c.decode(np.arange(len(c))) for name, c in store.categories.items()}
+    adopted = AssetStore.from_columns(columns, categories)
+    record = {**store.to_record(0), "assetId": "A-much-longer-id-than-the-snapshot-width"}
+    adopted.upsert([record])
+    adopted.delete([store.to_record(1)["assetId"]])
+    assert adopted.to_record(adopted.row_of(record["assetId"])) == record
+    assert adopted.row_of(store.to_record(1)["assetId"]) is None
+    assert len(adopted) == len(store)
+
+
+def test_snapshot_is_detached_from_later_writes(portfolio, random_writes):
+    store, _ = portfolio
+    copy = store.snapshot()
+    partial = store.snapshot(["assetId", "giv"])
+    before = by_id(store.to_records())
+    records, deleted = random_writes(store, 300)
+    store.upsert(records)
+    store.delete(deleted)
+    assert by_id(copy.to_records()) == before
+    assert (copy.version, copy.rows_version) < (store.version, store.rows_version)
+    assert copy.row_of(before[7]["assetId"]) is not None
+    assert sorted(partial.columns) == ["assetId", "giv"] and len(partial) == len(before)
@@ -0,0 +1,103 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from asset_store import AssetStore
+from benchmarks.portfolio import make_assets
+from damage import DamageCurveSet, load_damage_curves
+
+CURVES_PATH = Path(__file__).resolve().parents[1] / "data" / "damage_curves.csv"
+
+# Knots deliberately differ between curves, and one curve starts above 0 m
+ROWS = [
+    ("*", "*", 0.0, 0.0), ("*", "*", 1.0, 0.1), ("*", "*", 3.0, 0.3),
+    ("Wood Frame", "*", 0.0, 0.0), ("Wood Frame", "*", 0.5, 0.2), ("Wood Frame", "*", 2.0, 0.5),
+    ("*", "retail", 0.25, 0.05), ("*", "retail", 4.0, 0.45),
+    ("Wood Frame", "retail", 0.0, 0.1), ("Wood Frame", "retail", 1.0, 0.6),
+]
+
+
+def curve_set():
+    rows = [dict(construction_type=c, asset_type=a, depth_m=str(d), damage_ratio=str(r)) for c, a, d, r in ROWS]
+    return DamageCurveSet.from_rows(rows, "test")
+
+
+def knots(construction, occupancy):
+    return [(d, r) for c, a, d, r in ROWS if (c, a) == (construction, occupancy)]
+
+
+def by_hand(points, depth):
+    """Straight-line interpolation between the two knots around ``depth``, flat beyond the ends."""
+    if depth <= points[0][0]:
+        return points[0][1]
+    for (d0, r0), (d1, r1) in zip(points, points[1:]):
+        if depth <= d1:
+            return r0 + (r1 - r0) * (depth - d0) / (d1 - d0)
+    return points[-1][1]
+
+
+@pytest.mark.parametrize("key", [("*", "*"), ("Wood Frame", "*"), ("*", "retail"), ("Wood Frame", "retail")])
+def test_interpolates_between_knots_and_clamps_at_the_ends(key):
+    curves = curve_set()
+    curve = curves.keys.index(key)
+    points = knots(*key)
+    # Every knot, points between knots, and depths before the first and past the last knot
+    depths = np.array([-1.0, 0.0, 0.1, 0.25, 0.3, 0.5, 0.75, 1.0, 1.7, 2.0, 2.9, 3.0, 3.5, 4.0, 10.0, 1e6])
+    expected = [by_hand(points, d) for d in depths]
+    ratios = curves.damage_ratios(np.full(len(depths), curve), depths)
+    np.testing.assert_allclose(ratios, expected, rtol=1e-12, atol=1e-15)
+    assert ratios[0] == points[0][1] and ratios[-1] == points[-1][1]
+
+
+@pytest.mark.parametrize("construction, occupancy, expected", [
+    ("Wood Frame", "retail", ("Wood Frame", "retail")),
+    ("Wood Frame", "office", ("Wood Frame", "*")),
+    ("Bamboo", "retail", ("*", "retail")),
+    ("Bamboo", "office", ("*", "*")),
+    ("wood frame", "office", ("*", "*")),
+])
+def test_most_specific_curve_wins(construction, occupancy, expected):
+    curves = curve_set()
+    assert curves.keys[curves.curve_for(construction, occupancy)] == expected
+
+
+def test_loss_ratios_fall_back_for_unknown_and_missing_types():
+    curves = curve_set()
+    records = make_assets(6, seed=1)
+    kinds = [("Wood Frame", "retail"), ("Wood Frame", "office"), ("Bamboo", "retail"),
+             ("Bamboo", "office"), (None, "office"), (None, None)]
+    for record, (construction, occupancy) in zip(records, kinds):
+        record.update(constructionType=construction, assetType=occupancy, floodDepth=0.8)
+    store = AssetStore.from_records(records)
+    expected = [
+        by_hand(knots("Wood Frame", "retail"), 0.8),
+        by_hand(knots("Wood Frame", "*"), 0.8),
+        by_hand(knots("*", "retail"), 0.8),
+        by_hand(knots("*", "*"), 0.8),
+        by_hand(knots("*", "*"), 0.8),
+        by_hand(knots("*", "*"), 0.8),
+    ]
+    np.testing.assert_allclose(curves.loss_ratios(store, np.arange(6)), expected, rtol=1e-12)
+    # A construction type first seen after the lookup was cached falls back too
+    store.upsert([{**records[0], "assetId": "X-1", "constructionType": "Adobe"}])
+    assert curves.loss_ratios(store, np.array([6]))[0] == pytest.approx(by_hand(knots("*", "retail"), 0.8))
+
+
+def test_bad_tables_are_rejected():
+    rows = [dict(construction_type="Wood Frame", asset_type="*", depth_m="0", damage_ratio="0")]
+    with pytest.raises(ValueError, match="default"):
+        DamageCurveSet.from_rows(rows, "x")
+    rows = [dict(construction_type="*", asset_type="*", depth_m=d, damage_ratio="0") for d in ("0", "1", "1.0")]
+    with pytest.raises(ValueError, match="repeats"):
+        DamageCurveSet.from_rows(rows, "x")
+
+
+def test_shipped_table_loads_with_a_content_version(tmp_path, curves):
+    assert ("*", "*") in curves.keys and len(curves.version) == 12
+    text = CURVES_PATH.read_text()
+    copy = tmp_path / "curves.csv"
+    copy.write_text(text)
+    assert load_damage_curves(copy).version == curves.version
+    copy.write_text(text.replace("0.075", "0.08"))
+    assert load_damage_curves(copy).version != curves.version
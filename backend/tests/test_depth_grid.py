@@ -0,0 +1,56 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from depth_grid import DepthGrid, write_depth_grid
+
+# North-up, 0.01 degree cells from (-122.5, 37.8)
+TRANSFORM = (-122.5, 0.01, 0.0, 37.8, 0.0, -0.01)
+
+
+def bilinear(values, lat, lng):
+    """One point at a time, straight from the definition: clamp to the outer centres, weight the four around."""
+    height, width = values.shape
+    x0, dx, _, y0, _, dy = TRANSFORM
+    col, row = (lng - x0) / dx, (lat - y0) / dy
+    if not (0 <= col < width and 0 <= row < height):
+        return np.nan
+    u, v = min(max(col - 0.5, 0), width - 1), min(max(row - 0.5, 0), height - 1)
+    c0, r0 = min(int(u), width - 1), min(int(v), height - 1)
+    c1, r1 = min(c0 + 1, width - 1), min(r0 + 1, height - 1)
+    fu, fv = u - c0, v - r0
+    return (
+        values[r0, c0] * (1 - fu) * (1 - fv) + values[r0, c1] * fu * (1 - fv)
+        + values[r1, c0] * (1 - fu) * fv + values[r1, c1] * fu * fv
+    )
+
+
+def test_sample_matches_bilinear_definition(rng):
+    values = rng.uniform(0, 3, (7, 9))
+    lat, lng = rng.uniform(37.72, 37.81, 2000), rng.uniform(-122.51, -122.40, 2000)
+    expected = np.array([bilinear(values, a, b) for a, b in zip(lat, lng)])
+    np.testing.assert_allclose(DepthGrid(values, TRANSFORM).sample(lat, lng), expected, rtol=1e-12)
+
+
+def test_nodata_corners_are_left_out():
+    values = np.array([[1.0, -9999.0], [3.0, np.nan]])
+    grid = DepthGrid(values, TRANSFORM, nodata=-9999.0)
+    # Midway between all four centres: only 1.0 and 3.0 count
+    assert grid.sample([37.79], [-122.49]) == pytest.approx([2.0])
+    assert np.isnan(DepthGrid(np.full((2, 2), -9999.0), TRANSFORM, nodata=-9999.0).sample([37.79], [-122.49])).all()
+
+
+@pytest.mark.parametrize("fortran", [False, True])
+def test_memory_mapped_grid_is_sampled_without_copying(tmp_path, rng, fortran):
+    values = rng.uniform(0, 3, (1500, 2000))
+    write_depth_grid(tmp_path, np.asfortranarray(values) if fortran else values, TRANSFORM)
+    grid = DepthGrid.open(tmp_path)
+    assert grid.values.flags.f_contiguous == fortran
+    lat, lng = rng.uniform(22.8, 37.8, 500), rng.uniform(-122.5, -102.5, 500)
+    tracemalloc.start()
+    sampled = grid.sample(lat, lng)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert peak < values.nbytes / 10
+    np.testing.assert_allclose(sampled, DepthGrid(values, TRANSFORM).sample(lat, lng), rtol=1e-12)
@@ -0,0 +1,62 @@
+import json
+
+import numpy as np
+import pytest
+
+from export import IdOrder, decode_cursor, encode_cursor, ndjson_chunks
+
+
+def walk(order, limit):
+    """Every row, a page at a time, resuming after the last asset ID served."""
+    rows, after = [], None
+    while True:
+        page = order.page(after, limit)
+        if len(page) == 0:
+            return rows
+        rows += page.tolist()
+        after = order.store.column("assetId")[page[-1]]
+
+
+def test_ndjson_matches_json_dumps(portfolio):
+    store, _ = portfolio
+    store.upsert([{**store.to_records([0])[0], "assetId": 'Q"uoted\\ Ünïcode', "assetType": None}])
+    lines = b"".join(ndjson_chunks(store, chunk_rows=777)).decode("utf-8").splitlines()
+    assert [json.loads(line) for line in lines] == json.loads(json.dumps(store.to_records(np.arange(len(store)))))
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor("RETA-00000042/é")) == "RETA-00000042/é"
+    with pytest.raises(ValueError):
+        decode_cursor("not base64!")
+
+
+def test_id_order_pages_every_asset_in_id_order(portfolio):
+    store, _ = portfolio
+    rows = walk(IdOrder(store), 999)
+    ids = store.column("assetId")
+    assert sorted(rows) == list(range(len(store)))
+    assert ids[rows].tolist() == sorted(ids.tolist())
+
+
+def test_incremental_id_order_matches_rebuild(portfolio, random_writes):
+    store, _ = portfolio
+    order = IdOrder(store)
+    for _ in range(10):
+        records, deleted = random_writes(store, 200)
+        store.upsert(records)
+        store.delete(deleted)
+        order.refresh()
+        fresh = IdOrder(store)
+        # IDs are unique, so there is exactly one right order
+        np.testing.assert_array_equal(order.order, fresh.order)
+        np.testing.assert_array_equal(order.sorted_ids, fresh.sorted_ids)
+    assert walk(order, 1234) == fresh.order.tolist()
+
+
+def test_arrow_export_round_trips(portfolio):
+    pa = pytest.importorskip("pyarrow")
+    from export import arrow_chunks
+
+    store, _ = portfolio
+    table = pa.ipc.open_stream(b"".join(arrow_chunks(store, chunk_rows=5000))).read_all()
+    assert table.to_pylist() == store.to_records(np.arange(len(store)))
@@ -0,0 +1,51 @@
+import numpy as np
+
+from exposure import FloodExposureEngine, GridIndex, points_in_ring
+
+
+def brute_force(engine, lat, lng):
+    """Deepest zone per point (lowest index on ties) by testing every point against every ring."""
+    zone_idx = np.full(len(lat), -1)
+    best = np.full(len(lat), -np.inf)
+    for idx, ring in enumerate(engine.rings):
+        win = points_in_ring(lat, lng, ring) & (engine.depths[idx] > best)
+        zone_idx[win], best[win] = idx, engine.depths[idx]
+    return zone_idx
+
+
+def square(zone_id, lat, lng, half, depth):
+    ring = [[lat - half, lng - half], [lat - half, lng + half], [lat + half, lng + half], [lat + half, lng - half]]
+    return {"flood_id": zone_id, "flood_depth_m": depth, "flood_category": "primary", "coordinates": ring}
+
+
+def test_classify_matches_brute_force(portfolio):
+    store, zones = portfolio
+    engine = FloodExposureEngine(zones)
+    lat, lng = store.column("latitude"), store.column("longitude")
+    assert np.array_equal(engine.classify(lat, lng), brute_force(engine, lat, lng))
+
+
+def test_oversized_zone_is_matched_by_bounding_box(rng):
+    zones = [square(f"Z{i:03d}", 37.7 + i * 1e-4, -122.4, 2e-5, 1.0 + i % 3) for i in range(50)]
+    # Ten thousand times the typical zone
+    zones.append(square("BIG", 37.7, -122.4, 0.2, 0.5))
+    engine = FloodExposureEngine(zones)
+    assert engine.zones.index(zones[-1]) in engine.grid.big
+    lat, lng = 37.7 + rng.uniform(-0.3, 0.3, 20000), -122.4 + rng.uniform(-0.3, 0.3, 20000)
+    assert np.array_equal(engine.classify(lat, lng), brute_force(engine, lat, lng))
+
+
+def test_grid_index_cell_ranges():
+    bboxes = np.array([[0.0, 0.0, 1.0, 1.0], [2.0, 3.0, 2.5, 3.5]])
+    grid = GridIndex(bboxes, cell_size=1.0)
+    assert grid.lo.tolist() == [[0, 0], [2, 3]]
+    assert grid.hi.tolist() == [[1, 1], [2, 3]]
+    assert not grid.big
+
+
+def test_apply_writes_exposure_columns(portfolio):
+    store, zones = portfolio
+    engine = FloodExposureEngine(zones)
+    zone_idx = engine.classify(store.column("latitude"), store.column("longitude"))
+    assert np.array_equal(store.column("inFloodZone"), zone_idx >= 0)
+    assert np.allclose(store.column("floodDepth"), np.append(engine.depths, 0.0)[zone_idx])
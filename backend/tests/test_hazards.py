@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from exposure import FloodExposureEngine
+from hazards import FloodHazardLayer, HazardMatrix, hazard_layer
+
+
+def layers(zones):
+    """Flood, a polygon layer over some of the flood zones and a raster over the whole area."""
+    lat = np.concatenate([np.asarray(z["coordinates"])[:, 0] for z in zones])
+    lng = np.concatenate([np.asarray(z["coordinates"])[:, 1] for z in zones])
+    polygon = hazard_layer({
+        "peril": "wildfire",
+        "kind": "polygon",
+        "zones": [{"id": z["flood_id"], "intensity": i % 5 + 1, "coordinates": z["coordinates"]}
+                  for i, z in enumerate(zones[::3])],
+    })
+    raster = hazard_layer({
+        "peril": "earthquake",
+        "kind": "raster",
+        "values": np.arange(400, dtype=np.float32).reshape(20, 20) / 400,
+        "origin": [lat.max(), lng.min()],
+        "cellSize": [(lat.max() - lat.min()) / 20, (lng.max() - lng.min()) / 20],
+        "nodata": 0.0,
+    })
+    return [FloodHazardLayer(), polygon, raster]
+
+
+def assert_same_values(matrix, store):
+    fresh = HazardMatrix(store, matrix.layers)
+    np.testing.assert_array_equal(matrix.values, fresh.values)
+
+
+@pytest.mark.parametrize("sampled", [True, False])
+def test_incremental_matrix_matches_rebuild(portfolio, random_writes, sampled):
+    store, zones = portfolio
+    engine = FloodExposureEngine(zones)
+    matrix = HazardMatrix(store, layers(zones))
+    if sampled:
+        matrix.warm()
+    for _ in range(10):
+        records, deleted = random_writes(store, 300)
+        rows = np.unique(store.upsert(records))
+        engine.apply(store, rows)
+        matrix.refresh(rows)
+        matrix.move(*store.delete(deleted))
+        assert_same_values(matrix, store)
+
+
+def test_flood_refresh_follows_zone_changes(portfolio):
+    store, zones = portfolio
+    matrix = HazardMatrix(store, layers(zones))
+    matrix.warm()
+    engine = FloodExposureEngine(zones[10:])
+    engine.apply(store)
+    matrix.refresh(np.arange(len(store)), ["flood"])
+    assert_same_values(matrix, store)
+
+
+def test_layer_changes_match_rebuild(portfolio):
+    store, zones = portfolio
+    flood, polygon, raster = layers(zones)
+    matrix = HazardMatrix(store, [flood, polygon])
+    matrix.warm()
+    matrix.set_layer(raster)
+    matrix.remove_layer("wildfire")
+    assert matrix.perils == ["flood", "earthquake"]
+    assert_same_values(matrix, store)
@@ -0,0 +1,218 @@
+import asyncio
+import threading
+
+import pytest
+
+import jobs
+from jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, JobRunner
+
+
+class FakeCollection:
+    """Just enough of an async collection for ``JobRunner``: documents matched on equality, ``$in`` and ``$nin``."""
+
+    def __init__(self, docs=()):
+        self.docs = [dict(d) for d in docs]
+
+    def _matches(self, doc, query):
+        for key, cond in query.items():
+            if isinstance(cond, dict):
+                if "$in" in cond and doc.get(key) not in cond["$in"]:
+                    return False
+                if "$nin" in cond and doc.get(key) in cond["$nin"]:
+                    return False
+            elif doc.get(key) != cond:
+                return False
+        return True
+
+    @staticmethod
+    def _project(doc, projection):
+        if any(projection.get(k) for k in projection if k != "_id"):
+            return {k: v for k, v in doc.items() if projection.get(k)}
+        return {k: v for k, v in doc.items() if k not in projection}
+
+    async def update_one(self, query, update, upsert=False):
+        doc = next((d for d in self.docs if self._matches(d, query)), None)
+        if doc is None and upsert:
+            doc = dict(query)
+            self.docs.append(doc)
+        if doc is not None:
+            doc.update(update["$set"])
+
+    async def update_many(self, query, update):
+        for doc in self.docs:
+            if self._matches(doc, query):
+                doc.update(update["$set"])
+
+    async def find_one(self, query, projection):
+        doc = next((d for d in self.docs if self._matches(d, query)), None)
+        return None if doc is None else self._project(doc, projection)
+
+    def doc(self, job_id):
+        return next(d for d in self.docs if d["id"] == job_id)
+
+
+async def settle(runner, job_id, statuses):
+    """Let the loop run until the job reaches one of ``statuses``."""
+    for _ in range(1000):
+        if (await runner.get(job_id))["status"] in statuses:
+            return
+        await asyncio.sleep(0.001)
+    raise AssertionError(f"job {job_id} never reached {statuses}")
+
+
+def test_job_lifecycle_succeeds():
+    async def main():
+        collection = FakeCollection()
+        runner = JobRunner(collection, max_concurrent=1)
+        gate = asyncio.Event()
+
+        async def handler(params, report):
+            report(0.25, "a quarter")
+            await gate.wait()
+            return {"doubled": await runner.run_sync(lambda: (threading.current_thread().name, params["x"] * 2))}
+
+        runner.register("double", handler)
+        job = await runner.submit("double", {"x": 21})
+        assert job["status"] == QUEUED and collection.doc(job["id"])["status"] == QUEUED
+        seen = []
+
+        async def watch():
+            async for doc in runner.watch(job["id"]):
+                seen.append(doc["status"])
+
+        watcher = asyncio.create_task(watch())
+        await settle(runner, job["id"], [RUNNING])
+        await asyncio.sleep(0.01)
+        running = await runner.get(job["id"])
+        assert running["startedAt"] and running["progress"] == 0.25 and running["message"] == "a quarter"
+        gate.set()
+        await settle(runner, job["id"], [SUCCEEDED])
+        await watcher
+        done = await runner.get(job["id"])
+        name, doubled = (await runner.result(job["id"]))["doubled"]
+        assert doubled == 42 and name.startswith("job")
+        assert done["progress"] == 1.0 and done["finishedAt"] and done["error"] is None
+        assert seen[0] in (QUEUED, RUNNING) and seen[-1] == SUCCEEDED
+        # Persisted, so it can be read back once this process forgets it
+        stored = collection.doc(job["id"])
+        assert stored["status"] == SUCCEEDED and stored["result"] == {"doubled": (name, 42)}
+        runner._jobs.clear()
+        runner._results.clear()
+        assert (await runner.get(job["id"]))["status"] == SUCCEEDED
+        assert "result" not in await runner.get(job["id"])
+        runner.shutdown()
+
+    asyncio.run(main())
+
+
+def test_failing_job_records_its_error():
+    async def main():
+        collection = FakeCollection()
+        runner = JobRunner(collection, max_concurrent=1)
+
+        async def handler(params, report):
+            raise ValueError("bad radius")
+
+        runner.register("broken", handler)
+        job = await runner.submit("broken", {})
+        await settle(runner, job["id"], [FAILED, SUCCEEDED])
+        failed = await runner.get(job["id"])
+        assert failed["status"] == FAILED and failed["error"] == "bad radius" and failed["finishedAt"]
+        assert collection.doc(job["id"])["status"] == FAILED
+        assert await runner.result(job["id"]) is None
+
+    asyncio.run(main())
+
+
+def test_unknown_kind_is_a_key_error():
+    async def main():
+        runner = JobRunner(FakeCollection(), max_concurrent=1)
+        with pytest.raises(KeyError):
+            await runner.submit("nope", {})
+
+    asyncio.run(main())
+
+
+def test_at_most_max_concurrent_jobs_run():
+    async def main():
+        runner = JobRunner(FakeCollection(), max_concurrent=2)
+        gate = asyncio.Event()
+        running, peak = 0, 0
+
+        async def handler(params, report):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await gate.wait()
+            running -= 1
+            return params["i"]
+
+        runner.register("wait", handler)
+        submitted = [await runner.submit("wait", {"i": i}) for i in range(5)]
+        await asyncio.sleep(0.05)
+        statuses = [(await runner.get(job["id"]))["status"] for job in submitted]
+        assert statuses.count(RUNNING) == 2 and statuses.count(QUEUED) == 3
+        gate.set()
+        for job in submitted:
+            await settle(runner, job["id"], [SUCCEEDED])
+        assert peak == 2
+        assert [await runner.result(job["id"]) for job in submitted] == list(range(5))
+
+    asyncio.run(main())
+
+
+def test_recover_fails_jobs_left_unfinished_by_a_previous_process():
+    async def main():
+        previous = [
+            {"id": "old-queued", "status": QUEUED, "error": None},
+            {"id": "old-running", "status": RUNNING, "error": None},
+            {"id": "old-done", "status": SUCCEEDED, "error": None},
+            {"id": "old-failed", "status": FAILED, "error": "boom"},
+        ]
+        collection = FakeCollection(previous)
+        runner = JobRunner(collection, max_concurrent=1)
+        gate = asyncio.Event()
+
+        async def handler(params, report):
+            await gate.wait()
+
+        runner.register("wait", handler)
+        current = await runner.submit("wait", {})
+        await settle(runner, current["id"], [RUNNING])
+        await runner.recover()
+        for job_id in ("old-queued", "old-running"):
+            doc = collection.doc(job_id)
+            assert doc["status"] == FAILED and doc["error"] == "Interrupted by server restart" and doc["finishedAt"]
+        assert collection.doc("old-done")["status"] == SUCCEEDED
+        assert collection.doc("old-failed")["error"] == "boom"
+        # This process's own job is left alone
+        assert collection.doc(current["id"])["status"] == RUNNING
+        gate.set()
+        await settle(runner, current["id"], [SUCCEEDED])
+
+    asyncio.run(main())
+
+
+def test_progress_writes_are_throttled(monkeypatch):
+    monkeypatch.setattr(jobs, "PROGRESS_WRITE_INTERVAL", 3600.0)
+
+    async def main():
+        collection = FakeCollection()
+        runner = JobRunner(collection, max_concurrent=1)
+        gate = asyncio.Event()
+
+        async def handler(params, report):
+            for i in range(1, 11):
+                report(i / 10, f"{i}/10")
+            await gate.wait()
+
+        runner.register("steps", handler)
+        job = await runner.submit("steps", {})
+        await asyncio.sleep(0.02)
+        # Watchers see the latest progress; MongoDB only got the first update
+        assert (await runner.get(job["id"]))["progress"] == 1.0
+        assert collection.doc(job["id"])["progress"] == 0.1
+        gate.set()
+        await settle(runner, job["id"], [SUCCEEDED])
+
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from exposure import FloodExposureEngine
+from kpis import KPIAggregates, RunningMedian, grouped_kpis
+
+
+def test_running_median_matches_sorted_values(rng):
+    # Few distinct values, so equal values straddle the two heaps
+    values = rng.integers(0, 50, 1000) / 10
+    median, expected = RunningMedian(values), values.tolist()
+    for _ in range(300):
+        added = rng.integers(0, 60, rng.integers(0, 20)) / 10
+        median.add(added)
+        expected += added.tolist()
+        removed = rng.choice(expected, min(len(expected), rng.integers(0, 40)), replace=False)
+        median.remove(removed)
+        for value in removed.tolist():
+            expected.remove(value)
+        expected.sort()
+        assert len(median) == len(expected)
+        assert median.median == (expected[len(expected) // 2] if expected else 0)
+
+
+def test_running_median_compacts_lazy_removals(rng):
+    values = rng.random(3000)
+    median = RunningMedian(values)
+    median.remove(np.sort(values)[:2900])
+    assert len(median) == 100 and median.median == np.sort(values)[2950]
+    assert len(median._low) + len(median._high) < 2000
+    median.remove(np.sort(values)[2900:])
+    assert len(median) == 0 and median.median == 0
+
+
+def assert_same_kpis(aggregates, fresh):
+    for key, value in {**fresh.portfolio(), **fresh.flood()}.items():
+        incremental = {**aggregates.portfolio(), **aggregates.flood()}[key]
+        assert incremental == pytest.approx(value, rel=1e-9), key
+
+
+@pytest.mark.parametrize("median_built", [True, False])
+def test_incremental_aggregates_match_rebuild(portfolio, curves, random_writes, median_built):
+    store, zones = portfolio
+    engine = FloodExposureEngine(zones)
+    aggregates = KPIAggregates(store, curves.loss_ratios)
+    if median_built:
+        aggregates.warm()
+    for _ in range(10):
+        records, deleted = random_writes(store, 300)
+        # The write protocol from server.apply_asset_upserts / apply_asset_deletes
+        existing = store.rows_of([r["assetId"] for r in records])
+        aggregates.remove(np.unique(existing[existing >= 0]))
+        rows = np.unique(store.upsert(records))
+        engine.apply(store, rows)
+        aggregates.add(rows)
+        doomed = store.rows_of(deleted)
+        aggregates.remove(np.unique(doomed[doomed >= 0]))
+        store.delete(deleted)
+        assert_same_kpis(aggregates, KPIAggregates(store, curves.loss_ratios))
+
+
+def test_ungrouped_kpis_match_aggregates(portfolio, curves):
+    store, _ = portfolio
+    aggregates = KPIAggregates(store, curves.loss_ratios)
+    (group,) = grouped_kpis(store, np.arange(len(store)), curves.loss_ratios)
+    assert group["portfolio"] == pytest.approx(aggregates.portfolio(), rel=1e-9)
+    assert group["flood"] == pytest.approx(aggregates.flood(), rel=1e-9)
@@ -0,0 +1,160 @@
+import re
+from types import SimpleNamespace
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from metrics import (
+    Counter,
+    Histogram,
+    Metrics,
+    MetricsMiddleware,
+    MongoCommandListener,
+    TimedJSONResponse,
+)
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{((?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*",?)*)\})? (\S+)$')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+def parse(text):
+    """Check every line of ``text`` against the exposition format; ``({(name, labels): value}, {name: type})``."""
+    assert text.endswith("\n")
+    samples, types = {}, {}
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            continue
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            assert kind in ("counter", "gauge", "histogram") and name not in types
+            types[name] = kind
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        name, labels, value = match.groups()
+        samples[name, frozenset(LABEL.findall(labels or ""))] = float(value)
+    return samples, types
+
+
+def labels(**pairs):
+    return frozenset(pairs.items())
+
+
+def app_with(metrics):
+    app = FastAPI(default_response_class=TimedJSONResponse)
+
+    @app.get("/api/assets/{asset_id}")
+    async def get_asset(asset_id: str):
+        if asset_id == "missing":
+            raise HTTPException(status_code=404, detail="Asset not found")
+        return {"assetId": asset_id, "padding": "x" * 2000}
+
+    @app.post("/api/assets")
+    async def create_asset(body: dict):
+        return body
+
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+    return app
+
+
+def test_requests_are_labelled_by_route_template_and_status():
+    metrics = Metrics()
+    with TestClient(app_with(metrics)) as client:
+        for asset_id in ("A-1", "A-2", "A-3"):
+            assert client.get(f"/api/assets/{asset_id}").status_code == 200
+        assert client.get("/api/assets/missing").status_code == 404
+        assert client.get("/nowhere").status_code == 404
+        assert client.post("/api/assets", json={"assetId": "A-9"}).status_code == 200
+    samples, types = parse(metrics.render())
+    route = "/api/assets/{asset_id}"
+    assert samples["http_requests_total", labels(method="GET", route=route, status="200")] == 3
+    assert samples["http_requests_total", labels(method="GET", route=route, status="404")] == 1
+    assert samples["http_requests_total", labels(method="GET", route="unmatched", status="404")] == 1
+    assert samples["http_requests_total", labels(method="POST", route="/api/assets", status="200")] == 1
+    # Concrete paths never become label values
+    assert not any(value.startswith("/api/assets/A-") for _, pairs in samples for _, value in pairs)
+    assert samples["http_requests_in_progress", labels()] == 0
+    assert types["http_requests_total"] == "counter" and types["http_request_duration_seconds"] == "histogram"
+    assert types["http_requests_in_progress"] == "gauge"
+
+
+def test_histograms_are_cumulative_with_sum_and_count():
+    metrics = Metrics()
+    with TestClient(app_with(metrics)) as client:
+        for _ in range(4):
+            client.get("/api/assets/A-1")
+        client.post("/api/assets", json={"assetId": "A-9"})
+    samples, _ = parse(metrics.render())
+    get = labels(method="GET", route="/api/assets/{asset_id}")
+    buckets = sorted(
+        (float(dict(pairs)["le"]), value)
+        for (name, pairs), value in samples.items()
+        if name == "http_response_size_bytes_bucket" and get <= pairs
+    )
+    counts = [value for _, value in buckets]
+    assert buckets[-1][0] == float("inf") and counts == sorted(counts) and counts[-1] == 4
+    assert samples["http_response_size_bytes_count", get] == 4
+    # Every response is the same ~2 KB body
+    assert samples["http_response_size_bytes_bucket", get | {("le", "1024")}] == 0
+    assert samples["http_response_size_bytes_bucket", get | {("le", "8192")}] == 4
+    assert 4 * 2000 < samples["http_response_size_bytes_sum", get] < 4 * 2100
+    post = labels(method="POST", route="/api/assets")
+    assert samples["http_request_size_bytes_sum", post] == len(b'{"assetId":"A-9"}')
+    # Serialization is part of, so never more than, the whole request time
+    assert 0 < samples["http_serialization_duration_seconds_sum", get]
+    assert samples["http_serialization_duration_seconds_count", get] == 4
+    duration = samples["http_request_duration_seconds_sum", get | {("status", "200")}]
+    assert samples["http_serialization_duration_seconds_sum", get] <= duration
+
+
+def test_values_and_labels_are_formatted_for_prometheus():
+    counter = Counter("things_total", "Things", ("name",))
+    counter.inc('say "hi"\\\nbye')
+    counter.inc("plain", amount=2.5)
+    assert counter.samples() == ['things_total{name="say \\"hi\\"\\\\\\nbye"} 1', 'things_total{name="plain"} 2.5']
+    histogram = Histogram("wait_seconds", "Waits", buckets=(0.5, 1.0))
+    histogram.observe(0.5)
+    histogram.observe(3.0)
+    assert histogram.samples() == [
+        'wait_seconds_bucket{le="0.5"} 1',
+        'wait_seconds_bucket{le="1"} 1',
+        'wait_seconds_bucket{le="+Inf"} 2',
+        "wait_seconds_sum 3.5",
+        "wait_seconds_count 2",
+    ]
+
+
+def test_callbacks_are_read_at_render_time():
+    metrics = Metrics()
+    state = {"assets": 3, "hits": 0}
+    metrics.callback("portfolio_assets", "Assets in the in-memory store", lambda: state["assets"])
+    metrics.callback("cache_hits_total", "Cache hits", lambda: state["hits"], "counter")
+    state.update(assets=7, hits=12)
+    text = metrics.render()
+    samples, types = parse(text)
+    assert samples["portfolio_assets", labels()] == 7 and samples["cache_hits_total", labels()] == 12
+    assert types["cache_hits_total"] == "counter"
+    assert "# HELP portfolio_assets Assets in the in-memory store\n# TYPE portfolio_assets gauge\n" in text
+
+
+def test_mongodb_commands_are_timed_by_collection_and_outcome():
+    metrics = Metrics()
+    listener = MongoCommandListener(metrics)
+
+    def event(request_id, command_name, command=None, micros=0):
+        return SimpleNamespace(
+            connection_id=("localhost", 27017), request_id=request_id, command_name=command_name,
+            command=command or {}, duration_micros=micros,
+        )
+
+    listener.started(event(1, "find", {"find": "assets"}))
+    listener.started(event(2, "getMore", {"getMore": 42, "collection": "assets"}))
+    listener.succeeded(event(1, "find", micros=1500))
+    listener.failed(event(2, "getMore", micros=250))
+    samples, _ = parse(metrics.render())
+    assert samples["mongodb_command_duration_seconds_count", labels(
+        command="find", collection="assets", outcome="success")] == 1
+    assert samples["mongodb_command_duration_seconds_sum", labels(
+        command="find", collection="assets", outcome="success")] == 0.0015
+    assert samples["mongodb_command_duration_seconds_sum", labels(
+        command="getMore", collection="assets", outcome="failure")] == 0.00025
@@ -0,0 +1,144 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Optional
+
+from pydantic import BaseModel
+from pymongo.errors import BulkWriteError
+
+from benchmarks.portfolio import make_assets
+from persistence import (
+    EXPOSURE_FIELDS,
+    PortfolioRepository,
+    iter_lines,
+    iter_record_batches,
+    validate_records,
+    zone_document,
+    zones_from_geojson,
+)
+
+
+class Asset(BaseModel):
+    assetId: str
+    latitude: float
+    longitude: float
+    giv: float
+    assetType: Optional[str] = None
+
+
+def test_valid_records_pass_through_coerced():
+    valid, errors = validate_records(Asset, [
+        {"assetId": "A-1", "latitude": "37.5", "longitude": -122, "giv": "1e6"},
+        {"assetId": "A-2", "latitude": 37.6, "longitude": -122.1, "giv": 2.0, "assetType": "retail"},
+    ], "assetId")
+    assert errors == []
+    assert valid == [
+        {"assetId": "A-1", "latitude": 37.5, "longitude": -122.0, "giv": 1e6, "assetType": None},
+        {"assetId": "A-2", "latitude": 37.6, "longitude": -122.1, "giv": 2.0, "assetType": "retail"},
+    ]
+
+
+def test_invalid_records_are_reported_and_the_rest_kept():
+    records = [
+        {"assetId": "A-1", "latitude": 37.5, "longitude": -122.0, "giv": 1.0},
+        {"assetId": "A-2", "latitude": "north", "longitude": -122.0, "giv": "lots"},
+        {"latitude": 37.5, "longitude": -122.0, "giv": 1.0},
+        "not an object",
+        {"assetId": "A-5", "latitude": 37.5, "longitude": -122.0, "giv": 5.0},
+    ]
+    valid, errors = validate_records(Asset, records, "assetId")
+    assert [v["assetId"] for v in valid] == ["A-1", "A-5"]
+    assert [e["id"] for e in errors] == ["A-2", None, None]
+    # Every failing field of a record is in its one message, located within the record
+    assert "'loc': ('latitude',)" in errors[0]["message"] and "'loc': ('giv',)" in errors[0]["message"]
+    assert "'loc': ('assetId',)" in errors[1]["message"]
+
+
+class FakeCollection:
+    """Records ``bulk_write`` calls; documents whose ``_id`` is in ``reject`` fail like a server-side error."""
+
+    def __init__(self, reject=()):
+        self.docs = {}
+        self.calls = []
+        self.reject = set(reject)
+
+    async def bulk_write(self, requests, ordered=True):
+        self.calls.append((requests, ordered))
+        upserted = modified = 0
+        errors = []
+        for i, request in enumerate(requests):
+            doc = request._doc
+            if doc["_id"] in self.reject:
+                errors.append({"index": i, "code": 121, "errmsg": f"Document {doc['_id']} failed validation"})
+                continue
+            assert request._filter == {"_id": doc["_id"]} and request._upsert
+            if doc["_id"] in self.docs:
+                modified += self.docs[doc["_id"]] != doc
+            else:
+                upserted += 1
+            self.docs[doc["_id"]] = doc
+        details = {"nUpserted": upserted, "nModified": modified, "writeErrors": errors}
+        if errors:
+            raise BulkWriteError(details)
+        return SimpleNamespace(bulk_api_result=details)
+
+
+def repository(assets, zones=None, batch_size=4):
+    db = SimpleNamespace(assets=assets, flood_zones=zones or FakeCollection(), portfolio_meta=None)
+    return PortfolioRepository(db, batch_size=batch_size)
+
+
+def test_bulk_upsert_replaces_by_id_in_unordered_batches():
+    assets = make_assets(10, seed=2)
+    collection = FakeCollection()
+    result = asyncio.run(repository(collection).upsert_assets(assets))
+    assert result["received"] == 10 and result["upserted"] == 10 and result["modified"] == 0
+    assert result["errors"] == []
+    assert [len(ops) for ops, _ in collection.calls] == [4, 4, 2]
+    assert not any(ordered for _, ordered in collection.calls)
+    doc = collection.docs[assets[3]["assetId"]]
+    assert doc["location"] == {"type": "Point", "coordinates": [assets[3]["longitude"], assets[3]["latitude"]]}
+    assert not set(EXPOSURE_FIELDS) & set(doc)
+    # Writing again replaces rather than duplicates; only changed documents count as modified
+    assets[0]["giv"] += 1
+    again = asyncio.run(repository(collection).upsert_assets(assets))
+    assert again["upserted"] == 0 and again["modified"] == 1 and len(collection.docs) == 10
+    assert collection.docs[assets[0]["assetId"]]["giv"] == assets[0]["giv"]
+
+
+def test_failed_documents_do_not_stop_their_batch():
+    assets = make_assets(10, seed=2)
+    bad = {assets[1]["assetId"], assets[6]["assetId"]}
+    collection = FakeCollection(reject=bad)
+    result = asyncio.run(repository(collection).upsert_assets(assets))
+    assert result["upserted"] == 8
+    assert {e["id"] for e in result["errors"]} == bad
+    assert all("failed validation" in e["message"] for e in result["errors"])
+    assert set(collection.docs) == {a["assetId"] for a in assets} - bad
+
+
+def test_zone_documents_are_closed_geojson_rings():
+    zone = {"flood_id": "FZ-1", "coordinates": [[37.0, -122.0], [37.1, -122.0], [37.1, -121.9]]}
+    doc = zone_document(zone)
+    assert doc["_id"] == "FZ-1"
+    assert doc["geometry"]["coordinates"] == [[[-122.0, 37.0], [-122.0, 37.1], [-121.9, 37.1], [-122.0, 37.0]]]
+    # And back again, closing vertex dropped
+    feature = {"type": "Feature", "properties": {"flood_id": "FZ-1"}, "geometry": doc["geometry"]}
+    assert zones_from_geojson({"type": "FeatureCollection", "features": [feature]}) == [zone]
+
+
+def test_record_batches_from_streamed_csv_and_ndjson():
+    async def chunks(text, size):
+        data = text.encode("utf-8")
+        for start in range(0, len(data), size):
+            yield data[start:start + size]
+
+    async def batches(text, fmt):
+        return [batch async for batch in iter_record_batches(iter_lines(chunks(text, 7)), fmt, batch_size=2)]
+
+    csv_text = 'assetId,address\r\nA-1,"1 Main St, SF"\r\n\r\nA-2,Café\r\nA-3,x\r\n'
+    assert asyncio.run(batches(csv_text, "csv")) == [
+        [{"assetId": "A-1", "address": "1 Main St, SF"}, {"assetId": "A-2", "address": "Café"}],
+        [{"assetId": "A-3", "address": "x"}],
+    ]
+    ndjson_text = '{"assetId": "A-1"}\n{"assetId": "Ω"}\n{"assetId": "A-3"}'
+    assert asyncio.run(batches(ndjson_text, "ndjson")) == [[{"assetId": "A-1"}, {"assetId": "Ω"}], [{"assetId": "A-3"}]]
@@ -0,0 +1,135 @@
+import gzip
+import hashlib
+import json
+
+import pytest
+from fastapi import Request
+
+from flood_zones import FloodZoneStore
+from response_cache import GZIP_MIN_BYTES, ResponseCache
+
+
+def request(path="/api/kpis/portfolio", query="", **headers):
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "scheme": "http",
+        "server": ("testserver", 80),
+        "path": path,
+        "query_string": query.encode(),
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+class Builder:
+    """Counts how often the cache had to build the body."""
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.calls = 0
+
+    def __call__(self) -> bytes:
+        self.calls += 1
+        return self.body
+
+
+def test_etag_is_weak_content_hash():
+    cache = ResponseCache(1 << 20)
+    first = cache.respond(request(), 1, Builder(b'{"a": 1}'))
+    assert first.headers["etag"] == 'W/"' + hashlib.blake2b(b'{"a": 1}', digest_size=16).hexdigest() + '"'
+    # Same bytes under another key or version share the tag
+    assert cache.respond(request(query="x=1"), 2, Builder(b'{"a": 1}')).headers["etag"] == first.headers["etag"]
+    assert cache.respond(request(), 3, Builder(b'{"a": 2}')).headers["etag"] != first.headers["etag"]
+
+
+@pytest.mark.parametrize("header, matches", [
+    ("{tag}", True),
+    ("{strong}", True),
+    ('"other", {tag}', True),
+    ("*", True),
+    ('"other"', False),
+    ("", False),
+])
+def test_if_none_match_revalidates_without_building(header, matches):
+    cache, build = ResponseCache(1 << 20), Builder(b'{"a": 1}')
+    tag = cache.respond(request(), 1, build).headers["etag"]
+    header = header.format(tag=tag, strong=tag.removeprefix("W/"))
+    response = cache.respond(request(if_none_match=header), 1, build)
+    assert response.status_code == (304 if matches else 200)
+    assert (response.body == b"") == matches
+    assert response.headers["etag"] == tag
+    assert build.calls == 1 and cache.hits == 1
+
+
+@pytest.mark.parametrize("accept, gzipped", [
+    ("gzip", True),
+    ("br, gzip;q=0.8", True),
+    ("*", True),
+    ("gzip;q=0", False),
+    ("identity", False),
+    (None, False),
+])
+def test_gzip_is_negotiated(accept, gzipped):
+    body = json.dumps([{"assetId": f"A-{i}"} for i in range(200)]).encode()
+    cache = ResponseCache(1 << 20)
+    headers = {} if accept is None else {"accept_encoding": accept}
+    response = cache.respond(request(**headers), 1, Builder(body))
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert (response.headers.get("content-encoding") == "gzip") == gzipped
+    assert (gzip.decompress(response.body) if gzipped else response.body) == body
+    # The gzip copy is kept and counted
+    assert cache.bytes == len(body) + (len(response.body) if gzipped else 0)
+
+
+def test_small_bodies_are_not_compressed():
+    body = b"x" * (GZIP_MIN_BYTES - 1)
+    response = ResponseCache(1 << 20).respond(request(accept_encoding="gzip"), 1, Builder(body))
+    assert "content-encoding" not in response.headers and response.body == body
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResponseCache(1000, max_entry_fraction=1.0)
+    builds = {name: Builder(name.encode() * 300) for name in "abcd"}
+    for name in "abc":
+        cache.respond(request(f"/{name}"), 1, builds[name])
+    cache.respond(request("/a"), 1, builds["a"])  # "a" is now the most recently used
+    cache.respond(request("/d"), 1, builds["d"])
+    assert len(cache) == 3 and cache.bytes == 900
+    for name in "acd":
+        cache.respond(request(f"/{name}"), 1, builds[name])
+        assert builds[name].calls == 1, name
+    cache.respond(request("/b"), 1, builds["b"])
+    assert builds["b"].calls == 2
+
+
+def test_oversized_bodies_keep_only_their_etag():
+    body = b"y" * 5000
+    cache, build = ResponseCache(8000), Builder(body)
+    tag = cache.respond(request(accept_encoding="gzip"), 1, build).headers["etag"]
+    assert cache.bytes == 0
+    assert cache.respond(request(if_none_match=tag), 1, build).status_code == 304
+    response = cache.respond(request(accept_encoding="gzip"), 1, build)
+    assert response.body == body and "content-encoding" not in response.headers
+    assert build.calls == 2
+
+
+def test_version_bump_invalidates(portfolio):
+    store, zones = portfolio
+    flood_zones = FloodZoneStore(zones)
+    cache = ResponseCache(1 << 20)
+
+    def respond(**headers):
+        # Keyed the way server.py keys responses built from assets and zones
+        body = json.dumps([len(store), len(flood_zones.all())]).encode()
+        return cache.respond(request(**headers), (store.version, flood_zones.version), Builder(body))
+
+    tag = respond().headers["etag"]
+    assert respond(if_none_match=tag).status_code == 304
+    store.delete([store.column("assetId")[0]])
+    changed = respond(if_none_match=tag)
+    assert changed.status_code == 200 and json.loads(changed.body)[0] == len(store)
+    tag = changed.headers["etag"]
+    flood_zones.delete(zones[0]["flood_id"])
+    changed = respond(if_none_match=tag)
+    assert changed.status_code == 200 and json.loads(changed.body)[1] == len(zones) - 1
+    assert cache.misses == 3
@@ -0,0 +1,80 @@
+import pytest
+
+from benchmarks.portfolio import make_flood_zones, make_store
+from exposure import FloodExposureEngine
+from flood_zones import FloodZoneStore
+from kpis import KPIAggregates
+from scenarios import canonical_scenario, changed_zones, evaluate_scenario, scenario_id
+
+
+def spec_for(zones):
+    """Deepen, reshape, re-categorize, add and remove a few zones."""
+    moved = [[lat + 0.004, lng - 0.003] for lat, lng in zones[3]["coordinates"]]
+    added = {**zones[5], "flood_id": "FZ-NEW", "flood_depth_m": 4.5, "coordinates": zones[5]["coordinates"][::-1]}
+    return canonical_scenario({
+        "zoneOverrides": [
+            {"flood_id": zones[0]["flood_id"], "depth_delta_m": 1.5},
+            {"flood_id": zones[1]["flood_id"], "depth_delta_m": -10.0, "flood_category": "fringe"},
+            {"flood_id": zones[3]["flood_id"], "coordinates": moved, "flood_depth_m": 2.0},
+        ],
+        "addZones": [added],
+        "removeZones": [zones[2]["flood_id"], zones[4]["flood_id"]],
+    })
+
+
+def test_scenario_matches_full_reclassification(curves):
+    zones = make_flood_zones(30, 24, seed=3)
+    live = make_store(20000, seed=3)
+    engine = FloodExposureEngine(zones)
+    engine.apply(live)
+    aggregates = KPIAggregates(live, curves.loss_ratios)
+    baseline = {"portfolio": aggregates.portfolio(), "flood": aggregates.flood()}
+
+    spec = spec_for(zones)
+    before, after = changed_zones(FloodZoneStore(zones), spec)
+    result = evaluate_scenario(live, engine, curves, baseline, before, after)
+
+    # The same edits applied to a copy of the portfolio, every asset re-classified
+    changed = {z["flood_id"] for z in before + after}
+    edited = make_store(20000, seed=3)
+    FloodExposureEngine([z for z in zones if z["flood_id"] not in changed] + after).apply(edited)
+    expected = KPIAggregates(edited, curves.loss_ratios)
+    for key in ("portfolio", "flood"):
+        assert result["scenario"][key] == pytest.approx(getattr(expected, key)(), rel=1e-9), key
+        assert result["delta"][key] == pytest.approx(
+            {k: v - baseline[key][k] for k, v in result["scenario"][key].items()}
+        )
+    flooded, now = live.column("inFloodZone"), edited.column("inFloodZone")
+    assert result["newlyExposedCount"] > 0 and result["noLongerExposedCount"] > 0
+    assert result["newlyExposedCount"] == int((now & ~flooded).sum())
+    assert result["noLongerExposedCount"] == int((flooded & ~now).sum())
+    # The live portfolio is untouched
+    assert aggregates.flood() == KPIAggregates(live, curves.loss_ratios).flood()
+
+
+def test_scenario_id_ignores_edit_order():
+    zones = make_flood_zones(6, 8, seed=1)
+    spec = spec_for(zones)
+    shuffled = {
+        "zoneOverrides": [{**o, "flood_category": None} if "flood_category" not in o else o
+                          for o in spec["zoneOverrides"][::-1]],
+        "addZones": spec["addZones"],
+        "removeZones": spec["removeZones"][::-1] + spec["removeZones"][:1],
+    }
+    assert scenario_id(canonical_scenario(shuffled)) == scenario_id(spec)
+
+
+@pytest.mark.parametrize("bad", [
+    {"zoneOverrides": [{"flood_id": "FZ-MISSING", "depth_delta_m": 1.0}]},
+    {"removeZones": ["FZ-MISSING"]},
+    {"zoneOverrides": [{"flood_id": "<existing>", "depth_delta_m": 1.0}], "removeZones": ["<existing>"]},
+    {"addZones": [{"flood_id": "<existing>", "flood_depth_m": 1.0, "coordinates": [[0, 0], [0, 1], [1, 1]]}]},
+    {"addZones": [{"flood_id": "FZ-NEW", "flood_depth_m": 1.0, "coordinates": [[0, 0], [0, 1]]}]},
+])
+def test_bad_edits_are_rejected(bad):
+    zones = make_flood_zones(3, 8, seed=1)
+    for zone in bad.get("addZones", []) + bad.get("zoneOverrides", []):
+        zone["flood_id"] = zone["flood_id"].replace("<existing>", zones[0]["flood_id"])
+    bad["removeZones"] = [z.replace("<existing>", zones[0]["flood_id"]) for z in bad.get("removeZones", [])]
+    with pytest.raises(ValueError):
+        changed_zones(FloodZoneStore(zones), canonical_scenario(bad))
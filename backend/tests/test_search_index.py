@@ -0,0 +1,99 @@
+import pytest
+
+from search_index import AssetSearchIndex
+
+
+def naive(ids, addresses, query):
+    """The documented ranking by a scan of every row."""
+    q = query.lower()
+    ids, addresses = [s.lower() for s in ids], [s.lower() for s in addresses]
+    prefix = sorted((row for row, s in enumerate(ids) if s.startswith(q)), key=lambda row: ids[row])
+    inside = [row for row, s in enumerate(ids) if q in s and not s.startswith(q)]
+    address = [row for row, s in enumerate(addresses) if q in s and q not in ids[row]]
+    return prefix + inside + address
+
+
+def queries(rng, ids, addresses, count):
+    """Substrings of real IDs and addresses (1 to 8 characters, any case), plus a few that match nothing."""
+    out = ["zzzz", "Ω-7", "-0000001"]
+    for _ in range(count):
+        text = (ids if rng.random() < 0.5 else addresses)[int(rng.integers(len(ids)))]
+        size = int(rng.integers(1, 9))
+        start = int(rng.integers(0, max(1, len(text) - size)))
+        q = text[start:start + size]
+        out.append(q.upper() if rng.random() < 0.3 else q)
+    return out
+
+
+def test_search_matches_naive_scan(portfolio, rng):
+    store, _ = portfolio
+    ids, addresses = store.column("assetId").tolist(), store.column("address").tolist()
+    # A few non-ASCII and overlapping IDs so multi-byte trigrams and tier overlaps are covered
+    ids[:4] = ["Café-001", "CAFÉ-002", "Market-9", "ret-market"]
+    addresses[2] = "9 Café Ave, San Francisco, CA"
+    index = AssetSearchIndex(ids, addresses)
+    for q in queries(rng, ids, addresses, 60):
+        expected = naive(ids, addresses, q)
+        assert index.search(q, limit=len(ids)).tolist() == expected, q
+        assert index.search(q, limit=7, offset=3).tolist() == expected[3:10], q
+
+
+def test_empty_query_finds_nothing():
+    index = AssetSearchIndex(["A-1"], ["1 Main St"])
+    assert index.search("").tolist() == []
+
+
+@pytest.mark.parametrize("query", ["mar", "st", "-000"])
+def test_rebuild_after_writes_matches_naive_scan(portfolio, random_writes, query):
+    store, _ = portfolio
+    for _ in range(3):
+        records, deleted = random_writes(store, 200)
+        store.upsert(records)
+        store.delete(deleted)
+    index = AssetSearchIndex.build(store)
+    assert index.version == store.rows_version
+    expected = naive(store.column("assetId").tolist(), store.column("address").tolist(), query)
+    assert index.search(query, limit=len(store)).tolist() == expected
+
+
+def test_refresh_after_writes_matches_naive_scan(portfolio, random_writes, rng):
+    store, _ = portfolio
+    index = AssetSearchIndex.build(store)
+    for step in range(4):
+        records, deleted = random_writes(store, 100)
+        for record in records[:20]:
+            record["address"] = f"{step} Quartz Lane, San Francisco, CA"
+        store.upsert(records)
+        store.delete(deleted)
+        index.refresh(store)
+        # Patched in place rather than rebuilt
+        assert index.id_postings.overlay is not None and index.address_postings.overlay is not None
+        assert index.version == store.rows_version
+        ids, addresses = store.column("assetId").tolist(), store.column("address").tolist()
+        for q in queries(rng, ids, addresses, 15) + ["quartz", "NEW-0", "q", "z"]:
+            assert index.search(q, limit=len(ids)).tolist() == naive(ids, addresses, q), q
+
+
+def test_refresh_rebuilds_after_many_writes(portfolio, random_writes):
+    store, _ = portfolio
+    index = AssetSearchIndex.build(store)
+    records, deleted = random_writes(store, len(store) // 8)
+    store.upsert(records)
+    store.delete(deleted)
+    index.refresh(store)
+    assert index.id_postings.overlay is None
+    ids, addresses = store.column("assetId").tolist(), store.column("address").tolist()
+    assert index.search("new-", limit=len(ids)).tolist() == naive(ids, addresses, "new-")
+
+
+def test_short_queries_read_the_index():
+    ids = ["A-1", "B-22", "XQ", "é"]
+    addresses = ["1 Main St", "2 Oak Ave", "q", "Zé Street"]
+    index = AssetSearchIndex(ids, addresses)
+    # Matches at the very end of a text, in a text shorter than a trigram, and multi-byte
+    assert index.address_postings.containing("t").tolist() == [0, 3]
+    assert index.id_postings.containing("q").tolist() == [2]
+    assert index.address_postings.containing("é").tolist() == [3]
+    assert index.id_postings.containing("22").tolist() == [1]
+    for q in ["1", "2", "q", "é", "ze", "-", "st"]:
+        assert index.search(q).tolist() == naive(ids, addresses, q), q
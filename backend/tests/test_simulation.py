@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+from benchmarks.portfolio import make_store
+from depth_grid import DepthGrid
+from exposure import FloodExposureEngine
+from simulation import (
+    LOSS_TABLE_COLUMNS,
+    SAMPLE_BLOCK_ELEMENTS,
+    simulate_chunk,
+    zone_loss_table,
+)
+
+LAT, LNG = 37.75, -122.45
+
+
+def square(zone_id, half, depth, pct, lat=LAT, lng=LNG):
+    ring = [[lat - half, lng - half], [lat - half, lng + half], [lat + half, lng + half], [lat + half, lng - half]]
+    return {
+        "flood_id": zone_id, "flood_depth_m": depth, "probability_pct": pct,
+        "flood_category": "primary", "coordinates": ring,
+    }
+
+
+# Nested return-period zones, one partly overlapping them and one on its own
+ZONES = [
+    square("A-500", 0.02, 0.6, 20.0),
+    square("B-100", 0.01, 1.5, 10.0),
+    square("C-025", 0.005, 3.0, 4.0),
+    square("D-EDGE", 0.01, 1.0, 15.0, lat=LAT + 0.02, lng=LNG + 0.02),
+    square("E-FAR", 0.01, 2.0, 25.0, lat=LAT + 0.1),
+]
+
+
+@pytest.fixture
+def store(rng):
+    store = make_store(3000, seed=11)
+    store.column("latitude")[:] = LAT + rng.uniform(-0.03, 0.12, len(store))
+    store.column("longitude")[:] = LNG + rng.uniform(-0.03, 0.03, len(store))
+    return store
+
+
+def brute_force(store, engine, curves, model, seed, years):
+    """Replays simulate_chunk's draws asset by asset: each asset counts at its deepest flooding zone."""
+    rng = np.random.default_rng(seed)
+    occurs = rng.random((years, len(engine.zones))) < model.probabilities
+    level = rng.integers(0, len(model.factors), size=(years, len(engine.zones)))
+    lat, lng = store.column("latitude"), store.column("longitude")
+    points, zones = engine.memberships(lat, lng)
+    grid = engine.grid_depths(lat, lng)
+    curve = curves.curve_lookup(store)[store.column("constructionType"), store.column("assetType")]
+    event_loss = np.zeros((years, len(engine.zones)))
+    for asset in np.unique(points):
+        member = sorted(zones[points == asset], key=lambda z: (-engine.depths[z], z))
+        base = np.array([engine.depths[z] if np.isnan(grid[asset]) else grid[asset] for z in member])
+        depth = np.where(occurs[:, member], base * model.factors[level[:, member]], -1.0)
+        pick = depth.argmax(axis=1)
+        hit = depth[np.arange(years), pick] >= 0
+        ratio = curves.damage_ratios(np.full(hit.sum(), curve[asset]), depth[hit, pick[hit]])
+        np.add.at(event_loss, (np.flatnonzero(hit), np.array(member)[pick[hit]]), ratio * store.column("giv")[asset])
+    return event_loss.sum(axis=1), event_loss.max(axis=1)
+
+
+@pytest.mark.parametrize("with_grid", [False, True])
+def test_overlapping_zones_match_per_asset_simulation(store, curves, with_grid):
+    depth_grid = None
+    if with_grid:
+        # Covers the western half of the nested zones
+        values = np.linspace(0.2, 4.0, 40 * 20, dtype=np.float32).reshape(40, 20)
+        depth_grid = DepthGrid(values, (LNG - 0.03, 0.0015, 0, LAT + 0.03, 0, -0.0015))
+    engine = FloodExposureEngine(ZONES, depth_grid=depth_grid)
+    engine.apply(store)
+    model = zone_loss_table(store, engine, curves, depth_sigma=0.4)
+    assert {zones.shape[1] for zones, _, _ in model.overlaps} == {2, 3}
+
+    years = 3000
+    assert years * max(len(ZONES), *(z.size for z, _, _ in model.overlaps)) <= SAMPLE_BLOCK_ELEMENTS
+    seed = np.random.SeedSequence(5)
+    annual, max_event = simulate_chunk(model, seed, years)
+    expected_annual, expected_max = brute_force(store, engine, curves, model, seed, years)
+    assert np.allclose(annual, expected_annual)
+    assert np.allclose(max_event, expected_max)
+
+
+def test_without_overlaps_the_table_is_per_zone(store, curves):
+    engine = FloodExposureEngine([ZONES[3], ZONES[4]])
+    engine.apply(store)
+    model = zone_loss_table(store, engine, curves, depth_sigma=0.4)
+    assert model.overlaps == []
+    flooded = np.flatnonzero(store.column("inFloodZone"))
+    zone_idx = engine.classify(store.column("latitude")[flooded], store.column("longitude")[flooded])
+    curve = curves.curve_lookup(store)[store.column("constructionType"), store.column("assetType")]
+    for z in range(2):
+        rows = flooded[zone_idx == z]
+        depth = engine.depths[z] * model.factors[:, None] * np.ones(len(rows))
+        ratios = curves.damage_ratios(np.broadcast_to(curve[rows], depth.shape), depth)
+        assert np.allclose(model.table[z], ratios @ store.column("giv")[rows])
+
+
+def test_loss_table_reads_only_its_snapshot_columns(store, curves):
+    engine = FloodExposureEngine(ZONES)
+    engine.apply(store)
+    model = zone_loss_table(store.snapshot(LOSS_TABLE_COLUMNS), engine, curves, 0.3)
+    expected = zone_loss_table(store, engine, curves, 0.3)
+    np.testing.assert_array_equal(model.table, expected.table)
+    for got, want in zip(model.overlaps, expected.overlaps):
+        for a, b in zip(got, want):
+            np.testing.assert_array_equal(a, b)
@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from pymongo.errors import OperationFailure
+
+from status_log import StatusLog, parse_status_cursor, status_cursor, status_time
+
+NEW = datetime(2024, 1, 15, 10, 0, 0, 123000, tzinfo=timezone.utc)
+
+
+class FakeCollection:
+    """Just enough of an async collection for ``StatusLog`` reads and the timestamp migration."""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection=None):
+        # The only filtered find here is the migration's, for string timestamps
+        legacy = "timestamp" in query
+        return FakeCursor([dict(d) for d in self.docs if not legacy or isinstance(d["timestamp"], str)])
+
+    async def update_many(self, query, update):
+        raise OperationFailure("pipeline updates need MongoDB 4.2")
+
+    async def bulk_write(self, requests, ordered=True):
+        modified = 0
+        for request in requests:
+            match, change = request._filter, request._doc["$set"]
+            for doc in self.docs:
+                if all(doc[k] == v for k, v in match.items()):
+                    doc.update(change)
+                    modified += 1
+        return SimpleNamespace(modified_count=modified)
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, keys):
+        return self
+
+    async def to_list(self, limit):
+        return self.docs[:limit]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+
+
+def test_status_time_reads_legacy_iso_strings():
+    assert status_time("2024-01-15T10:00:00.123456+00:00") == NEW
+    assert status_time("2024-01-15T10:00:00.123456Z") == NEW
+    assert status_time("2024-01-15T12:00:00.123999+02:00") == NEW
+    # Naive, as older versions wrote naive datetimes' isoformat()
+    assert status_time("2024-01-15T10:00:00.123") == NEW
+
+
+def test_page_and_cursor_accept_legacy_rows():
+    docs = [
+        {"_id": "a", "id": "a", "client_name": "x", "timestamp": NEW},
+        {"_id": "b", "id": "b", "client_name": "x", "timestamp": "2024-01-15T09:00:00.5+00:00"},
+    ]
+    log = StatusLog(FakeCollection(docs), ttl_seconds=60)
+    page = asyncio.run(log.page(10))
+    assert [d["timestamp"] for d in page] == [NEW, datetime(2024, 1, 15, 9, 0, 0, 500000, tzinfo=timezone.utc)]
+    legacy = {"id": "b", "timestamp": "2024-01-15T09:00:00.5+00:00"}
+    assert parse_status_cursor(status_cursor(legacy)) == (page[1]["timestamp"], "b")
+
+
+def test_migration_falls_back_to_client_side_conversion():
+    docs = [
+        {"_id": "a", "id": "a", "timestamp": NEW},
+        {"_id": "b", "id": "b", "timestamp": "2024-01-15T10:00:00.123456+00:00"},
+        {"_id": "c", "id": "c", "timestamp": "not a time"},
+    ]
+    log = StatusLog(FakeCollection(docs), ttl_seconds=60, batch_size=1)
+    assert asyncio.run(log.migrate_timestamps()) == 1
+    assert [d["timestamp"] for d in docs] == [NEW, NEW, "not a time"]
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from tiles import CLUSTER_BITS, GRID_LEVEL, TileIndex, morton, to_mercator
+
+
+def cell_of(store, level):
+    mx, my = to_mercator(store.column("latitude"), store.column("longitude"))
+    scale = 2 ** level
+    return np.clip((mx * scale).astype(np.int64), 0, scale - 1), np.clip((my * scale).astype(np.int64), 0, scale - 1)
+
+
+def brute_clusters(store, z, x, y):
+    """Cluster aggregates by grouping every asset in the tile on its cluster cell."""
+    tx, ty = cell_of(store, z)
+    level = min(z + CLUSTER_BITS, GRID_LEVEL)
+    cx, cy = cell_of(store, level)
+    rows = np.flatnonzero((tx == x) & (ty == y))
+    clusters = {}
+    for row in rows.tolist():
+        c = clusters.setdefault(int(morton(cx[row:row + 1], cy[row:row + 1])[0]), [0, 0.0, 0.0, 0, 0.0, 0.0])
+        c[0] += 1
+        c[1] += store.column("giv")[row]
+        c[2] += store.column("pnl")[row]
+        c[3] += int(store.column("inFloodZone")[row])
+        c[4] += store.column("latitude")[row]
+        c[5] += store.column("longitude")[row]
+    return [
+        {"latitude": lat / n, "longitude": lng / n, "count": n, "giv": giv, "pnl": pnl, "exposedCount": exposed}
+        for n, giv, pnl, exposed, lat, lng in clusters.values()
+    ]
+
+
+def busiest_tiles(store, zooms):
+    """The most populated tile at each zoom."""
+    tiles = []
+    for z in zooms:
+        tx, ty = cell_of(store, z)
+        keys, counts = np.unique(tx * 2 ** z + ty, return_counts=True)
+        key = int(keys[np.argmax(counts)])
+        tiles.append((z, key // 2 ** z, key % 2 ** z))
+    return tiles
+
+
+def assert_same_clusters(actual, expected):
+    """Same clusters in any order (clusters of different cells have distinct centroids)."""
+    def by_centroid(clusters):
+        return sorted(clusters, key=lambda c: (round(c["latitude"], 7), round(c["longitude"], 7)))
+
+    assert len(actual) == len(expected)
+    for a, e in zip(by_centroid(actual), by_centroid(expected)):
+        assert a["count"] == e["count"] and a["exposedCount"] == e["exposedCount"]
+        assert [a[k] for k in ("giv", "pnl", "latitude", "longitude")] == pytest.approx(
+            [e[k] for k in ("giv", "pnl", "latitude", "longitude")], rel=1e-9
+        )
+
+
+def test_clusters_match_brute_force(portfolio):
+    store, _ = portfolio
+    index = TileIndex(store)
+    for z, x, y in busiest_tiles(store, [4, 8, 11, 14]):
+        expected = brute_clusters(store, z, x, y)
+        assert_same_clusters(index.clusters(z, x, y), expected)
+        assert_same_clusters(index.filtered_clusters(z, x, y, np.ones(len(store), dtype=bool)), expected)
+
+
+def test_tile_rows_are_the_assets_in_the_tile(portfolio):
+    store, _ = portfolio
+    index = TileIndex(store)
+    for z, x, y in busiest_tiles(store, [6, 12, 16]):
+        tx, ty = cell_of(store, z)
+        assert sorted(index.tile_rows(z, x, y).tolist()) == np.flatnonzero((tx == x) & (ty == y)).tolist()
+
+
+def test_incremental_refresh_matches_rebuild(portfolio, random_writes):
+    store, _ = portfolio
+    index = TileIndex(store)
+    for _ in range(10):
+        records, deleted = random_writes(store, 200)
+        store.upsert(records)
+        store.delete(deleted)
+        index.refresh()
+        fresh = TileIndex(store)
+        # Rows with equal codes may be in any order; the codes and each row's code must agree
+        np.testing.assert_array_equal(index.codes, fresh.codes)
+        np.testing.assert_array_equal(np.sort(index.order), np.arange(len(store)))
+        np.testing.assert_array_equal(index.row_codes[index.order], index.codes)
+        for z, x, y in busiest_tiles(store, [5, 10, 13]):
+            assert_same_clusters(index.clusters(z, x, y), fresh.clusters(z, x, y))
@@ -0,0 +1,147 @@
+import math
+
+import numpy as np
+import pytest
+
+from flood_zones import FloodZoneStore
+from zone_lod import (
+    LOD_ZOOMS,
+    ZoneLOD,
+    encode_polyline,
+    ring_significance,
+    simplify_ring,
+    zoom_tolerance,
+)
+
+
+def wiggly_ring(rng, n=1500, lat=37.75, lng=-122.45):
+    """An open ring with detail at every scale from a few km down to a metre."""
+    theta = np.sort(rng.uniform(0, 2 * np.pi, n))
+    radius = 0.05 * (1 + 0.2 * np.sin(3 * theta) + 0.02 * np.sin(40 * theta)) + rng.normal(0, 1e-4, n)
+    radius += rng.normal(0, 1e-5, n)
+    return np.column_stack([lat + radius * np.sin(theta), lng + radius * np.cos(theta) / math.cos(math.radians(lat))])
+
+
+def segment_distance(p, a, b):
+    ab = (b[0] - a[0], b[1] - a[1])
+    denom = ab[0] ** 2 + ab[1] ** 2
+    t = 0.0 if denom == 0 else min(max(((p[0] - a[0]) * ab[0] + (p[1] - a[1]) * ab[1]) / denom, 0.0), 1.0)
+    return math.hypot(p[0] - a[0] - t * ab[0], p[1] - a[1] - t * ab[1])
+
+
+def reference_dp(ring, tolerance):
+    """Recursive Douglas-Peucker over the closed ring, split at vertex 0 and the vertex farthest from it."""
+    scale = math.cos(math.radians(float(ring[:, 0].mean())))
+    pts = [(lat, lng * scale) for lat, lng in ring.tolist()]
+    pts.append(pts[0])
+    n = len(ring)
+    far = max(range(n), key=lambda i: ((pts[i][0] - pts[0][0]) ** 2 + (pts[i][1] - pts[0][1]) ** 2, -i))
+    keep = {0, far}
+
+    def split(a, b):
+        if b - a < 2:
+            return
+        d, k = max((segment_distance(pts[i], pts[a], pts[b]), -i) for i in range(a + 1, b))
+        if d > tolerance:
+            keep.add(-k)
+            split(a, -k)
+            split(-k, b)
+
+    split(0, far)
+    split(far, n)
+    return sorted(keep), far
+
+
+def test_simplification_matches_recursive_douglas_peucker(rng):
+    ring = wiggly_ring(rng)
+    tolerances = [zoom_tolerance(z, float(ring[:, 0].mean())) for z in LOD_ZOOMS]
+    significance = ring_significance(ring, min(tolerances))
+    sizes = []
+    for tolerance in tolerances:
+        expected, far = reference_dp(ring, tolerance)
+        simplified = simplify_ring(ring, tolerance, significance)
+        if len(expected) >= 3:
+            np.testing.assert_array_equal(simplified, ring[expected])
+        else:
+            # Too coarse for a polygon: the split vertices and one more
+            assert len(simplified) == 3
+            assert ring[0].tolist() in simplified.tolist() and ring[far].tolist() in simplified.tolist()
+        np.testing.assert_array_equal(simplify_ring(ring, tolerance), simplified)
+        sizes.append(len(simplified))
+    # The levels span the whole range, from a triangle to nearly every vertex
+    assert sizes[0] == 3 and sizes == sorted(sizes) and sizes[-1] > 0.9 * len(ring)
+
+
+def test_coarser_levels_keep_a_subset_of_finer_vertices(rng):
+    ring = wiggly_ring(rng, 600)
+    significance = ring_significance(ring)
+    kept = [set(map(tuple, simplify_ring(ring, zoom_tolerance(z, 37.75), significance).tolist())) for z in LOD_ZOOMS]
+    for coarse, fine in zip(kept, kept[1:]):
+        assert coarse <= fine
+
+
+def test_closing_vertex_is_not_repeated(rng):
+    ring = wiggly_ring(rng, 400)
+    closed = np.vstack([ring, ring[:1]])
+    for zoom in LOD_ZOOMS:
+        tolerance = zoom_tolerance(zoom, 37.75)
+        np.testing.assert_array_equal(simplify_ring(closed, tolerance), simplify_ring(ring, tolerance))
+
+
+def test_small_rings_are_kept_whole():
+    triangle = np.array([[37.0, -122.0], [37.1, -122.0], [37.0, -121.9]])
+    assert simplify_ring(triangle, 10.0) is triangle
+
+
+def decode_polyline(text, precision=5):
+    values, value, shift = [], 0, 0
+    for char in text:
+        byte = ord(char) - 63
+        value |= (byte & 0x1F) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value, shift = 0, 0
+    points = np.cumsum(np.array(values).reshape(-1, 2), axis=0)
+    return (points / 10 ** precision).tolist()
+
+
+def test_encode_polyline_matches_google_example():
+    # From Google's "Encoded Polyline Algorithm Format" documentation
+    assert encode_polyline([[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]]) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert encode_polyline([]) == ""
+
+
+def test_encode_polyline_round_trips(rng):
+    points = np.column_stack([rng.uniform(-90, 90, 500), rng.uniform(-180, 180, 500)])
+    np.testing.assert_allclose(decode_polyline(encode_polyline(points)), points, atol=0.5e-5 + 1e-12)
+    np.testing.assert_allclose(decode_polyline(encode_polyline(points, 6), 6), points, atol=0.5e-6 + 1e-12)
+
+
+@pytest.mark.parametrize("zoom", [None, 0, 1, 2, 3, 7, 12, 13, 18, 19, 22])
+def test_view_serves_the_coarsest_level_fine_enough_for_the_zoom(rng, zoom):
+    zones = [{"flood_id": f"FZ-{i}", "coordinates": wiggly_ring(rng, 300).tolist()} for i in range(3)]
+    lod = ZoneLOD(FloodZoneStore(zones))
+    level = None if zoom is None else next((z for z in LOD_ZOOMS if z >= zoom), None)
+    for zone, view in zip(zones, lod.view(zoom)):
+        ring = np.array(zone["coordinates"])
+        if level is None:
+            assert view["coordinates"] == zone["coordinates"]
+        else:
+            expected = simplify_ring(ring, zoom_tolerance(level, float(ring[:, 0].mean())))
+            assert view["coordinates"] == expected.tolist()
+        polyline = lod.view(zoom, encoding="polyline")[zones.index(zone)]["polyline"]
+        assert polyline == encode_polyline(view["coordinates"])
+
+
+def test_refresh_only_resimplifies_changed_zones(rng):
+    zones = FloodZoneStore([{"flood_id": f"FZ-{i}", "coordinates": wiggly_ring(rng, 200).tolist()} for i in range(4)])
+    lod = ZoneLOD(zones)
+    before = dict(lod._levels)
+    zones.upsert({"flood_id": "FZ-1", "coordinates": wiggly_ring(rng, 200, lat=38.0).tolist()})
+    zones.delete("FZ-3")
+    lod.refresh()
+    assert sorted(lod._levels) == ["FZ-0", "FZ-1", "FZ-2"]
+    assert lod._levels["FZ-0"] is before["FZ-0"] and lod._levels["FZ-2"] is before["FZ-2"]
+    assert lod._levels["FZ-1"] is not before["FZ-1"]
+    assert lod.view(8, bbox=(37.9, -122.6, 38.1, -122.3))[0]["flood_id"] == "FZ-1"
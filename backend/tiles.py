@@ -0,0 +1,172 @@
+"""Viewport tiles for the map: clusters at low zoom, individual assets at high zoom.
+
+Assets are sorted by a Morton (Z-order) code of their Web Mercator
+position at ``GRID_LEVEL``; after writes, only rows whose code changed are
+moved. Every XYZ tile, and every cluster cell inside a
+tile, is then a contiguous slice of that order. Prefix sums of GIV, PnL,
+exposure and position over the sorted rows turn each cluster's aggregates
+into two lookups, so a low-zoom tile costs O(cells x log N) however many
+assets it covers.
+"""
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from asset_store import AssetStore, patch_sort_order
+
+GRID_LEVEL = 24
+MAX_TILE_ZOOM = 22
+# Cluster cells per tile side = 2 ** CLUSTER_BITS
+CLUSTER_BITS = 3
+# Individual assets are returned from this zoom on, if the tile is small enough
+ASSET_MIN_ZOOM = 14
+MAX_TILE_ASSETS = 2000
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def to_mercator(lat: np.ndarray, lng: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Normalized Web Mercator coordinates in [0, 1), y growing southwards."""
+    lat_rad = np.radians(np.clip(lat, -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT))
+    mx = (np.asarray(lng) + 180.0) / 360.0
+    my = (1.0 - np.log(np.tan(lat_rad) + 1.0 / np.cos(lat_rad)) / np.pi) / 2.0
+    return mx, my
+
+
+def _spread_bits(v: np.ndarray) -> np.ndarray:
+    """Insert a zero bit between each of the low 32 bits of ``v``."""
+    v = v.astype(np.uint64) & np.uint64(0xFFFFFFFF)
+    for shift, mask in (
+        (16, 0x0000FFFF0000FFFF),
+        (8, 0x00FF00FF00FF00FF),
+        (4, 0x0F0F0F0F0F0F0F0F),
+        (2, 0x3333333333333333),
+        (1, 0x5555555555555555),
+    ):
+        v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+    return v
+
+
+def morton(ix: np.ndarray, iy: np.ndarray) -> np.ndarray:
+    return _spread_bits(ix) | (_spread_bits(iy) << np.uint64(1))
+
+
+class TileIndex:
+    """Morton-ordered asset rows with prefix sums for O(1) range aggregates."""
+
+    SUM_COLUMNS = ("giv", "pnl", "exposed", "latitude", "longitude")
+
+    def __init__(self, store: AssetStore):
+        self.store = store
+        self.rows_version = -1
+        self.version = -1
+        self.row_codes = None
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Re-order rows whose code changed after row changes; recompute prefix sums after any change."""
+        store = self.store
+        if self.rows_version != store.rows_version:
+            mx, my = to_mercator(store.column("latitude"), store.column("longitude"))
+            scale = 2 ** GRID_LEVEL
+            ix = np.clip((mx * scale).astype(np.int64), 0, scale - 1)
+            iy = np.clip((my * scale).astype(np.int64), 0, scale - 1)
+            codes = morton(ix, iy)
+            patched = None
+            if self.row_codes is not None:
+                patched = patch_sort_order(self.order, self.codes, self.row_codes, codes)
+            if patched is None:
+                order = np.argsort(codes, kind="stable")
+                patched = order, codes[order]
+            self.order, self.codes = patched
+            self.row_codes = codes
+            self.rows_version = store.rows_version
+            self.version = -1
+        if self.version != store.version:
+            values = {
+                "giv": store.column("giv"),
+                "pnl": store.column("pnl"),
+                "exposed": store.column("inFloodZone"),
+                "latitude": store.column("latitude"),
+                "longitude": store.column("longitude"),
+            }
+            self.sums: Dict[str, np.ndarray] = {
+                name: np.concatenate(([0.0], np.cumsum(values[name][self.order], dtype=np.float64)))
+                for name in self.SUM_COLUMNS
+            }
+            self.version = store.version
+
+    def _code_range(self, level: int, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Positions in the sorted order covered by cells ``(x, y)`` at ``level``."""
+        shift = np.uint64(2 * (GRID_LEVEL - level))
+        start = morton(np.asarray(x), np.asarray(y)) << shift
+        end = start + (np.uint64(1) << shift)
+        return np.searchsorted(self.codes, start), np.searchsorted(self.codes, end)
+
+    def tile_rows(self, z: int, x: int, y: int) -> np.ndarray:
+        """Store rows inside the tile, in Morton order."""
+        lo, hi = self._code_range(z, np.array([x]), np.array([y]))
+        return self.order[lo[0]:hi[0]]
+
+    def clusters(self, z: int, x: int, y: int) -> List[dict]:
+        """Aggregates for each non-empty cluster cell of the tile."""
+        level = min(z + CLUSTER_BITS, GRID_LEVEL)
+        side = 2 ** (level - z)
+        sub_x, sub_y = np.meshgrid(np.arange(side), np.arange(side))
+        cell_x = (x * side + sub_x).ravel()
+        cell_y = (y * side + sub_y).ravel()
+        lo, hi = self._code_range(level, cell_x, cell_y)
+        keep = hi > lo
+        lo, hi = lo[keep], hi[keep]
+        count = hi - lo
+        agg = {name: self.sums[name][hi] - self.sums[name][lo] for name in self.SUM_COLUMNS}
+        return self._cluster_dicts(count, agg)
+
+    @staticmethod
+    def _cluster_dicts(count: np.ndarray, agg: Dict[str, np.ndarray]) -> List[dict]:
+        return [
+            {
+                "latitude": lat / n,
+                "longitude": lng / n,
+                "count": n,
+                "giv": giv,
+                "pnl": pnl,
+                "exposedCount": int(round(exposed)),
+            }
+            for n, giv, pnl, exposed, lat, lng in zip(
+                count.tolist(),
+                agg["giv"].tolist(),
+                agg["pnl"].tolist(),
+                agg["exposed"].tolist(),
+                agg["latitude"].tolist(),
+                agg["longitude"].tolist(),
+            )
+        ]
+
+    def filtered_clusters(self, z: int, x: int, y: int, mask: np.ndarray) -> List[dict]:
+        """Like ``clusters`` but only over rows where ``mask`` is set.
+
+        Prefix sums cannot skip rows, so this reduces the tile's matching rows
+        directly; they are already in Morton order, so each cluster cell is a
+        run of equal truncated codes.
+        """
+        level = min(z + CLUSTER_BITS, GRID_LEVEL)
+        lo, hi = self._code_range(z, np.array([x]), np.array([y]))
+        positions = np.arange(lo[0], hi[0])
+        positions = positions[mask[self.order[positions]]]
+        if len(positions) == 0:
+            return []
+        rows = self.order[positions]
+        cells = self.codes[positions] >> np.uint64(2 * (GRID_LEVEL - level))
+        starts = np.flatnonzero(np.concatenate(([True], cells[1:] != cells[:-1])))
+        count = np.diff(np.append(starts, len(rows)))
+        store = self.store
+        values = {
+            "giv": store.column("giv")[rows],
+            "pnl": store.column("pnl")[rows],
+            "exposed": store.column("inFloodZone")[rows].astype(np.float64),
+            "latitude": store.column("latitude")[rows],
+            "longitude": store.column("longitude")[rows],
+        }
+        agg = {name: np.add.reduceat(values[name], starts) for name in self.SUM_COLUMNS}
+        return self._cluster_dicts(count, agg)
@@ -0,0 +1,167 @@
+"""Level-of-detail geometry for flood zones.
+
+Each zone ring is simplified with Douglas-Peucker for every level in
+``LOD_ZOOMS``, at a tolerance of ``PIXEL_TOLERANCE`` screen pixels for that
+zoom; one pass over the ring yields all levels. A request at zoom ``z`` is
+served from the coarsest level that is still at least as fine as ``z``
+needs; zooms past the last level get the full-resolution ring. Distances are measured with longitude scaled by
+``cos(latitude)`` so the tolerance is isotropic on the map.
+
+Rings can also be sent as Google encoded polylines, which are several
+times smaller than JSON coordinate arrays.
+"""
+
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from flood_zones import FloodZoneStore
+
+LOD_ZOOMS = (0, 2, 4, 6, 8, 10, 12, 14, 16, 18)
+PIXEL_TOLERANCE = 0.5
+TILE_SIZE = 256
+
+
+def zoom_tolerance(zoom: int, lat: float) -> float:
+    """``PIXEL_TOLERANCE`` pixels at ``zoom``, in degrees of latitude."""
+    return PIXEL_TOLERANCE * 360.0 / (TILE_SIZE * 2 ** zoom) * math.cos(math.radians(lat))
+
+
+def _segment_distances(pts: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Distance from each of ``pts`` to the segment ``a[i]``-``b[i]`` (row-wise)."""
+    ab = b - a
+    denom = (ab * ab).sum(axis=-1)
+    t = np.clip(((pts - a) * ab).sum(axis=-1) / np.where(denom == 0, 1.0, denom), 0.0, 1.0)
+    t = np.where(denom == 0, 0.0, t)
+    return np.sqrt(((pts - (a + t[..., None] * ab)) ** 2).sum(axis=-1))
+
+
+def ring_significance(ring: np.ndarray, min_tolerance: float = 0.0) -> np.ndarray:
+    """Largest Douglas-Peucker tolerance at which each vertex of an open ring survives.
+
+    The ring is split at vertex 0 and the vertex farthest from it, and each
+    half is simplified on its own, so the closing edge is handled like any
+    other. DP splits at the farthest vertex whatever the tolerance, so one
+    pass builds the whole split tree: a vertex survives tolerance ``t`` iff
+    its distance and its ancestors' all exceed ``t``. Every segment at one
+    depth is processed in one vectorized step. Recursion stops below
+    ``min_tolerance``; the split vertices are always kept.
+    """
+    n = len(ring)
+    significance = np.zeros(n + 1)
+    if n <= 3:
+        significance[:] = np.inf
+        return significance[:n]
+    scaled = np.column_stack([ring[:, 0], ring[:, 1] * math.cos(math.radians(float(ring[:, 0].mean())))])
+    # Close the ring so the second half ends back at vertex 0
+    pts = np.vstack([scaled, scaled[:1]])
+    far = int(np.argmax(((scaled - scaled[0]) ** 2).sum(axis=1)))
+    significance[[0, far, n]] = np.inf
+    starts = np.array([0, far], dtype=np.intp)
+    ends = np.array([far, n], dtype=np.intp)
+    parent = np.array([np.inf, np.inf])
+    while len(starts):
+        interior = ends - starts - 1
+        live = interior > 0
+        starts, ends, parent, interior = starts[live], ends[live], parent[live], interior[live]
+        if not len(starts):
+            break
+        seg = np.repeat(np.arange(len(starts)), interior)
+        offsets = np.concatenate(([0], np.cumsum(interior)[:-1]))
+        idx = starts[seg] + 1 + np.arange(len(seg)) - offsets[seg]
+        d = _segment_distances(pts[idx], pts[starts[seg]], pts[ends[seg]])
+        best = np.maximum.reduceat(d, offsets)
+        # First position in each segment holding its maximum
+        is_best = np.flatnonzero(d == best[seg])
+        _, first = np.unique(seg[is_best], return_index=True)
+        k = idx[is_best[first]]
+        sig = np.minimum(best, parent)
+        # Recorded even below min_tolerance so a collapsing ring keeps its most significant vertex
+        significance[k] = sig
+        split = best > min_tolerance
+        starts, ends, k, sig = starts[split], ends[split], k[split], sig[split]
+        starts, ends, parent = np.concatenate([starts, k]), np.concatenate([k, ends]), np.concatenate([sig, sig])
+    return significance[:n]
+
+
+def simplify_ring(ring: np.ndarray, tolerance: float, significance: Optional[np.ndarray] = None) -> np.ndarray:
+    """Douglas-Peucker simplification of an open ``(n, 2)`` [lat, lng] ring, keeping at least 3 vertices."""
+    if significance is None:
+        significance = ring_significance(ring, tolerance)
+    keep = significance > tolerance
+    if keep.sum() < 3:
+        # Keep the two split vertices plus the next most significant one
+        keep[np.argsort(significance, kind="stable")[-3:]] = True
+    return ring if keep.all() else ring[keep]
+
+
+def encode_polyline(coordinates: Sequence[Sequence[float]], precision: int = 5) -> str:
+    """Google encoded polyline of ``[lat, lng]`` pairs."""
+    values = np.round(np.asarray(coordinates, dtype=np.float64).reshape(-1, 2) * 10 ** precision).astype(np.int64)
+    deltas = np.diff(values, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    zigzag = np.where(deltas < 0, ~(deltas << 1), deltas << 1).tolist()
+    out = []
+    for v in zigzag:
+        while v >= 0x20:
+            out.append(chr((0x20 | (v & 0x1F)) + 63))
+            v >>= 5
+        out.append(chr(v + 63))
+    return "".join(out)
+
+
+class ZoneLOD:
+    """Per-zone simplified rings at every level, refreshed zone by zone."""
+
+    def __init__(self, zones: FloodZoneStore):
+        self.zones = zones
+        self.version = -1
+        # flood_id -> (zone dict the levels were built from, bbox, rings per level)
+        self._levels: Dict[str, Tuple[dict, Tuple[float, float, float, float], List[np.ndarray]]] = {}
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Re-simplify only zones that were added or replaced since the last refresh."""
+        if self.version == self.zones.version:
+            return
+        levels = {}
+        for zone in self.zones:
+            cached = self._levels.get(zone["flood_id"])
+            if cached is not None and cached[0] is zone:
+                levels[zone["flood_id"]] = cached
+                continue
+            ring = np.asarray(zone["coordinates"], dtype=np.float64).reshape(-1, 2)
+            bbox = (ring[:, 0].min(), ring[:, 1].min(), ring[:, 0].max(), ring[:, 1].max()) if len(ring) else (0.0,) * 4
+            lat = float(ring[:, 0].mean()) if len(ring) else 0.0
+            tolerances = [zoom_tolerance(z, lat) for z in LOD_ZOOMS]
+            significance = ring_significance(ring, min(tolerances))
+            rings = [simplify_ring(ring, tol, significance) for tol in tolerances]
+            levels[zone["flood_id"]] = (zone, tuple(float(v) for v in bbox), rings)
+        self._levels = levels
+        self.version = self.zones.version
+
+    def view(
+        self,
+        zoom: Optional[int] = None,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+        encoding: Optional[str] = None,
+    ) -> List[dict]:
+        """Zones intersecting ``bbox``, with rings at the detail ``zoom`` needs."""
+        level = None
+        if zoom is not None:
+            level = next((i for i, z in enumerate(LOD_ZOOMS) if z >= zoom), None)
+        out = []
+        for zone in self.zones:
+            _, (min_lat, min_lng, max_lat, max_lng), rings = self._levels[zone["flood_id"]]
+            if bbox is not None and (
+                max_lat < bbox[0] or min_lat > bbox[2] or max_lng < bbox[1] or min_lng > bbox[3]
+            ):
+                continue
+            coordinates = zone["coordinates"] if level is None else rings[level].tolist()
+            view = {k: v for k, v in zone.items() if k != "coordinates"}
+            if encoding == "polyline":
+                view["polyline"] = encode_polyline(coordinates)
+            else:
+                view["coordinates"] = coordinates
+            out.append(view)
+        return out